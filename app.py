@@ -1,7 +1,8 @@
 from flask import Flask, render_template, request
 from flask_login import LoginManager
-from models import db, User
+from models import db
 from config import Config
+from services.repository import get_repository
 import os
 
 # Initialize Flask application
@@ -26,9 +27,10 @@ login_manager.login_message_category = 'info'
 def load_user(user_id):
     """
     Callback to reload the user object from the user ID stored in the session.
-    Required by Flask-Login.
+    Required by Flask-Login. Goes through the configured storage backend
+    (served from the identity cache on SQL).
     """
-    return User.query.get(int(user_id))
+    return get_repository().load_user(user_id)
 
 # Import and register blueprints for modular application structure
 # Auth Blueprint: Handles login, registration, password reset
@@ -51,8 +53,6 @@ def index():
     return render_template('index.html')
 
 
-
-
 # About page route
 @app.route('/about')
 def about():
@@ -77,9 +77,10 @@ def contact():
     return render_template('contact.html')
 
 if __name__ == '__main__':
-    with app.app_context():
-        # Create tables if they don't exist
-        db.create_all()
+    if app.config['STORAGE_BACKEND'] == 'sql':
+        with app.app_context():
+            # Create tables if they don't exist
+            db.create_all()
     
     # Run the application in debug mode
     app.run(debug=True, host='0.0.0.0', port=5000)
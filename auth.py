@@ -2,13 +2,18 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
-import boto3
+from services import aws_clients
 
 auth = Blueprint('auth', __name__, template_folder='templates')
 
-# DynamoDB
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-users_table = dynamodb.Table('Users')
+# DynamoDB, connected on first use (services/aws_clients.py)
+_users_table = None
+
+def get_users_table():
+    global _users_table
+    if _users_table is None:
+        _users_table = aws_clients.resource('dynamodb', 'us-east-1').Table('Users')
+    return _users_table
 
 # Signup Route
 @auth.route('/signup', methods=['GET', 'POST'])
@@ -18,13 +23,13 @@ def signup():
         email = request.form['email']
         password = request.form['password']
 
-        response = users_table.get_item(Key={'username': username})
+        response = get_users_table().get_item(Key={'username': username})
         if 'Item' in response:
             flash("User already exists!", "danger")
             return redirect(url_for('auth.signup'))
 
         hashed_password = generate_password_hash(password)
-        users_table.put_item(Item={
+        get_users_table().put_item(Item={
             'username': username,
             'email': email,
             'password_hash': hashed_password,
@@ -44,7 +49,7 @@ def login():
         username = request.form['username']
         password = request.form['password']
 
-        response = users_table.get_item(Key={'username': username})
+        response = get_users_table().get_item(Key={'username': username})
         item = response.get('Item')
 
         if item and check_password_hash(item['password_hash'], password):
@@ -1,13 +1,18 @@
 
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, g
 import os
-import boto3
+import atexit
+import time
 import uuid
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
-from boto3.dynamodb.conditions import Key, Attr
-from botocore.exceptions import ClientError
+from services import aws_clients
+from services.dynamo_store import DynamoStore, TransactionBusy
+from services.dynamo_counters import doctor_key, patient_key, count
+from services.dynamo_models import User, Doctor, Appointment, PatientRecord, bind_store
+from services.notifications import NotificationQueue, SNSPublisher, InMemoryPublisher
+from services.schedule import schedule_minutes, label_to_minute, minute_to_label
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY') or 'your_secret_key_here'
@@ -16,32 +21,68 @@ app.secret_key = os.environ.get('SECRET_KEY') or 'your_secret_key_here'
 REGION = 'us-east-1' # Replace with your region
 SNS_TOPIC_ARN = 'arn:aws:sns:us-east-1:604665149129:aws_capstone_topic' # Replace with your actual ARN
 
-# Boto3 Resources
-dynamodb = boto3.resource('dynamodb', region_name=REGION)
-sns = boto3.client('sns', region_name=REGION)
+DYNAMODB_ENDPOINT = os.environ.get('DYNAMODB_ENDPOINT') # Local stand-in (e.g. DynamoDB Local) when set
 
-# DynamoDB Tables
-users_table = dynamodb.Table('Users')
-doctors_table = dynamodb.Table('Doctors')
-appointments_table = dynamodb.Table('Appointments')
-records_table = dynamodb.Table('PatientRecords')
+# Boto3 resources are shared and pooled per process (services/aws_clients.py) and
+# created on first use, so importing the app (worker boot, tests) doesn't load boto3
+_store = None
+
+def get_dynamodb():
+    return aws_clients.resource('dynamodb', REGION, DYNAMODB_ENDPOINT)
+
+def get_sns():
+    return aws_clients.client('sns', REGION)
+
+def get_store():
+    # Key/index queries for the patient and doctor views (tables: services/dynamo_tables.py)
+    global _store
+    if _store is None:
+        _store = DynamoStore(get_dynamodb())
+        bind_store(_store)
+    return _store
+
+# Logged-in user fields kept in the signed session cookie, so most page views read nothing from Users
+USER_SESSION_FIELDS = ('username', 'email', 'role', 'date_of_birth', 'created_at') # Never password_hash
+USER_SESSION_TTL = int(os.environ.get('USER_SESSION_TTL', 300)) # Seconds before the user is re-read; 0 disables
+
+# Notifications are published in batches by a background worker (services/notifications.py)
+# NOTIFICATIONS=memory keeps them in process instead (local runs, tests)
+if os.environ.get('NOTIFICATIONS') == 'memory':
+    notification_publisher = InMemoryPublisher()
+else:
+    notification_publisher = SNSPublisher(get_sns, SNS_TOPIC_ARN)
+notifications = NotificationQueue(notification_publisher)
+atexit.register(notifications.stop)
 
 # Helper Functions
 def send_notification(subject, message):
-    try:
-        sns.publish(
-            TopicArn=SNS_TOPIC_ARN,
-            Subject=subject,
-            Message=message
-        )
-    except ClientError as e:
-        print(f"Error sending notification: {e}")
+    # Returns immediately; SNS is called from the notification worker
+    if not notifications.send(subject, message):
+        print(f"Notification queue full, dropped: {subject}")
+
+def remember_user(item):
+    # Copy the non-sensitive fields of a Users item into the session
+    session['user_cache'] = {field: item.get(field) for field in USER_SESSION_FIELDS}
+    session['user_cache']['cached_at'] = time.time()
 
 def get_current_user():
+    # Resolved at most once per request, from the session copy while it is fresh
+    if 'current_user' in g:
+        return g.current_user
+    user = None
     if 'username' in session:
-        response = users_table.get_item(Key={'username': session['username']})
-        return response.get('Item')
-    return None
+        cached = session.get('user_cache')
+        if (USER_SESSION_TTL and cached and cached.get('username') == session['username']
+                and time.time() - cached.get('cached_at', 0) < USER_SESSION_TTL):
+            user = {field: cached.get(field) for field in USER_SESSION_FIELDS}
+        else:
+            item = get_store().get_user(session['username'])
+            if item:
+                user = {field: item.get(field) for field in USER_SESSION_FIELDS}
+                if USER_SESSION_TTL:
+                    remember_user(item)
+    g.current_user = user
+    return user
 
 # Context Processor to inject user into templates
 @app.context_processor
@@ -79,21 +120,22 @@ def signup():
         dob = request.form.get('dob') # Optional safely
         
         # Check if user exists
-        response = users_table.get_item(Key={'username': username})
+        response = get_store().users.get_item(Key={'username': username})
         if 'Item' in response:
             return "User already exists!"
             
         hashed_password = generate_password_hash(password)
         
-        # Add user
-        users_table.put_item(Item={
+        # Add user (and count the patient); fails if the name was taken meanwhile
+        if not get_store().put_user({
             'username': username,
             'email': email,
             'password_hash': hashed_password,
             'role': 'patient',
             'date_of_birth': dob,
             'created_at': datetime.utcnow().isoformat()
-        })
+        }):
+            return "User already exists!"
        
         # Notify
         send_notification("New User Signup", f"User {username} has signed up.")
@@ -107,12 +149,14 @@ def login():
         username = request.form['username']
         password = request.form['password']
        
-        response = users_table.get_item(Key={'username': username})
+        response = get_store().users.get_item(Key={'username': username})
         item = response.get('Item')
        
         if item and check_password_hash(item['password_hash'], password):
             session['username'] = item['username']
             session['role'] = item['role']
+            if USER_SESSION_TTL:
+                remember_user(item)
             send_notification("User Login", f"User {username} has logged in.")
             
             if item['role'] == 'admin':
@@ -140,15 +184,9 @@ def patient_dashboard():
         
     username = session['username']
     
-    # Get appointments
-    response = appointments_table.scan(FilterExpression=Attr('patient_id').eq(username))
-    all_appts = response.get('Items', [])
-    all_appts.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-    
-    recent_appointments = all_appts[:5]
-    total_appointments = len(all_appts)
-    pending_appointments = sum(1 for a in all_appts if a.get('status') == 'pending')
-    approved_appointments = sum(1 for a in all_appts if a.get('status') == 'approved')
+    # Five newest appointments; the counts come from the patient's counter item
+    recent_appointments = get_store().appointments_for_patient(username, limit=5)
+    counter = get_store().get_counters(patient_key(username))[patient_key(username)]
     
     # We need to inject 'current_user' mock object for templates if they use .id etc.
     # But templates use objects. We are passing dicts. Be careful.
@@ -158,9 +196,9 @@ def patient_dashboard():
     
     return render_template('patient/dashboard.html',
                          recent_appointments=[Appointment(a) for a in recent_appointments],
-                         total_appointments=total_appointments,
-                         pending_appointments=pending_appointments,
-                         approved_appointments=approved_appointments)
+                         total_appointments=count(counter, 'appointments'),
+                         pending_appointments=count(counter, 'pending'),
+                         approved_appointments=count(counter, 'approved'))
 
 @app.route('/patient/book-appointment', methods=['GET', 'POST'])
 def book_appointment():
@@ -173,54 +211,55 @@ def book_appointment():
         reason = request.form.get('reason')
         
         # Simple validation
-        doc_resp = doctors_table.get_item(Key={'id': doctor_id})
+        doc_resp = get_store().doctors.get_item(Key={'id': doctor_id})
         doctor = doc_resp.get('Item')
         
         if not doctor: return "Invalid Doctor"
         
-        # Check slots (Skipping complex logic for brevity in single file, or implement if needed? implementing simple check)
-        # Scan approved appts for this doctor/date
-        scan_kwargs = {
-            'FilterExpression': Attr('doctor_id').eq(doctor_id) & Attr('appointment_date').eq(date_str) & Attr('status').eq('approved')
-        }
-        booked = appointments_table.scan(**scan_kwargs)['Count']
-        if booked >= int(doctor.get('available_slots_per_day', 10)):
-            flash("No slots available")
+        doctor = Doctor(doctor)
+        start_minute = label_to_minute(time_str)
+        if start_minute not in schedule_minutes(doctor):
+            flash("Please pick one of the available time slots!")
             return redirect(url_for('book_appointment'))
 
-        # Create
+        # Create and hold the slot in one transaction; fails if the slot or the day is taken
         appt_id = str(uuid.uuid4())
-        appointments_table.put_item(Item={
-            'id': appt_id,
-            'patient_id': session['username'],
-            'doctor_id': doctor_id,
-            'appointment_date': date_str,
-            'appointment_time': time_str,
-            'reason': reason,
-            'status': 'pending',
-            'created_at': datetime.utcnow().isoformat()
-        })
+        try:
+            booked = get_store().book_appointment({
+                'id': appt_id,
+                'patient_id': session['username'],
+                'doctor_id': doctor_id,
+                'appointment_date': date_str,
+                'appointment_time': minute_to_label(start_minute),
+                'start_minute': start_minute,
+                'reason': reason,
+                'status': 'pending',
+                'created_at': datetime.utcnow().isoformat()
+            }, doctor.available_slots_per_day)
+        except TransactionBusy:
+            flash("Many patients are booking right now. Please try again in a moment.")
+            return redirect(url_for('book_appointment'))
+        if not booked:
+            flash("No slots available")
+            return redirect(url_for('book_appointment'))
         return redirect(url_for('patient_appointments'))
 
     # GET
-    doc_scan = doctors_table.scan()
-    doctors = [Doctor(d) for d in doc_scan.get('Items', [])]
+    doctors = [Doctor(d) for d in get_store().list_doctors()]
     return render_template('patient/book_appointment.html', doctors=doctors)
 
 @app.route('/patient/appointments')
 def patient_appointments():
     if 'username' not in session: return redirect(url_for('login'))
     
-    response = appointments_table.scan(FilterExpression=Attr('patient_id').eq(session['username']))
-    appts = [Appointment(a) for a in response.get('Items', [])]
+    appts = [Appointment(a) for a in get_store().appointments_for_patient(session['username'])]
     return render_template('patient/appointments.html', appointments=appts, status_filter='all')
 
 @app.route('/patient/records')
 def patient_records():
     if 'username' not in session: return redirect(url_for('login'))
     
-    response = records_table.scan(FilterExpression=Attr('patient_id').eq(session['username']))
-    recs = [PatientRecord(r) for r in response.get('Items', [])]
+    recs = [PatientRecord(r) for r in get_store().records_for_patient(session['username'])]
     return render_template('patient/records.html', records=recs)
 
 
@@ -231,39 +270,31 @@ def doctor_dashboard():
     if 'username' not in session or session.get('role') != 'doctor': return redirect(url_for('login'))
     
     # Get doctor profile
-    doc_resp = doctors_table.scan(FilterExpression=Attr('user_id').eq(session['username']))
-    docs = doc_resp.get('Items', [])
-    if not docs: return "Profile not found"
-    doctor = Doctor(docs[0])
+    doc_item = get_store().doctor_for_user(session['username'])
+    if not doc_item: return "Profile not found"
+    doctor = Doctor(doc_item)
     
-    # Appts
-    appt_resp = appointments_table.scan(FilterExpression=Attr('doctor_id').eq(doctor.id))
-    appts = appt_resp.get('Items', [])
-    
-    stats = {
-        'total': len(appts),
-        'pending': sum(1 for a in appts if a['status'] == 'pending'),
-        'approved': sum(1 for a in appts if a['status'] == 'approved')
-    }
+    # Latest five by appointment date; counts from the doctor's counter item
+    appts = get_store().appointments_for_doctor(doctor.id, limit=5)
+    counter = get_store().get_counters(doctor_key(doctor.id))[doctor_key(doctor.id)]
     
     return render_template('doctor/dashboard.html', 
                          doctor=doctor, 
-                         recent_appointments=[Appointment(a) for a in appts[:5]],
-                         total_appointments=stats['total'],
-                         pending_appointments=stats['pending'],
-                         approved_appointments=stats['approved'],
-                         total_records=0) # simplified
+                         recent_appointments=[Appointment(a) for a in appts],
+                         total_appointments=count(counter, 'appointments'),
+                         pending_appointments=count(counter, 'pending'),
+                         approved_appointments=count(counter, 'approved'),
+                         total_records=count(counter, 'records'))
 
 @app.route('/doctor/appointments')
 def doctor_appointments():
     # Similar logic...
     if 'username' not in session: return redirect(url_for('login'))
-    doc_resp = doctors_table.scan(FilterExpression=Attr('user_id').eq(session['username']))
-    if not doc_resp.get('Items'): return "No profile"
-    doctor = Doctor(doc_resp['Items'][0])
+    doc_item = get_store().doctor_for_user(session['username'])
+    if not doc_item: return "No profile"
+    doctor = Doctor(doc_item)
     
-    response = appointments_table.scan(FilterExpression=Attr('doctor_id').eq(doctor.id))
-    appts = [Appointment(a) for a in response.get('Items', [])]
+    appts = [Appointment(a) for a in get_store().appointments_for_doctor(doctor.id)]
     return render_template('doctor/appointments.html', appointments=appts, doctor=doctor, status_filter='all')
 
 @app.route('/doctor/add-record/<patient_id>', methods=['GET', 'POST'])
@@ -280,110 +311,38 @@ def add_patient_record(patient_id):
 def admin_dashboard():
     if 'username' not in session or session.get('role') != 'admin': return redirect(url_for('login'))
     
-    # Stats
-    u_count = users_table.scan()['Count']
-    a_resp = appointments_table.scan()
-    appts = a_resp.get('Items', [])
+    # Stats: the global counter shards; latest pending from the status index
+    counter = get_store().global_counter()
     
     return render_template('admin/dashboard.html',
-                         total_patients=u_count, # Approx
-                         total_appointments=len(appts),
-                         pending_appointments=sum(1 for a in appts if a['status']=='pending'),
-                         approved_appointments=sum(1 for a in appts if a['status']=='approved'),
-                         total_doctors=doctors_table.scan()['Count'],
-                         recent_pending=[Appointment(a) for a in appts if a['status']=='pending'][:5])
-
-
-# --- Wrapper Classes for Compatibility ---
-# These mimic the SQLAlchemy models relationships to keep templates working
-
-class User:
-    def __init__(self, data):
-        self.__dict__.update(data)
-        # Handle missing fields
-        self.username = data.get('username')
-        self.email = data.get('email')
-        self.role = data.get('role')
-        self.id = data.get('username') # Using username as ID for FKs mostly
-        
-    @staticmethod
-    def get(username):
-        try:
-            resp = users_table.get_item(Key={'username': username})
-            if 'Item' in resp: return User(resp['Item'])
-        except: pass
-        return None
-        
-    @property
-    def is_authenticated(self): return True
-    @property
-    def is_active(self): return True
-    @property
-    def is_anonymous(self): return False
-    def get_id(self): return self.username
-
-class Doctor:
-    def __init__(self, data):
-        self.__dict__.update(data)
-        self.id = data.get('id')
-        self.name = data.get('name')
-        self.specialization = data.get('specialization')
-        self.available_slots_per_day = int(data.get('available_slots_per_day', 10))
-    
-    @staticmethod
-    def get(doc_id):
-        try:
-            resp = doctors_table.get_item(Key={'id': doc_id})
-            if 'Item' in resp: return Doctor(resp['Item'])
-        except: pass
-        return None
-
-class Appointment:
-    def __init__(self, data):
-        self.__dict__.update(data)
-        self.id = data.get('id')
-        self.status = data.get('status')
-        self.appointment_time = data.get('appointment_time')
-        self.reason = data.get('reason')
-        # Date parsing
-        date_str = data.get('appointment_date')
-        if date_str:
-            try: self.appointment_date = datetime.strptime(date_str, '%Y-%m-%d')
-            except: self.appointment_date = None
-        created_str = data.get('created_at')
-        if created_str:
-            try: self.created_at = datetime.fromisoformat(created_str)
-            except: self.created_at = None
-            
-    @property
-    def patient(self):
-        return User.get(self.patient_id)
-    @property
-    def doctor(self):
-        return Doctor.get(self.doctor_id)
-
-class PatientRecord:
-    def __init__(self, data):
-        self.__dict__.update(data)
-        self.diagnosis = data.get('diagnosis')
-        self.prescription = data.get('prescription')
-        self.notes = data.get('notes')
-        date_str = data.get('visit_date')
-        if date_str:
-            try: self.visit_date = datetime.strptime(date_str, '%Y-%m-%d')
-            except: self.visit_date = None
-            
-    @property
-    def patient(self): return User.get(self.patient_id)
-    @property
-    def doctor(self): return Doctor.get(self.doctor_id)
+                         total_patients=count(counter, 'patients'),
+                         total_appointments=count(counter, 'appointments'),
+                         pending_appointments=count(counter, 'pending'),
+                         approved_appointments=count(counter, 'approved'),
+                         total_doctors=count(counter, 'doctors'),
+                         recent_pending=[Appointment(a) for a in get_store().recent_by_status('pending', 5)])
+
+
+@app.route('/admin/notifications/metrics')
+def notification_metrics():
+    if 'username' not in session or session.get('role') != 'admin': return redirect(url_for('login'))
+    return jsonify(notifications.metrics())
+
+@app.route('/admin/aws/metrics')
+def aws_metrics():
+    if 'username' not in session or session.get('role') != 'admin': return redirect(url_for('login'))
+    return jsonify(aws_clients.metrics())
+
+
+# Model objects for DynamoDB items (User, Doctor, Appointment, PatientRecord)
+# live in services/dynamo_models.py and are shared with the blueprints.
 
 
 if __name__ == '__main__':
     # Ensure tables exist (Simple check)
     try:
-        users_table.load()
+        get_store().users.load()
     except:
-        print("Note: Create DynamoDB tables manually or via script.")
+        print("Note: Create DynamoDB tables with `python -m services.dynamo_tables`.")
         
     app.run(host='0.0.0.0', port=5000, debug=True)
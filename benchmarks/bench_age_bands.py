@@ -0,0 +1,108 @@
+"""
+Benchmark: patient age-band histograms in SQL vs. in Python.
+Seeds patients (some without a date of birth, some born on 29 February
+or with a birthday today/tomorrow) and appointments, then:
+- checks that the SQL expression of User.age matches the Python
+  property for every patient,
+- compares building the histograms by loading users/appointments and
+  computing `user.age` in Python with services.demographics (one GROUP
+  BY query), hospital-wide and per doctor / specialization, and checks
+  that both give the same counts,
+- prints the query plan of an age filter (User.born_by), which should
+  search ix_users_role_date_of_birth.
+
+Usage: python benchmarks/bench_age_bands.py [patients] [appointments]
+"""
+import sqlite3
+import sys
+from datetime import date, timedelta
+from common import setup_database, seed, timeit
+
+BANDS = (0, 18, 30, 45, 65)
+
+
+def python_histograms(bands):
+    from models import User, Doctor, Appointment
+
+    def band_of(age):
+        if age is None:
+            return -1
+        return max(i for i, low in enumerate(bands) if age >= low)
+
+    patients = {u.id: u for u in User.query.filter_by(role='patient')}
+    overall = {}
+    for user in patients.values():
+        key = band_of(user.age)
+        overall[key] = overall.get(key, 0) + 1
+
+    specialization = {d.id: d.specialization for d in Doctor.query}
+    by_doctor, by_specialization = {}, {}
+    for appointment in Appointment.query:
+        band = band_of(patients[appointment.patient_id].age)
+        by_doctor.setdefault(appointment.doctor_id, {})[appointment.patient_id] = band
+        by_specialization.setdefault(specialization[appointment.doctor_id], {})[appointment.patient_id] = band
+
+    def counted(groups):
+        result = {}
+        for key, members in groups.items():
+            counts = [0] * (len(bands) + 1)
+            for band in members.values():
+                counts[band] += 1
+            result[key] = counts
+        return result
+
+    counts = [0] * (len(bands) + 1)
+    for band, n in overall.items():
+        counts[band] += n
+    return {'all': {'all': counts}, 'doctor': counted(by_doctor), 'specialization': counted(by_specialization)}
+
+
+def add_edge_cases(db_path, today):
+    conn = sqlite3.connect(db_path)
+    ids = [row[0] for row in conn.execute("SELECT id FROM users WHERE role = 'patient' ORDER BY id LIMIT 600")]
+    births = [None, date(2000, 2, 29), date(1960, 2, 29), today.replace(year=today.year - 18),
+              today.replace(year=today.year - 65) + timedelta(days=1), today - timedelta(days=1)]
+    conn.executemany("UPDATE users SET date_of_birth = ? WHERE id = ?",
+                     [(births[i % len(births)], user_id) for i, user_id in enumerate(ids)])
+    conn.commit()
+    conn.close()
+
+
+def run(n_patients, n_appointments):
+    app, db_path = setup_database()
+    seed(db_path, n_appointments, n_patients=n_patients)
+    add_edge_cases(db_path, date.today())
+
+    from sqlalchemy import select, text
+    from models import db, User
+    from services.demographics import age_band_histogram
+
+    with app.app_context():
+        db.session.execute(text('ANALYZE'))
+        sql_ages = dict(db.session.execute(select(User.id, User.age).where(User.role == 'patient')).all())
+        assert sql_ages == {u.id: u.age for u in User.query.filter_by(role='patient')}, 'SQL age differs'
+        print(f"User.age in SQL matches the Python property for {len(sql_ages):,} patients")
+
+        expected = python_histograms(BANDS)
+        python_ms = timeit(lambda: (db.session.expire_all(), python_histograms(BANDS)), repeat=3)
+        print(f"\n{n_patients:,} patients, {n_appointments:,} appointments")
+        print(f"{'histogram':>16} {'SQL (ms)':>9}")
+        print(f"{'all, in Python':>16} {python_ms:>9.1f}  (the three histograms together)")
+        for group_by in ('all', 'doctor', 'specialization'):
+            result = age_band_histogram(group_by, BANDS)
+            got = {group['key']: group['counts'] for group in result['groups']}
+            assert got == expected[group_by], f'{group_by} histogram differs'
+            ms = timeit(lambda: age_band_histogram(group_by, BANDS), repeat=3)
+            print(f"{group_by:>16} {ms:>9.1f}")
+        print("SQL histograms match the Python counts")
+
+        statement = User.query.filter(User.role == 'patient', User.born_by(65)).with_entities(User.id).statement
+        compiled = statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+        plan = [row[3] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {compiled}'))]
+        print(f"\npatients aged 65+: {plan}")
+        assert any('ix_users_role_date_of_birth' in detail for detail in plan)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 200_000)
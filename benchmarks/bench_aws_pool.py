@@ -0,0 +1,164 @@
+"""
+Benchmark: botocore's default client vs. the shared pooled client
+(services/aws_clients.py) under many threads.
+A local HTTP stand-in for DynamoDB answers every GetItem after a fixed
+round trip and counts the TCP connections it accepts; it can also
+throttle (ThrottlingException) once too many requests are in flight,
+like a table at its provisioned capacity. For each client it reports
+wall time, connections opened, connections urllib3 discarded because
+the pool was full, requests the server saw and calls that failed.
+
+Also checks that a forked child opens its own connection instead of
+reusing the parent's.
+
+Usage: python benchmarks/bench_aws_pool.py [threads] [calls_per_thread] [round-trip-ms]
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from common import ROOT  # noqa: F401  (puts the project root on sys.path)
+import boto3
+from botocore.exceptions import ClientError
+from services import aws_clients
+
+
+class StandIn(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay, capacity=None):
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.delay = delay
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.connections = self.requests = self.throttled = self.in_flight = 0
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive, so clients can reuse connections
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            throttle = server.capacity is not None and server.in_flight > server.capacity
+            server.throttled += throttle
+        try:
+            time.sleep(server.delay)
+            if throttle:
+                self.reply(400, {'__type': 'com.amazonaws.dynamodb.v20120810#ThrottlingException',
+                                 'message': 'Rate of requests exceeds the allowed throughput.'})
+            else:
+                self.reply(200, {})
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/x-amz-json-1.0')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def hammer(client, threads, calls):
+    failed = []
+    barrier = threading.Barrier(threads)
+
+    def worker():
+        barrier.wait()
+        for i in range(calls):
+            try:
+                client.get_item(TableName='Users', Key={'username': {'S': f'patient{i}'}})
+            except ClientError:
+                failed.append(1)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return time.perf_counter() - start, len(failed)
+
+
+def compare(server, threads, calls, title):
+    print(f"\n{title}: {threads} threads x {calls} GetItem")
+    print(f"{'client':>24} {'time (s)':>9} {'connections':>12} {'discarded':>10} "
+          f"{'requests':>9} {'throttled':>10} {'failed':>7}")
+    clients = [
+        ('botocore defaults', boto3.client('dynamodb', region_name='us-east-1', endpoint_url=server.url)),
+        ('shared (aws_clients)', aws_clients.client('dynamodb', 'us-east-1', server.url)),
+    ]
+    for name, client in clients:
+        client.get_item(TableName='Users', Key={'username': {'S': 'warmup'}})
+        server.reset()
+        discarded = aws_clients.metrics()['discarded_connections']
+        elapsed, failed = hammer(client, threads, calls)
+        discarded = aws_clients.metrics()['discarded_connections'] - discarded
+        print(f"{name:>24} {elapsed:>9.2f} {server.connections:>12} {discarded:>10} "
+              f"{server.requests:>9} {server.throttled:>10} {failed:>7}")
+        client.close()
+
+
+def check_fork(server):
+    if not hasattr(os, 'fork'):
+        return
+    client = aws_clients.client('dynamodb', 'us-east-1', server.url)
+    client.get_item(TableName='Users', Key={'username': {'S': 'parent'}})
+    server.reset()
+    pid = os.fork()
+    if pid == 0:
+        client.get_item(TableName='Users', Key={'username': {'S': 'child'}})
+        os._exit(0)
+    os.waitpid(pid, 0)
+    client.get_item(TableName='Users', Key={'username': {'S': 'parent'}})
+    # The child connected on its own; the parent still reused its connection
+    assert server.connections == 1 and server.requests == 2, (server.connections, server.requests)
+    print("\nfork: child opened its own connection, parent kept its pooled one")
+
+
+def main(threads, calls, delay):
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    server = StandIn(delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    compare(server, threads, calls, 'unthrottled')
+
+    server.capacity = threads // 4
+    compare(server, threads, calls, f'throttled above {server.capacity} requests in flight')
+
+    server.capacity = None
+    check_fork(server)
+    metrics = aws_clients.metrics()['clients']
+    print("\naws_clients.metrics():")
+    for name, values in metrics.items():
+        print(f"  {name}: {values}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 40,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 50,
+         (int(sys.argv[3]) if len(sys.argv) > 3 else 5) / 1000)
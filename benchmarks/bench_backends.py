@@ -0,0 +1,131 @@
+"""
+Benchmark: the app.py blueprints on each storage backend.
+Runs the same patient / doctor / admin workload through the test client
+with STORAGE_BACKEND='sql' (temporary SQLite database) and 'dynamodb'
+(moto, or DynamoDB Local when DYNAMODB_ENDPOINT is set), checks every
+response and reports the best time per request.
+
+Usage: python benchmarks/bench_backends.py [appointments]
+"""
+import sys
+from datetime import date, timedelta
+from common import (setup_database, seed, make_client, login, timeit, run_with_dynamodb, seed_dynamo,
+                    DYNAMO_PATIENTS)
+
+TOMORROW = date.today() + timedelta(days=1)
+
+
+def workload(client, doctor_id, patient_id, doctor_login, patient_login):
+    """
+    (label, method, url, data, expected status) for one pass over the app.
+    """
+    day = TOMORROW.isoformat()
+    return [
+        ('register', 'POST', '/register', {'username': 'newpatient', 'email': 'new@example.com',
+                                           'password': 'secret1', 'confirm_password': 'secret1',
+                                           'dob': '1990-05-01'}, 302),
+        ('login patient', 'LOGIN', patient_login, None, 302),
+        ('patient dashboard', 'GET', '/patient/dashboard', None, 200),
+        ('book form', 'GET', '/patient/book-appointment', None, 200),
+        ('book', 'POST', '/patient/book-appointment', {'doctor_id': doctor_id, 'appointment_date': day,
+                                                       'appointment_time': '11:00 AM', 'reason': 'Checkup'}, 302),
+        ('patient appointments', 'GET', '/patient/appointments', None, 200),
+        ('patient records', 'GET', '/patient/records', None, 200),
+        ('check slots', 'GET', f'/patient/check-slots/{doctor_id}/{day}', None, 200),
+        ('availability 30d', 'GET', f'/patient/availability/{doctor_id}', None, 200),
+        ('next slot', 'GET', f'/patient/next-slot/{doctor_id}', None, 200),
+        ('update profile', 'POST', '/patient/update-profile', {'email': f'{patient_login}@example.org',
+                                                               'dob': '1980-01-01'}, 302),
+        ('login doctor', 'LOGIN', doctor_login, None, 302),
+        ('doctor dashboard', 'GET', '/doctor/dashboard', None, 200),
+        ('doctor appointments', 'GET', '/doctor/appointments', None, 200),
+        ('add record', 'POST', f'/doctor/add-record/{patient_id}', {'diagnosis': 'Migraine',
+                                                                    'prescription': 'Rest',
+                                                                    'visit_date': day, 'notes': ''}, 302),
+        ('doctor records', 'GET', '/doctor/records', None, 200),
+        ('patient history', 'GET', f'/doctor/patient-records/{patient_id}', None, 200),
+        ('login admin', 'LOGIN', 'admin', None, 302),
+        ('admin dashboard', 'GET', '/admin/dashboard', None, 200),
+        ('admin appointments', 'GET', '/admin/appointments?status=pending', None, 200),
+        ('admin patients', 'GET', '/admin/patients', None, 200),
+        ('admin patient recs', 'GET', f'/admin/patient/{patient_id}/records', None, 200),
+        ('admin doctors', 'GET', '/admin/doctors', None, 200),
+        ('admin slots', 'GET', '/admin/set-slots', None, 200),
+    ]
+
+
+def run_workload(client, steps):
+    """
+    Run each step once (checking the response), then time it again.
+    Returns [(label, ms)].
+    """
+    timings = []
+    for label, method, url, data, expected in steps:
+        def request():
+            if method == 'LOGIN':
+                client.get('/logout')
+                response = client.post('/login', data={'username': url, 'password': 'bench'})
+            elif method == 'POST':
+                response = client.post(url, data=data)
+            else:
+                response = client.get(url)
+            assert response.status_code == expected, f'{label}: {response.status_code} {response.location}'
+            return response
+
+        response = request()
+        if method == 'POST' and label != 'register':
+            # Form errors redirect back to the form with a flash
+            with client.session_transaction() as session:
+                flashes = session.get('_flashes', [])
+            assert not [m for c, m in flashes if c == 'error'], f'{label}: {flashes}'
+        timings.append((label, timeit(request, repeat=1) if method == 'GET' else None))
+    return timings
+
+
+def run_sql(n_appointments):
+    app, db_path = setup_database()
+    seed(db_path, n_appointments, n_patients=DYNAMO_PATIENTS, n_doctors=50)
+    client = make_client(app)
+    with app.app_context():
+        return run_workload(client, workload(client, 1, 51, 'user1', 'user51'))
+
+
+def run_dynamo(store, n_appointments):
+    from app import app
+    from services.passwords import hash_password
+    from services.repository_dynamo import DynamoRepository
+
+    seed_dynamo(store, n_appointments)
+    app.config['STORAGE_BACKEND'] = 'dynamodb'
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.extensions['repository'] = DynamoRepository(store)
+    with app.app_context():
+        password_hash = hash_password('bench')
+    store.users.put_item(Item={'username': 'admin', 'email': 'admin@example.com', 'role': 'admin',
+                               'password_hash': password_hash, 'created_at': '2024-01-01T00:00:00'})
+    for username in ('doctor0', 'patient0'):
+        store.update_user(username, password_hash=password_hash)
+
+    client = app.test_client()
+    with app.app_context():
+        return run_workload(client, workload(client, 'doc-0', 'patient0', 'doctor0', 'patient0'))
+
+
+def main():
+    n_appointments = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    sql = run_sql(n_appointments)
+    dynamo = run_with_dynamodb(run_dynamo, n_appointments)
+
+    print(f'{n_appointments} appointments, {DYNAMO_PATIENTS} patients, 50 doctors; best of 1 after a warm-up\n')
+    print(f'{"request":<22}{"sql ms":>10}{"dynamodb ms":>14}')
+    for (label, sql_ms), (_, dynamo_ms) in zip(sql, dynamo):
+        if sql_ms is None:
+            print(f'{label:<22}{"ok":>10}{"ok":>14}')
+        else:
+            print(f'{label:<22}{sql_ms:>10.1f}{dynamo_ms:>14.1f}')
+    print('\nAll requests returned the same status codes on both backends.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark: admin dashboard statistics.
+Compares the old five separate COUNT queries with the single aggregate
+query in services/stats.py at increasing appointment volumes.
+
+Usage: python benchmarks/bench_dashboard_stats.py [sizes...]
+"""
+import sys
+from common import setup_database, seed, timeit, count_queries
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+
+def per_count_stats():
+    from models import User, Doctor, Appointment
+    return (
+        User.query.filter_by(role='patient').count(),
+        Appointment.query.count(),
+        Appointment.query.filter_by(status='pending').count(),
+        Appointment.query.filter_by(status='approved').count(),
+        Doctor.query.count(),
+    )
+
+
+def aggregate_stats():
+    from services.stats import get_dashboard_stats
+    return get_dashboard_stats()
+
+
+def run(sizes):
+    app, db_path = setup_database()
+    loaded = 0
+
+    with app.app_context():
+        print(f"queries per call: per-count={count_queries(per_count_stats)}, "
+              f"aggregate={count_queries(aggregate_stats)}")
+
+    print(f"{'appointments':>14} {'per-count (ms)':>16} {'aggregate (ms)':>16} {'speedup':>9}")
+    for size in sorted(sizes):
+        seed(db_path, size - loaded)
+        loaded = size
+        with app.app_context():
+            old = per_count_stats()
+            new = aggregate_stats()
+            assert old == (new.total_patients, new.total_appointments, new.pending_appointments,
+                           new.approved_appointments, new.total_doctors)
+
+            old_ms = timeit(per_count_stats)
+            new_ms = timeit(aggregate_stats)
+        print(f"{size:>14,} {old_ms:>16.2f} {new_ms:>16.2f} {old_ms / new_ms:>8.1f}x")
+
+
+if __name__ == '__main__':
+    run([int(s) for s in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,103 @@
+"""
+Benchmark: the doctor's records page, grouped by patient.
+Compares the old view code (load every record the doctor wrote, group
+them by record.patient in Python, sort by username) with
+Repository.doctor_patient_groups (one statement returning a page of
+patients ordered by lowercase username with their latest records) at
+growing record counts: rows loaded (records + patients), time and SQL
+statements, plus the time of the whole GET /doctor/records page.
+
+Then walks every page forwards (?after=) and backwards (?before=) and
+checks the groups against the old grouping.
+
+Usage: python benchmarks/bench_doctor_records.py [records...]
+"""
+import sys
+from common import setup_database, seed, make_client, login, timeit, count_queries
+
+DEFAULT_SIZES = [10_000, 100_000]
+DOCTOR_ID = 1 # user1
+PER_PATIENT = 3
+
+
+def old_grouping(repository):
+    patients_map = {}
+    for record in repository.doctor_records(DOCTOR_ID):
+        patients_map.setdefault(record.patient, []).append(record)
+    return dict(sorted(patients_map.items(), key=lambda item: item[0].username.lower()))
+
+
+def walk(repository, per_page):
+    groups, cursor, pages = [], None, []
+    while True:
+        page = repository.doctor_patient_groups(DOCTOR_ID, after=cursor, per_page=per_page, per_patient=PER_PATIENT)
+        groups.extend(page.groups)
+        pages.append(page)
+        if not page.has_next:
+            return groups, pages
+        cursor = page.next_cursor
+
+
+def check(repository, expected, per_page=50):
+    groups, pages = walk(repository, per_page)
+    assert [g.patient.id for g in groups] == [p.id for p in expected], 'patient order differs'
+    for group in groups:
+        records = expected[group.patient]
+        assert group.record_count == len(records)
+        # Same visit dates as the old list (ties on the date may be ordered differently)
+        assert [r.visit_date for r in group.records] == [r.visit_date for r in records[:PER_PATIENT]]
+        assert all(r.doctor_id == DOCTOR_ID and r.patient_id == group.patient.id for r in group.records)
+
+    # Backwards from the last page gives the same pages
+    page = pages[-1]
+    for previous in reversed(pages[:-1]):
+        page = repository.doctor_patient_groups(DOCTOR_ID, before=page.prev_cursor, per_page=per_page,
+                                                per_patient=PER_PATIENT)
+        assert [g.patient.id for g in page.groups] == [g.patient.id for g in previous.groups]
+    assert not page.has_prev
+    return len(pages)
+
+
+def run(sizes):
+    app, db_path = setup_database()
+    from models import db
+    from services.repository import get_repository
+
+    client = None
+    seeded = 0
+    print(f"{'records':>8} {'patients':>9} {'old rows':>9} {'old ms':>7} {'old SQL':>8} "
+          f"{'page rows':>10} {'page ms':>8} {'page SQL':>9} {'GET ms':>7}")
+    for size in sizes:
+        seed(db_path, 0, n_records=size - seeded)
+        seeded = size
+        client = client or make_client(app) # After the first seed, which creates the users
+
+        with app.test_request_context():
+            repository = get_repository()
+
+            def fresh(fn):
+                # Each run starts from an empty session, like a request
+                db.session.remove()
+                return fn()
+
+            old_sql = fresh(lambda: count_queries(lambda: old_grouping(repository)))
+            old_ms = timeit(lambda: fresh(lambda: old_grouping(repository)), repeat=3)
+            page_sql = fresh(lambda: count_queries(lambda: repository.doctor_patient_groups(DOCTOR_ID)))
+            page_ms = timeit(lambda: fresh(lambda: repository.doctor_patient_groups(DOCTOR_ID)))
+            page = fresh(lambda: repository.doctor_patient_groups(DOCTOR_ID, per_patient=PER_PATIENT))
+            page_rows = sum(len(group.records) for group in page.groups) + len(page.groups)
+
+            expected = fresh(lambda: old_grouping(repository))
+            old_rows = sum(len(records) for records in expected.values()) + len(expected)
+            pages = check(repository, expected)
+            db.session.remove()
+
+        login(client, 'user1')
+        get_ms = timeit(lambda: client.get('/doctor/records'))
+        print(f"{size:>8,} {len(expected):>9,} {old_rows:>9,} {old_ms:>7.1f} {old_sql:>8} "
+              f"{page_rows:>10,} {page_ms:>8.1f} {page_sql:>9} {get_ms:>7.1f}")
+        print(f"{'':>8} {pages} pages of 50 patients: same order, counts and latest records as before")
+
+
+if __name__ == '__main__':
+    run([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,182 @@
+"""
+Benchmark: dashboard statistics from counter items vs. scans and queries.
+Seeds the DynamoDB tables and, for the admin, doctor and patient
+dashboards of aws_app.py, compares counting the appointments (the old
+scan / index query) with reading the maintained counter items
+(services/dynamo_counters.py): latency and read capacity units
+(estimated from the full size of the items read, 0.5 RCU per 4 KB;
+projections do not lower the read cost).
+
+Then writes users, appointments, status changes and records from several
+threads through DynamoStore and checks that the counters match a full
+recount (rebuild_counters), and that the three dashboards show them.
+
+Runs against moto's in-process DynamoDB by default (pip install moto),
+or against DynamoDB Local when DYNAMODB_ENDPOINT is set (under moto the
+writer threads take turns per call, see serialize_moto_calls).
+
+Usage: python benchmarks/bench_dynamo_counters.py [appointments] [threads]
+"""
+import math
+import random
+import sys
+import threading
+import uuid
+from datetime import datetime
+from common import (seed_dynamo, run_with_dynamodb, dynamo_item_size as item_size, aws_client, timeit, RENDERED,
+                    serialize_moto_calls, DYNAMO_PATIENTS, DYNAMO_DOCTORS, STATUSES)
+from services.dynamo_counters import GLOBAL_KEYS, doctor_key, patient_key, count, rebuild_counters
+from services.dynamo_store import iter_items, parallel_scan
+
+WRITES_PER_THREAD = 50
+
+
+def rcu(nbytes):
+    return math.ceil(nbytes / 4096) * 0.5
+
+
+def read_costs(store, written):
+    appointments = written['appointments']
+    doctor = appointments[0]['doctor_id']
+    patient = appointments[0]['patient_id']
+    summary = ['status']
+
+    def read_bytes(pred):
+        return sum(item_size(a) for a in appointments if pred(a))
+
+    user_bytes = sum(item_size(item) for item in iter_items(store.users.scan))
+    cases = [
+        ('admin dashboard',
+         lambda: (list(parallel_scan(store.appointments, 1, projection=summary)),
+                  store.count_patients(), store.count_doctors()),
+         store.global_counter,
+         read_bytes(lambda a: True) + user_bytes, GLOBAL_KEYS),
+        ('doctor dashboard',
+         lambda: (store.appointments_for_doctor(doctor, projection=summary), store.count_records_for_doctor(doctor)),
+         lambda: store.get_counters(doctor_key(doctor)),
+         read_bytes(lambda a: a['doctor_id'] == doctor), [doctor_key(doctor)]),
+        ('patient dashboard',
+         lambda: store.appointments_for_patient(patient, projection=summary),
+         lambda: store.get_counters(patient_key(patient)),
+         read_bytes(lambda a: a['patient_id'] == patient), [patient_key(patient)]),
+    ]
+
+    print(f"{len(appointments):,} appointments")
+    print(f"{'dashboard':>18} {'count (ms)':>11} {'counter (ms)':>13} {'count RCU':>10} {'counter RCU':>12}")
+    for name, count_fn, counter_fn, count_bytes, keys in cases:
+        counter_rcu = sum(rcu(item_size(item)) for item in store.get_counters(*keys).values())
+        print(f"{name:>18} {timeit(count_fn, repeat=3):>11.1f} {timeit(counter_fn):>13.1f} "
+              f"{rcu(count_bytes):>10.1f} {counter_rcu:>12.1f}")
+
+
+def concurrent_writes(store, written, threads):
+    """
+    Mix of every counted write, from several threads at once.
+    """
+    doctors = [d['id'] for d in written['doctors']]
+    lock = threading.Lock()
+    serialize_moto_calls(store)
+    created = []
+    errors = []
+
+    def worker(n):
+        try:
+            write_mix(n)
+        except Exception as e:
+            with lock:
+                errors.append(e)
+
+    def write_mix(n):
+        rng = random.Random(n)
+        mine = []
+        for i in range(WRITES_PER_THREAD):
+            kind = rng.random()
+            if kind < 0.15:
+                store.put_user({'username': f'writer{n}-{i}', 'email': f'writer{n}-{i}@example.com',
+                                'password_hash': 'x', 'role': 'patient', 'created_at': datetime.utcnow().isoformat()})
+                # Same name again: rejected, and not counted twice
+                assert not store.put_user({'username': f'writer{n}-{i}', 'role': 'patient'})
+            elif kind < 0.6 or not mine:
+                item = {'id': str(uuid.uuid4()), 'patient_id': f'patient{rng.randrange(DYNAMO_PATIENTS)}',
+                        'doctor_id': rng.choice(doctors), 'appointment_date': '2030-01-01',
+                        'start_minute': 540 + 60 * rng.randrange(10), 'reason': 'Checkup', 'status': 'pending',
+                        'created_at': datetime.utcnow().isoformat()}
+                if store.book_appointment(item, 10):
+                    mine.append(item)
+            elif kind < 0.85:
+                item = rng.choice(mine)
+                new_status = rng.choice(STATUSES)
+                if store.set_appointment_status(item, new_status, 10):
+                    item['status'] = new_status
+            else:
+                store.put_record({'id': str(uuid.uuid4()), 'patient_id': f'patient{rng.randrange(DYNAMO_PATIENTS)}',
+                                  'doctor_id': rng.choice(doctors), 'diagnosis': 'Migraine',
+                                  'visit_date': '2030-01-01', 'created_at': datetime.utcnow().isoformat()})
+        with lock:
+            created.extend(mine)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    if errors:
+        raise errors[0]
+
+    # A stale read must not move the counters
+    if created:
+        stale = dict(created[0], status='rejected' if created[0]['status'] != 'rejected' else 'approved')
+        assert not store.set_appointment_status(stale, 'pending')
+    return threads * WRITES_PER_THREAD
+
+
+def snapshot(store):
+    """
+    Every counter item's non-zero values, with the global shards added up
+    (writes spread over them at random, a recount puts it all in one).
+    """
+    counters = {'global': {name: value for name, value in store.global_counter().items() if value}}
+    for item in iter_items(store.counters.scan):
+        values = {}
+        for name, value in item.items():
+            if isinstance(value, set):
+                values[name] = sorted(int(minute) for minute in value)
+            elif name != 'id' and int(value):
+                values[name] = int(value)
+        if item['id'] not in GLOBAL_KEYS:
+            counters[item['id']] = values
+    return counters
+
+
+def run(store, n_appointments, threads):
+    written = seed_dynamo(store, n_appointments)
+    read_costs(store, written)
+
+    writes = concurrent_writes(store, written, threads)
+    maintained = snapshot(store)
+    rebuild_counters(store)
+    recounted = snapshot(store)
+    assert maintained == recounted, 'counters drifted from the tables'
+    print(f"\n{writes} writes from {threads} threads: counters match a full recount ({len(recounted)} items)")
+
+    counter = store.global_counter()
+    assert count(counter, 'doctors') == DYNAMO_DOCTORS
+    aws_client('admin', 'admin').get('/admin/dashboard')
+    assert RENDERED['context']['total_appointments'] == count(counter, 'appointments')
+    assert RENDERED['context']['pending_appointments'] == count(counter, 'pending')
+    assert RENDERED['context']['total_patients'] == count(counter, 'patients')
+    assert all(a.status == 'pending' for a in RENDERED['context']['recent_pending'])
+
+    doctor_items = [a for a in iter_items(store.appointments.scan) if a['doctor_id'] == 'doc-0']
+    aws_client('doctor', 'doctor0').get('/doctor/dashboard')
+    assert RENDERED['context']['total_appointments'] == len(doctor_items)
+    patient_items = store.appointments_for_patient('patient0')
+    aws_client('patient', 'patient0').get('/patient/dashboard')
+    assert RENDERED['context']['approved_appointments'] == sum(1 for a in patient_items if a['status'] == 'approved')
+    print("admin, doctor and patient dashboards: OK")
+
+
+if __name__ == '__main__':
+    run_with_dynamodb(run,
+                      int(sys.argv[1]) if len(sys.argv) > 1 else 20_000,
+                      int(sys.argv[2]) if len(sys.argv) > 2 else 8)
@@ -0,0 +1,62 @@
+"""
+Benchmark: Users-table reads for the logged-in user in aws_app.py.
+Browses the patient pages of aws_app.py and counts GetItem calls on
+Users with the session copy of the user (USER_SESSION_TTL) enabled and
+disabled. The old get_current_user read Users on every call: once per
+render (inject_user) plus any direct call from a view.
+
+Runs against moto's in-process DynamoDB by default (pip install moto),
+or against DynamoDB Local when DYNAMODB_ENDPOINT is set.
+
+Usage: python benchmarks/bench_dynamo_current_user.py [page-views]
+"""
+import sys
+from common import seed_dynamo, run_with_dynamodb, aws_client, timeit, RENDERED
+
+PAGES = ['/', '/patient/dashboard', '/patient/appointments', '/patient/records']
+
+
+def browse(client, views):
+    for i in range(views):
+        response = client.get(PAGES[i % len(PAGES)])
+        assert response.status_code in (200, 302), response.status_code
+
+
+def user_reads(aws_app, fn):
+    reads = []
+
+    def on_params(params, **kwargs):
+        if params.get('TableName') == 'Users':
+            reads.append(params)
+
+    events = aws_app.get_dynamodb().meta.client.meta.events
+    events.register('provide-client-params.dynamodb.GetItem', on_params)
+    try:
+        fn()
+    finally:
+        events.unregister('provide-client-params.dynamodb.GetItem', on_params)
+    return len(reads)
+
+
+def run(store, views):
+    import aws_app
+
+    seed_dynamo(store, 1000)
+    patient = 'patient1'
+    print(f"{views} page views as {patient}")
+    print(f"{'setting':>28} {'Users GetItems':>15} {'ms/page':>8}")
+
+    for ttl in (0, 300):
+        aws_app.USER_SESSION_TTL = ttl
+        client = aws_client('patient', patient)
+        reads = user_reads(aws_app, lambda: browse(client, views))
+        ms = timeit(lambda: browse(client, len(PAGES)), repeat=3) / len(PAGES)
+        label = 'per request (TTL off)' if ttl == 0 else f'session copy (TTL {ttl}s)'
+        print(f"{label:>28} {reads:>15} {ms:>8.1f}")
+        assert RENDERED['context']['current_user']['username'] == patient
+        assert 'password_hash' not in RENDERED['context']['current_user']
+        assert reads == (views if ttl == 0 else 1), reads
+
+
+if __name__ == '__main__':
+    run_with_dynamodb(run, int(sys.argv[1]) if len(sys.argv) > 1 else 40)
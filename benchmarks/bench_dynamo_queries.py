@@ -0,0 +1,100 @@
+"""
+Benchmark: DynamoDB full-table scans vs. GSI-backed Key queries.
+Seeds the tables from services/dynamo_tables.py with synthetic data and,
+for each patient/doctor access pattern of aws_app.py, compares a
+(paginated) scan with FilterExpression against the DynamoStore query:
+latency and read capacity units (estimated from the size
+of the items read, eventually consistent: 0.5 RCU per 4 KB).
+
+Runs against moto's in-process DynamoDB by default (pip install moto),
+or against DynamoDB Local when DYNAMODB_ENDPOINT is set.
+Also runs the patient and doctor views of aws_app.py once.
+
+Usage: python benchmarks/bench_dynamo_queries.py [appointments]
+"""
+import math
+import sys
+from boto3.dynamodb.conditions import Attr
+from common import seed_dynamo, run_with_dynamodb, dynamo_item_size as item_size, aws_client, timeit
+from services.dynamo_store import iter_items
+
+
+def rcu(nbytes):
+    return math.ceil(nbytes / 4096) * 0.5
+
+
+def full_scan(table, condition):
+    """
+    The old access pattern: scan the whole table with a FilterExpression
+    (all pages).
+    """
+    return list(iter_items(table.scan, FilterExpression=condition))
+
+
+def run(store, n_appointments):
+    sizes = seed_dynamo(store, n_appointments)
+    appointments = sizes['appointments']
+    table_bytes = sum(item_size(a) for a in appointments)
+    doctor_bytes = sum(item_size(d) for d in sizes['doctors'])
+
+    patient = appointments[0]['patient_id']
+    doctor = appointments[0]['doctor_id']
+    day = appointments[0]['appointment_date']
+
+    def matching_bytes(pred):
+        return sum(item_size(a) for a in appointments if pred(a))
+
+    cases = [
+        ('patient appointments',
+         lambda: full_scan(store.appointments, Attr('patient_id').eq(patient)),
+         lambda: store.appointments_for_patient(patient),
+         table_bytes, matching_bytes(lambda a: a['patient_id'] == patient)),
+        ('doctor appointments',
+         lambda: full_scan(store.appointments, Attr('doctor_id').eq(doctor)),
+         lambda: store.appointments_for_doctor(doctor),
+         table_bytes, matching_bytes(lambda a: a['doctor_id'] == doctor)),
+        ('capacity check',
+         lambda: full_scan(store.appointments, Attr('doctor_id').eq(doctor) & Attr('appointment_date').eq(day)
+                           & Attr('status').eq('approved')),
+         lambda: store.count_appointments(doctor, day),
+         table_bytes, matching_bytes(lambda a: a['doctor_id'] == doctor and a['appointment_date'] == day)),
+        ('doctor profile',
+         lambda: full_scan(store.doctors, Attr('user_id').eq('doctor7')),
+         lambda: store.doctor_for_user('doctor7'),
+         doctor_bytes, item_size(sizes['doctors'][7])),
+    ]
+
+    # The scan and the query must agree before their costs are compared
+    assert len(full_scan(store.appointments, Attr('patient_id').eq(patient))) == len(store.appointments_for_patient(patient))
+    assert len(full_scan(store.appointments, Attr('doctor_id').eq(doctor))) == len(store.appointments_for_doctor(doctor))
+    assert len(full_scan(store.appointments, Attr('doctor_id').eq(doctor) & Attr('appointment_date').eq(day)
+                         & Attr('status').eq('approved'))) == store.count_appointments(doctor, day)
+
+    print(f"{n_appointments:,} appointments")
+    print(f"{'access pattern':>22} {'scan (ms)':>10} {'query (ms)':>11} {'scan RCU':>9} {'query RCU':>10}")
+    for name, scan_fn, query_fn, scan_bytes, query_bytes in cases:
+        print(f"{name:>22} {timeit(scan_fn):>10.1f} {timeit(query_fn):>11.1f} "
+              f"{rcu(scan_bytes):>9.1f} {rcu(query_bytes):>10.1f}")
+
+    smoke_views(store, patient, doctor)
+
+
+def smoke_views(store, patient, doctor):
+    """
+    Run the patient and doctor views of aws_app.py once against the seeded
+    tables (up to render_template, see common.aws_client).
+    """
+    doctor_user = store.get_doctor(doctor)['user_id']
+    for username, role, urls in (
+        (patient, 'patient', ['/patient/dashboard', '/patient/appointments', '/patient/records']),
+        (doctor_user, 'doctor', ['/doctor/dashboard', '/doctor/appointments']),
+    ):
+        client = aws_client(role, username)
+        for url in urls:
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+    print("aws_app views: OK")
+
+
+if __name__ == '__main__':
+    run_with_dynamodb(run, int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
@@ -0,0 +1,104 @@
+"""
+Benchmark: loading the patients/doctors of a page of DynamoDB appointments.
+Runs /doctor/appointments of aws_app.py and touches, for every row, the
+attributes the template reads (patient.username, patient.email,
+doctor.name), comparing
+- the old wrappers: one GetItem per property access, with
+- RelatedLoader: every referenced key in one BatchGetItem per 100 keys.
+Also checks that UnprocessedKeys are retried.
+
+Runs against moto's in-process DynamoDB by default (pip install moto),
+or against DynamoDB Local when DYNAMODB_ENDPOINT is set.
+
+Usage: python benchmarks/bench_dynamo_related.py [appointments]
+"""
+import sys
+from common import seed_dynamo, run_with_dynamodb, aws_client, timeit, RENDERED
+from services.dynamo_store import batch_get
+
+
+def touch_rows(appointments):
+    return [(a.patient.username, a.patient.email, a.doctor.name) for a in appointments]
+
+
+def old_touch_rows(store, appointments):
+    # What the properties used to do: a GetItem on every access
+    return [(store.get_user(a.patient_id)['username'], store.get_user(a.patient_id)['email'],
+             store.get_doctor(a.doctor_id)['name']) for a in appointments]
+
+
+def count_calls(aws_app, fn):
+    """
+    Run fn and return (result, {operation: calls}) for the aws_app client.
+    """
+    calls = {}
+
+    def on_call(model, **kwargs):
+        calls[model.name] = calls.get(model.name, 0) + 1
+
+    events = aws_app.get_dynamodb().meta.client.meta.events
+    events.register('before-call.dynamodb', on_call)
+    try:
+        return fn(), calls
+    finally:
+        events.unregister('before-call.dynamodb', on_call)
+
+
+def doctor_page(aws_app, username):
+    with aws_app.app.test_request_context('/doctor/appointments'):
+        aws_app.session['username'] = username
+        aws_app.session['role'] = 'doctor'
+        aws_app.doctor_appointments()
+        return touch_rows(RENDERED['context']['appointments'])
+
+
+def check_unprocessed_keys(store):
+    """
+    Make the first BatchGetItem answer return half of its keys as
+    UnprocessedKeys and check batch_get still returns every item.
+    """
+    real = store.dynamodb.batch_get_item
+    state = {'calls': 0}
+
+    def flaky(RequestItems):
+        state['calls'] += 1
+        if state['calls'] > 1:
+            return real(RequestItems=RequestItems)
+        held_back = {table: {'Keys': request['Keys'][::2]} for table, request in RequestItems.items()}
+        served = {table: {'Keys': request['Keys'][1::2]} for table, request in RequestItems.items()}
+        response = real(RequestItems=served)
+        response['UnprocessedKeys'] = held_back
+        return response
+
+    store.dynamodb.batch_get_item = flaky
+    try:
+        keys = [{'username': f'patient{i}'} for i in range(250)]
+        found = batch_get(store.dynamodb, {'Users': keys})
+    finally:
+        store.dynamodb.batch_get_item = real
+    assert len(found['Users']) == 250, len(found['Users'])
+    print(f"UnprocessedKeys retried: OK ({state['calls']} BatchGetItem calls for 250 keys)")
+
+
+def run(store, n_appointments):
+    import aws_app
+
+    seed_dynamo(store, n_appointments)
+    aws_client('doctor', 'doctor0')  # installs the render capture
+    rows, calls = count_calls(aws_app, lambda: doctor_page(aws_app, 'doctor0'))
+    appointments = RENDERED['context']['appointments']
+    _, old_calls = count_calls(aws_app, lambda: old_touch_rows(aws_app.get_store(), appointments))
+    assert rows == old_touch_rows(aws_app.get_store(), appointments)
+
+    print(f"{n_appointments:,} appointments, /doctor/appointments shows {len(rows)} rows")
+    print(f"  old wrappers: {old_calls}")
+    print(f"  batch loader: {calls}")
+    print(f"  time: old {timeit(lambda: old_touch_rows(aws_app.get_store(), appointments)):.1f} ms, "
+          f"page with batch loading {timeit(lambda: doctor_page(aws_app, 'doctor0')):.1f} ms "
+          f"(includes the appointment query)")
+
+    check_unprocessed_keys(store)
+
+
+if __name__ == '__main__':
+    run_with_dynamodb(run, int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
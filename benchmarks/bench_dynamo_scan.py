@@ -0,0 +1,57 @@
+"""
+Benchmark: full-table reads for the aws_app.py admin dashboard.
+Seeds more than 1 MB of appointments so scans span several pages, then
+- compares the first scan page (what the dashboard used to count) with
+  iter_items following LastEvaluatedKey,
+- measures response payload with and without a ProjectionExpression,
+- times parallel scans with 1, 2, 4 and 8 segments,
+- runs /admin/dashboard and checks its counts against the seeded data.
+
+Runs against moto's in-process DynamoDB by default (pip install moto),
+or against DynamoDB Local when DYNAMODB_ENDPOINT is set.
+
+Usage: python benchmarks/bench_dynamo_scan.py [appointments]
+"""
+import sys
+from common import seed_dynamo, run_with_dynamodb, dynamo_item_size, aws_client, timeit, RENDERED, DYNAMO_PATIENTS
+from services.dynamo_store import iter_items, parallel_scan
+
+# About 1 KB per appointment, as with a typical free-text reason
+REASON = 'Follow-up after lab results. ' * 35
+SUMMARY = ['id', 'status', 'created_at']
+
+
+def run(store, n_appointments):
+    written = seed_dynamo(store, n_appointments, reason=REASON)['appointments']
+    pending = sum(1 for a in written if a['status'] == 'pending')
+    approved = sum(1 for a in written if a['status'] == 'approved')
+
+    first_page = store.appointments.scan()['Count']
+    every_page = sum(1 for _ in iter_items(store.appointments.scan))
+    print(f"{n_appointments:,} appointments: first scan page {first_page:,} items, "
+          f"all pages {every_page:,} items")
+    assert every_page == n_appointments
+
+    full = sum(dynamo_item_size(item) for item in iter_items(store.appointments.scan))
+    projected = sum(dynamo_item_size(item) for item in iter_items(store.appointments.scan, projection=SUMMARY))
+    print(f"payload: full items {full / 1024:,.0f} KB, projected {projected / 1024:,.0f} KB")
+
+    print(f"{'segments':>9} {'scan (ms)':>10}")
+    for segments in (1, 2, 4, 8):
+        assert sum(1 for _ in parallel_scan(store.appointments, segments, projection=SUMMARY)) == n_appointments
+        ms = timeit(lambda: list(parallel_scan(store.appointments, segments, projection=SUMMARY)), repeat=3)
+        print(f"{segments:>9} {ms:>10.1f}")
+
+    response = aws_client('admin', 'admin').get('/admin/dashboard')
+    assert response.status_code == 200, response.status_code
+    context = RENDERED['context']
+    assert context['total_appointments'] == n_appointments
+    assert context['pending_appointments'] == pending
+    assert context['approved_appointments'] == approved
+    assert context['total_patients'] == DYNAMO_PATIENTS
+    assert all(a.status == 'pending' for a in context['recent_pending'])
+    print("admin dashboard counts: OK")
+
+
+if __name__ == '__main__':
+    run_with_dynamodb(run, int(sys.argv[1]) if len(sys.argv) > 1 else 5_000)
@@ -0,0 +1,129 @@
+"""
+Benchmark: the streaming admin exports (GET /admin/export/<kind>.<fmt>).
+For growing appointment and record tables, compares:
+- loading every row through the ORM and writing the CSV afterwards
+  (what an export built on Appointment.query.all() would do),
+- services.exports (yield_per batches written out as they are read),
+- the whole GET request, read chunk by chunk, plain and gzipped.
+Reports time, rows/s, bytes and the tracemalloc peak, which should stay
+flat for the streamed export however many rows there are. Checks the
+streamed CSV parses and has exactly COUNT(*) rows for each filter.
+
+Usage: python benchmarks/bench_exports.py [rows ...]
+"""
+import csv
+import gzip
+import io
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from common import setup_database, seed, make_client, login
+
+FILTERS = [
+    # label, query string
+    ('everything', {}),
+    ('last 90 days', {'from': str(date.today() - timedelta(days=90)), 'to': str(date.today())}),
+    ('one doctor, approved', {'doctor': '7', 'status': 'approved'}),
+]
+
+
+def measure(fn):
+    """
+    Run fn() twice: once timed, once under tracemalloc (which slows it
+    down). Returns (its result, seconds, peak MB allocated).
+    """
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def orm_export():
+    from models import db, Appointment
+    db.session.remove()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for appointment in Appointment.query.with_parties().all():
+        writer.writerow([appointment.id, appointment.appointment_date, appointment.appointment_time,
+                         appointment.status, appointment.doctor_id, appointment.doctor.name,
+                         appointment.patient_id, appointment.patient.username, appointment.reason])
+    return len(buffer.getvalue())
+
+
+def streamed_export(kind, fmt):
+    from models import db
+    from services.exports import export_chunks
+    db.session.remove()
+    return sum(len(chunk) for chunk in export_chunks(kind, fmt))
+
+
+def download(client, url, headers=None, keep=False):
+    """
+    GET `url` and read the body chunk by chunk, like a client saving it to
+    disk. Returns the body if `keep`, else its size.
+    """
+    response = client.get(url, headers=headers or {}, buffered=False)
+    assert response.status_code == 200, f'{url} returned {response.status_code}'
+    chunks, size = [], 0
+    for chunk in response.response:
+        size += len(chunk)
+        if keep:
+            chunks.append(chunk)
+    response.close()
+    return b''.join(chunks) if keep else size
+
+
+def expected_rows(kind, args):
+    from models import db
+    from services.exports import export_query, parse_export_filters
+    from sqlalchemy import func, select
+    statement = export_query(kind, **parse_export_filters(args)).order_by(None)
+    return db.session.scalar(select(func.count()).select_from(statement.subquery()))
+
+
+def run(sizes):
+    app, db_path = setup_database()
+    client, seeded = None, 0
+    for size in sizes:
+        seed(db_path, size - seeded, n_records=size - seeded)
+        seeded = size
+        if client is None:
+            client = make_client(app)
+            login(client, 'admin')
+        print(f"\n{size:,} appointments and {size:,} records")
+        print(f"{'export':>28} {'seconds':>8} {'rows/s':>10} {'MB out':>7} {'peak MB':>8}")
+        with app.test_request_context():
+            size_out, seconds, peak = measure(orm_export)
+            print(f"{'ORM .all() then CSV':>28} {seconds:>8.2f} {size / seconds:>10,.0f} "
+                  f"{size_out / 2 ** 20:>7.1f} {peak:>8.1f}")
+            for kind, fmt in (('appointments', 'csv'), ('appointments', 'ndjson'), ('records', 'csv')):
+                size_out, seconds, peak = measure(lambda: streamed_export(kind, fmt))
+                print(f"{'streamed ' + kind + '.' + fmt:>28} {seconds:>8.2f} {size / seconds:>10,.0f} "
+                      f"{size_out / 2 ** 20:>7.1f} {peak:>8.1f}")
+
+        url = '/admin/export/appointments.csv'
+        plain, seconds, peak = measure(lambda: download(client, url))
+        print(f"{'GET appointments.csv':>28} {seconds:>8.2f} {size / seconds:>10,.0f} {plain / 2 ** 20:>7.1f} {peak:>8.1f}")
+        gzipped = {'Accept-Encoding': 'gzip'}
+        packed, seconds, peak = measure(lambda: download(client, url, gzipped))
+        print(f"{'... with gzip':>28} {seconds:>8.2f} {size / seconds:>10,.0f} {packed / 2 ** 20:>7.1f} {peak:>8.1f}"
+              f"  ({plain / packed:.1f}x smaller)")
+        assert gzip.decompress(download(client, url, gzipped, keep=True)) == download(client, url, keep=True)
+
+        with app.test_request_context():
+            for label, args in FILTERS:
+                for kind in ('appointments', 'records'):
+                    query = '&'.join(f'{key}={value}' for key, value in args.items())
+                    rows = list(csv.reader(io.StringIO(download(client, f'/admin/export/{kind}.csv?{query}', keep=True).decode())))
+                    count = expected_rows(kind, args)
+                    assert len(rows) - 1 == count, (kind, label, len(rows) - 1, count)
+                    print(f"{kind + ', ' + label:>40}: {count:,} rows, as COUNT(*)")
+
+
+if __name__ == '__main__':
+    run([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000])
@@ -0,0 +1,74 @@
+"""
+Benchmark: SQL statements per listing page.
+Renders the appointment listings and dashboards at growing row counts
+and checks the number of queries stays constant (no N+1 lazy loads).
+Each page is requested once before counting, so the logged-in user comes
+from the identity cache (services/identity.py) at every size; the
+listing count cache is cleared so the COUNT query is always included.
+
+Usage: python benchmarks/bench_listing_queries.py [sizes...]
+"""
+import sys
+from common import setup_database, seed, timeit, count_queries, make_client, login
+
+DEFAULT_SIZES = [100, 1_000, 10_000]
+
+# (login as, url) - user1 is the doctor with id 1, user51 the first patient
+PAGES = [
+    ('admin', '/admin/dashboard'),
+    ('admin', '/admin/appointments'),
+    ('user1', '/doctor/dashboard'),
+    ('user1', '/doctor/appointments'),
+    ('user51', '/patient/dashboard'),
+    ('user51', '/patient/appointments'),
+]
+
+
+def measure(app, db_path, sizes):
+    """
+    Grow the appointments table to each size in turn and request every
+    page. Returns {url: [(size, queries, ms), ...]}.
+    """
+    from services import pagination
+
+    loaded = 0
+    results = {}
+
+    for size in sorted(sizes):
+        seed(db_path, size - loaded)
+        loaded = size
+        client = make_client(app)
+
+        for username, url in PAGES:
+            login(client, username)
+            with app.app_context():
+                fetch = lambda: client.get(url)
+                fetch()
+                pagination.get_count_cache().clear()
+                queries = count_queries(fetch)
+                ms = timeit(fetch, repeat=3)
+            results.setdefault(url, []).append((size, queries, ms))
+    return results
+
+
+def growing_pages(results):
+    """
+    URLs whose query count changed with the number of rows.
+    """
+    return [url for url, rows in results.items() if len({queries for _, queries, _ in rows}) != 1]
+
+
+def run(sizes):
+    app, db_path = setup_database()
+    results = measure(app, db_path, sizes)
+
+    for url, rows in results.items():
+        print(url)
+        for size, queries, ms in rows:
+            print(f"  {size:>10,} appointments  {queries:>3} queries  {ms:>9.2f} ms")
+    growing = growing_pages(results)
+    assert not growing, f'query count grows with rows: {", ".join(growing)}'
+
+
+if __name__ == '__main__':
+    run([int(s) for s in sys.argv[1:]] or DEFAULT_SIZES)
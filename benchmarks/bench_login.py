@@ -0,0 +1,95 @@
+"""
+Benchmark: login throughput per password hashing policy.
+For every PASSWORD_HASH_METHOD setting, stores a hash made with that
+policy and drives POST /login from several client threads, reporting
+logins/sec overall and per core (verification runs on the bounded
+hashing pool, PASSWORD_HASH_WORKERS = one per CPU by default).
+Also checks that a login under a new policy upgrades the stored hash.
+
+Usage: python benchmarks/bench_login.py [seconds-per-setting] [client-threads]
+"""
+import os
+import sys
+import threading
+import time
+from common import setup_database, seed, make_client
+
+SETTINGS = [
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:100000',
+    'scrypt',
+    'scrypt:16384:8:1',
+]
+
+
+def drive_logins(app, seconds, threads):
+    """
+    Log user51 in repeatedly from `threads` test clients for `seconds`.
+    Returns (logins, elapsed, latencies).
+    """
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client_loop():
+        client = app.test_client()
+        mine = []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = client.post('/login', data={'username': 'user51', 'password': 'bench'})
+            assert response.status_code == 302, response.status_code
+            mine.append(time.perf_counter() - start)
+            client.get('/logout')
+        with lock:
+            latencies.extend(mine)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=client_loop) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return len(latencies), time.perf_counter() - started, sorted(latencies)
+
+
+def run(seconds, threads):
+    from models import db, User
+
+    app, db_path = setup_database()
+    seed(db_path, 0, n_patients=100, n_doctors=5)
+    make_client(app)
+    cores = os.cpu_count() or 1
+
+    print(f"{cores} CPU(s), {threads} client threads, {seconds}s per setting")
+    print(f"{'method':>24} {'hash prefix':>24} {'logins/s':>10} {'per core':>10} {'p95 (ms)':>10}")
+    for method in SETTINGS:
+        app.config['PASSWORD_HASH_METHOD'] = method
+        with app.app_context():
+            user = User.query.filter_by(username='user51').first()
+            user.set_password('bench')
+            db.session.commit()
+            prefix = user.password_hash.split('$', 1)[0]
+
+        logins, elapsed, latencies = drive_logins(app, seconds, threads)
+        rate = logins / elapsed
+        workers = app.config.get('PASSWORD_HASH_WORKERS') or cores
+        p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0
+        print(f"{method:>24} {prefix:>24} {rate:>10.1f} {rate / min(workers, cores):>10.1f} {p95:>10.1f}")
+
+    # A hash from an older policy is replaced at the next successful login
+    with app.app_context():
+        app.config['PASSWORD_HASH_METHOD'] = SETTINGS[0]
+        user = User.query.filter_by(username='user51').first()
+        user.set_password('bench')
+        db.session.commit()
+    app.config['PASSWORD_HASH_METHOD'] = 'scrypt'
+    assert app.test_client().post('/login', data={'username': 'user51', 'password': 'bench'}).status_code == 302
+    with app.app_context():
+        stored = User.query.filter_by(username='user51').first().password_hash
+    assert stored.startswith('scrypt:'), stored
+    print("rehash on login: OK")
+
+
+if __name__ == '__main__':
+    run(float(sys.argv[1]) if len(sys.argv) > 1 else 5,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 8)
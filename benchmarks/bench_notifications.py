@@ -0,0 +1,105 @@
+"""
+Benchmark: synchronous SNS publishes vs. the batched notification queue.
+Sends a burst of notifications the way login/signup do and compares the
+time spent on the request path and the number of SNS calls:
+- old: one Publish per notification, made by the request,
+- new: NotificationQueue.send(); a worker publishes batches of 10.
+SNS round trips are simulated with InMemoryPublisher(delay=...).
+Also checks the retry path and PublishBatch against moto's SNS.
+
+Usage: python benchmarks/bench_notifications.py [messages] [sns-latency-ms]
+"""
+import os
+import sys
+import time
+from common import ROOT  # noqa: F401  (puts the project root on sys.path)
+from services.notifications import NotificationQueue, InMemoryPublisher, SNSPublisher
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[max(0, int(len(samples) * fraction) - 1)] * 1000
+
+
+def request_path(send, messages):
+    latencies = []
+    for i in range(messages):
+        start = time.perf_counter()
+        send('User Login', f'User patient{i} has logged in.')
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def check_retries():
+    publisher = InMemoryPublisher(fail_calls=2)
+    queue = NotificationQueue(publisher, backoff=0.01)
+    for i in range(25):
+        queue.send('User Login', f'User patient{i} has logged in.')
+    assert queue.flush(timeout=10)
+    metrics = queue.metrics()
+    assert len(publisher.messages) == 25 and metrics['retries'] > 0 and metrics['failed'] == 0, metrics
+    print(f"retry after throttling: OK ({metrics['retries']} entries retried)")
+
+    from botocore.exceptions import EndpointConnectionError
+    unreachable = EndpointConnectionError(endpoint_url='https://sns.us-east-1.amazonaws.com/')
+    publisher = InMemoryPublisher(fail_calls=2, error=unreachable)
+    queue = NotificationQueue(publisher, backoff=0.01)
+    for i in range(5):
+        queue.send('User Login', f'User patient{i} has logged in.')
+    assert queue.flush(timeout=10)
+    assert len(publisher.messages) == 5 and queue.metrics()['failed'] == 0, queue.metrics()
+
+    publisher = InMemoryPublisher(fail_calls=10, error=unreachable)
+    queue = NotificationQueue(publisher, max_attempts=3, backoff=0.01)
+    queue.send('User Login', 'User patient0 has logged in.')
+    assert queue.flush(timeout=10)
+    metrics = queue.metrics()
+    assert publisher.calls == 3 and metrics['failed'] == 1, metrics
+    print("retry after connection errors, then give up and count the batch: OK")
+
+
+def check_sns():
+    try:
+        from moto import mock_aws
+    except ImportError:
+        print("moto not installed: PublishBatch check skipped")
+        return
+    import boto3
+
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    with mock_aws():
+        sns = boto3.client('sns', region_name='us-east-1')
+        topic = sns.create_topic(Name='aws_capstone_topic')['TopicArn']
+        queue = NotificationQueue(SNSPublisher(sns, topic))
+        for i in range(23):
+            queue.send('New User Signup', f'User patient{i} has signed up.')
+        assert queue.flush(timeout=10)
+        metrics = queue.metrics()
+        assert metrics['sent'] == 23 and metrics['batches'] == 3, metrics
+    print("PublishBatch against moto SNS: OK")
+
+
+def run(messages, latency_ms):
+    old = InMemoryPublisher(delay=latency_ms / 1000)
+    old_latencies = request_path(lambda subject, message: old.publish([(subject, message)]), messages)
+
+    new = InMemoryPublisher(delay=latency_ms / 1000)
+    queue = NotificationQueue(new)
+    new_latencies = request_path(queue.send, messages)
+    assert queue.flush(timeout=60)
+    assert len(new.messages) == messages
+
+    print(f"{messages} notifications, simulated SNS round trip {latency_ms} ms")
+    print(f"{'':>6} {'p50 (ms)':>9} {'p95 (ms)':>9} {'SNS calls':>10}")
+    for name, latencies, publisher in (('old', old_latencies, old), ('queue', new_latencies, new)):
+        print(f"{name:>6} {percentile(latencies, 0.5):>9.3f} {percentile(latencies, 0.95):>9.3f} {publisher.calls:>10}")
+    print("queue metrics:", queue.metrics())
+
+    check_retries()
+    check_sns()
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 30)
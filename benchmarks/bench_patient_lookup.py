@@ -0,0 +1,110 @@
+"""
+Benchmark: the admin patient autocomplete (GET /admin/patients/lookup).
+Gives the synthetic patients realistic usernames and emails
+(first.last<n>@<domain>) and, for a set of typed inputs, compares:
+- a LIKE '%input%' scan of users (what a search box would do without
+  an index),
+- services.patient_lookup (lower() prefix indexes, then the trigram
+  index for substrings),
+- the whole GET request: time and JSON bytes, next to the bytes of a
+  full page of GET /admin/patients.
+Checks every answer against a brute-force match over all patients:
+prefix matches come first and the list is as long as it can be.
+
+Usage: python benchmarks/bench_patient_lookup.py [patients]
+"""
+import random
+import sqlite3
+import sys
+import time
+from common import setup_database, seed, make_client, login, timeit
+
+FIRST = ('amelia', 'oliver', 'isla', 'george', 'ava', 'noah', 'mia', 'arthur', 'priya', 'mohammed', 'sofia',
+         'leo', 'grace', 'jack', 'fatima', 'harry', 'chloe', 'lucas', 'zara', 'ethan', 'wei', 'anika', 'mateo')
+LAST = ('smith', 'jones', 'khan', 'patel', 'williams', 'brown', 'taylor', 'davies', 'evans', 'thomas', 'nguyen',
+        'garcia', 'kowalski', 'okafor', 'murphy', 'rossi', 'schmidt', 'haddad', 'silva', 'tanaka')
+DOMAINS = ('mail.com', 'example.org', 'inbox.net', 'post.co.uk')
+INPUTS = [
+    # label, typed input
+    ('1 char', 'a'),
+    ('2 chars', 'am'),
+    ('username prefix', 'amelia.k'),
+    ('exact username', None), # Filled in with a real username
+    ('email prefix', 'Priya.'),
+    ('substring', 'khan'),
+    ('substring, rare', 'owalski4'),
+    ('domain', 'inbox.net'),
+    ('no match', 'zzqx'),
+]
+LIMIT = 10
+
+
+def rename(db_path, rng):
+    conn = sqlite3.connect(db_path)
+    ids = [row[0] for row in conn.execute("SELECT id FROM users WHERE role = 'patient'")]
+    rows = []
+    for user_id in ids:
+        name = f'{rng.choice(FIRST)}.{rng.choice(LAST)}{user_id}'
+        rows.append((name, f'{name}@{rng.choice(DOMAINS)}', user_id))
+    conn.executemany("UPDATE users SET username = ?, email = ? WHERE id = ?", rows)
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.commit()
+    patients = [(user_id, username, email) for username, email, user_id in rows]
+    conn.close()
+    return patients
+
+
+def like_scan(term):
+    from sqlalchemy import text
+    from models import db
+    return db.session.execute(text(
+        "SELECT id, username, email FROM users WHERE role = 'patient' "
+        "AND (username LIKE :p OR email LIKE :p) ORDER BY username LIMIT :limit"),
+        {'p': f'%{term}%', 'limit': LIMIT}).all()
+
+
+def check(term, result, patients):
+    from services.patient_lookup import MIN_SUBSTRING
+    term = term.lower()
+    prefix = [p for p in patients if p[1].lower().startswith(term) or p[2].lower().startswith(term)]
+    matching = prefix if len(term) < MIN_SUBSTRING else [p for p in patients if term in p[1].lower() or term in p[2].lower()]
+    ids = [p['id'] for p in result]
+    assert len(ids) == len(set(ids)) == min(LIMIT, len(matching)), (term, len(ids), len(matching))
+    assert set(ids) <= {p[0] for p in matching}, term
+    prefix_ids = {p[0] for p in prefix}
+    n_prefix = min(LIMIT, len(prefix_ids))
+    assert set(ids[:n_prefix]) <= prefix_ids, f'{term}: prefix matches must come first'
+    return len(matching)
+
+
+def run(n_patients):
+    app, db_path = setup_database()
+    seed(db_path, 0, n_patients=n_patients)
+    client = make_client(app)
+    patients = rename(db_path, random.Random(3))
+    INPUTS[3] = ('exact username', patients[len(patients) // 2][1])
+
+    from models import db
+    from services.patient_lookup import lookup_patients
+
+    login(client, 'admin')
+    page_bytes = len(client.get('/admin/patients?per_page=200').data)
+    print(f"{n_patients:,} patients; one page of /admin/patients (200 rows): {page_bytes:,} bytes\n")
+    print(f"{'input':>16} {'typed':>26} {'matches':>8} {'LIKE ms':>8} {'lookup ms':>10} {'GET ms':>7} {'JSON bytes':>11}")
+    with app.test_request_context():
+        for label, term in INPUTS:
+            result = lookup_patients(term, LIMIT)
+            matches = check(term, result, patients)
+            like_ms = timeit(lambda: like_scan(term), repeat=3)
+            lookup_ms = timeit(lambda: (db.session.remove(), lookup_patients(term, LIMIT)), repeat=20)
+            response = client.get('/admin/patients/lookup', query_string={'q': term})
+            assert [p['id'] for p in response.get_json()['patients']] == [p['id'] for p in result]
+            get_ms = timeit(lambda: client.get('/admin/patients/lookup', query_string={'q': term}), repeat=20)
+            print(f"{label:>16} {term:>26} {matches:>8,} {like_ms:>8.1f} {lookup_ms:>10.2f} {get_ms:>7.2f} "
+                  f"{len(response.data):>11,}")
+    print("\nEvery answer matches a brute-force search (prefix matches first, up to the limit).")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,212 @@
+"""
+Benchmark: full-text search over patient records (services/record_search.py).
+Builds a synthetic corpus of clinical-looking records (diagnosis,
+prescription with dose, free-text notes with the usual boilerplate words)
+through the FTS5 sync triggers and reports:
+- insert throughput with the triggers, and the cost of one ORM insert,
+- median / p95 time of search_records for rare, frequent, prefix, phrase
+  and boilerplate queries, unscoped and scoped by doctor, patient and
+  visit dates, for the first page and for the page after it,
+- the same search done as LIKE '%term%' scans, the only option before,
+- for patient-scoped searches, that the results are exactly the records
+  whose text contains the term.
+
+Usage: python benchmarks/bench_record_search.py [records] [patients]
+"""
+import random
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+from common import setup_database, seed
+
+N_DOCTORS = 50
+DIAGNOSES = (
+    'Essential hypertension', 'Type 2 diabetes mellitus', 'Migraine without aura', 'Acute bronchitis',
+    'Community acquired pneumonia', 'Seasonal influenza', 'Gastroesophageal reflux disease', 'Iron deficiency anaemia',
+    'Hypothyroidism', 'Atrial fibrillation', 'Stable angina', 'Chronic kidney disease stage 3', 'Asthma exacerbation',
+    'Lumbar strain', 'Osteoarthritis of the knee', 'Urinary tract infection', 'Generalised anxiety disorder',
+    'Major depressive episode', 'Allergic rhinitis', 'Acute otitis media', 'Tension headache', 'Sprained ankle',
+    'Cellulitis of the leg', 'Gout flare', 'Peptic ulcer', 'Irritable bowel syndrome', 'Vitamin D deficiency',
+    'Hyperlipidaemia', 'Benign paroxysmal positional vertigo', 'Plantar fasciitis', 'Carpal tunnel syndrome',
+    'Conjunctivitis', 'Eczema', 'Psoriasis', 'Sinusitis', 'Tonsillitis', 'Shingles', 'Insomnia', 'Obesity',
+    'Heart failure with reduced ejection fraction',
+)
+DRUGS = (
+    'Paracetamol', 'Ibuprofen', 'Amlodipine', 'Lisinopril', 'Metformin', 'Atorvastatin', 'Omeprazole',
+    'Levothyroxine', 'Salbutamol inhaler', 'Amoxicillin', 'Azithromycin', 'Sertraline', 'Cetirizine', 'Prednisolone',
+    'Apixaban', 'Bisoprolol', 'Furosemide', 'Colchicine', 'Sumatriptan', 'Ferrous sulfate', 'Nitrofurantoin',
+    'Fluticasone nasal spray', 'Diclofenac gel', 'Aciclovir', 'Melatonin', 'Betahistine', 'Ramipril', 'Insulin glargine',
+)
+DOSES = ('5mg', '10mg', '20mg', '40mg', '250mg', '500mg', '1g')
+FREQUENCIES = ('once daily', 'twice daily', 'three times daily', 'at night', 'as needed')
+SYMPTOMS = (
+    'chest pain', 'shortness of breath', 'dry cough', 'productive cough', 'fever', 'fatigue', 'dizziness',
+    'nausea', 'abdominal pain', 'back pain', 'joint swelling', 'headache', 'palpitations', 'rash', 'itching',
+    'sore throat', 'ear pain', 'wheezing', 'heartburn', 'weight loss', 'night sweats', 'low mood', 'poor sleep',
+    'blurred vision', 'numbness in the fingers', 'leg swelling', 'frequent urination', 'bloating', 'constipation',
+)
+FINDINGS = (
+    'Blood pressure elevated', 'Blood pressure well controlled', 'Chest clear on auscultation', 'Mild tachycardia',
+    'Crackles at the right base', 'Tenderness over the lumbar spine', 'Throat erythematous', 'BMI increased',
+    'HbA1c above target', 'ECG shows sinus rhythm', 'No focal neurological deficit', 'Swelling of the left ankle',
+)
+ADVICE = (
+    'rest and fluids', 'reduce salt intake', 'regular exercise', 'smoking cessation', 'weight reduction',
+    'sleep hygiene', 'physiotherapy referral', 'home blood pressure monitoring', 'blood tests before review',
+)
+QUERIES = [
+    # label, query, filters
+    ('rare word', 'vertigo', {}),
+    ('frequent word', 'cough', {}),
+    ('drug', 'amlodipine', {}),
+    ('prefix', 'amlo*', {}),
+    ('phrase', '"chest pain"', {}),
+    ('two words', 'fever cough', {}),
+    ('boilerplate + word', 'patient migraine', {}),
+    ('boilerplate only', 'follow up', {}),
+    ('doctor', 'cough', {'doctor_id': 7}),
+    ('doctor + boilerplate', 'reports', {'doctor_id': 7}),
+    ('patient', 'pain', {'patient_id': 'sample'}),
+    ('3 months', 'cough', {'months': 3}),
+    ('doctor + 12 months', 'hypertension', {'doctor_id': 7, 'months': 12}),
+    ('all of it', 'hypertension amlodipine', {'doctor_id': 7, 'months': 24}),
+]
+LIKE_QUERIES = [('rare word', 'vertigo'), ('frequent word', 'cough'), ('doctor', 'cough')]
+
+
+def record(rng, patient_ids, today, now):
+    symptoms = rng.sample(SYMPTOMS, rng.randint(1, 3))
+    notes = (f"Patient reports {' and '.join(symptoms)} for {rng.randint(1, 30)} days. "
+             f"{rng.choice(FINDINGS)}. Advised {rng.choice(ADVICE)}. "
+             f"Follow up in {rng.randint(1, 8)} weeks.")
+    prescription = f'{rng.choice(DRUGS)} {rng.choice(DOSES)} {rng.choice(FREQUENCIES)}' if rng.random() < 0.85 else None
+    return (rng.randint(*patient_ids), rng.randint(1, N_DOCTORS), rng.choice(DIAGNOSES), prescription,
+            today - timedelta(days=rng.randint(0, 3650)), notes, now)
+
+
+def load(db_path, n_records, n_patients):
+    seed(db_path, 0, n_patients=n_patients, n_doctors=N_DOCTORS)
+    rng = random.Random(7)
+    today, now = date.today(), datetime.utcnow()
+    patient_ids = (N_DOCTORS + 1, N_DOCTORS + n_patients)
+    conn = sqlite3.connect(db_path)
+    start = time.perf_counter()
+    for offset in range(0, n_records, 50_000):
+        conn.executemany(
+            "INSERT INTO patient_records (patient_id, doctor_id, diagnosis, prescription, visit_date, notes, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (record(rng, patient_ids, today, now) for _ in range(min(50_000, n_records - offset))),
+        )
+        conn.commit()
+    elapsed = time.perf_counter() - start
+    conn.execute('ANALYZE')
+    conn.close()
+    return elapsed
+
+
+def timings(fn, runs=15):
+    fn()
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def like_search(term, doctor_id=None):
+    from sqlalchemy import text
+    from models import db
+    pattern = f'%{term}%'
+    sql = ('SELECT id FROM patient_records WHERE (diagnosis LIKE :p OR prescription LIKE :p OR notes LIKE :p)'
+           + (' AND doctor_id = :doctor' if doctor_id else '') + ' ORDER BY visit_date DESC LIMIT 20')
+    return db.session.execute(text(sql), {'p': pattern, 'doctor': doctor_id}).all()
+
+
+def check_patient_scope(search_records, patient_id, term):
+    from sqlalchemy import text
+    from models import db
+    found, cursor = set(), None
+    while True:
+        page = search_records(term, patient_id=patient_id, after=cursor)
+        found.update(hit.record.id for hit in page.hits)
+        if not page.has_next:
+            break
+        cursor = page.next_cursor
+    expected = {row[0] for row in db.session.execute(text(
+        "SELECT id FROM patient_records WHERE patient_id = :patient AND "
+        "(' ' || lower(diagnosis || ' ' || coalesce(prescription, '') || ' ' || notes) || ' ') LIKE :p"),
+        {'patient': patient_id, 'p': f'% {term}%'})}
+    assert found == expected, (term, len(found), len(expected))
+    return len(found)
+
+
+def run(n_records, n_patients):
+    app, db_path = setup_database()
+    load_seconds = load(db_path, n_records, n_patients)
+    print(f"{n_records:,} records loaded through the sync triggers in {load_seconds:.0f} s "
+          f"({n_records / load_seconds:,.0f} rows/s)")
+
+    from models import db, PatientRecord
+    from services.record_search import search_records
+
+    with app.test_request_context():
+        def insert_one():
+            db.session.add(PatientRecord(patient_id=N_DOCTORS + 1, doctor_id=1, diagnosis='Gout flare',
+                                         prescription='Colchicine 500mg twice daily', visit_date=date.today(),
+                                         notes='Patient reports joint swelling for 2 days.'))
+            db.session.commit()
+        median, _ = timings(insert_one, runs=20)
+        print(f"one ORM insert + commit (index updated by trigger): {median:.1f} ms")
+
+        sample_patient = N_DOCTORS + 1
+        today = date.today()
+        print(f"\n{'query':>22} {'terms':>26} {'hits':>5} {'p50 ms':>7} {'p95 ms':>7} {'next p50':>9}  ranking")
+        worst = 0
+        for label, query, filters in QUERIES:
+            kwargs = dict(filters)
+            if kwargs.pop('patient_id', None):
+                kwargs['patient_id'] = sample_patient
+            months = kwargs.pop('months', None)
+            if months:
+                kwargs['date_from'] = today - timedelta(days=30 * months)
+                kwargs['date_to'] = today
+
+            def first():
+                db.session.remove()
+                return search_records(query, **kwargs)
+            page = first()
+            p50, p95 = timings(first)
+            next_p50 = '-'
+            if page.has_next:
+                def following():
+                    db.session.remove()
+                    return search_records(query, after=page.next_cursor, **kwargs)
+                next_p50 = f'{timings(following)[0]:.1f}'
+            worst = max(worst, p95)
+            ranking = 'bm25' if page.ranked else 'newest first'
+            if page.common:
+                ranking += f", common {' '.join(page.common)}"
+            print(f"{label:>22} {query:>26} {len(page.hits):>5} {p50:>7.1f} {p95:>7.1f} {next_p50:>9}  {ranking}")
+        print(f"slowest p95: {worst:.1f} ms")
+
+        print(f"\n{'LIKE scan':>22} {'term':>26} {'ms':>7}")
+        for label, term in LIKE_QUERIES:
+            doctor_id = 7 if label == 'doctor' else None
+            db.session.remove()
+            start = time.perf_counter()
+            like_search(term, doctor_id)
+            print(f"{label:>22} {term:>26} {(time.perf_counter() - start) * 1000:>7.0f}")
+
+        checked = sum(check_patient_scope(search_records, patient_id, term)
+                      for patient_id in range(N_DOCTORS + 1, N_DOCTORS + 21)
+                      for term in ('vertigo', 'cough', 'amlodipine', 'hypertension'))
+        print(f"\npatient-scoped results equal the records containing the term ({checked} hits checked)")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20_000)
@@ -0,0 +1,73 @@
+"""
+Benchmark: import (worker boot) time of the entry points.
+Imports each entry point in a fresh interpreter under `python -X importtime`
+and reports the median wall time of the process, the cumulative import
+time of the module, and how much of it went to the AWS SDK (boto3,
+botocore, s3transfer, urllib3) and to SQLAlchemy (0 when nothing of them
+is imported):
+- app.py with STORAGE_BACKEND=sql and with STORAGE_BACKEND=dynamodb,
+- aws_app.py, alone and followed by its first use of DynamoDB (the
+  store, and with it boto3 and the client, are created then),
+- auth.py (DynamoDB login blueprint).
+
+Usage: python benchmarks/bench_startup.py [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+from common import ROOT
+
+ENTRY_POINTS = [
+    # label, module, environment, code run after the import
+    ('app.py (sql)', 'app', {'STORAGE_BACKEND': 'sql'}, ''),
+    ('app.py (dynamodb)', 'app', {'STORAGE_BACKEND': 'dynamodb'}, ''),
+    ('aws_app.py', 'aws_app', {'NOTIFICATIONS': 'memory'}, ''),
+    ('aws_app.py + 1st use', 'aws_app', {'NOTIFICATIONS': 'memory'}, 'aws_app.get_store()'),
+    ('auth.py', 'auth', {}, ''),
+]
+PACKAGES = {
+    'aws sdk': ('boto3', 'botocore', 's3transfer', 'urllib3'),
+    'sqlalchemy': ('sqlalchemy', 'flask_sqlalchemy'),
+}
+
+
+def import_times(module, env, after):
+    """
+    One run: wall seconds, {module name: cumulative microseconds} and
+    {module name: self microseconds}.
+    """
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}; {after}'],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    cumulative, own = {}, {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, total_us, name = line[len('import time:'):].split('|')
+        cumulative[name.strip()] = int(total_us)
+        own[name.strip()] = int(self_us)
+    return wall, cumulative, own
+
+
+def package_time(own, prefixes):
+    return sum(us for name, us in own.items() if name.split('.')[0] in prefixes)
+
+
+def run(runs):
+    print(f"median of {runs} runs, ms")
+    print(f"{'entry point':>20} {'process':>8} {'import':>8} " + ' '.join(f'{p:>10}' for p in PACKAGES))
+    for label, module, extra, after in ENTRY_POINTS:
+        env = dict(os.environ, AWS_DEFAULT_REGION='us-east-1', **extra)
+        samples = [import_times(module, env, after) for _ in range(runs)]
+        wall = statistics.median(wall for wall, _, _ in samples) * 1000
+        total = statistics.median(cumulative.get(module, 0) for _, cumulative, _ in samples) / 1000
+        packages = [statistics.median(package_time(own, prefixes) for _, _, own in samples) / 1000
+                    for prefixes in PACKAGES.values()]
+        print(f"{label:>20} {wall:>8.0f} {total:>8.0f} " + ' '.join(f'{ms:>10.0f}' for ms in packages))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
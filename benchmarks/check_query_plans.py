@@ -0,0 +1,137 @@
+"""
+Check: every query issued by the hot routes uses an index.
+Requests each page, captures the SQL it sends, and runs EXPLAIN QUERY PLAN
+on it. A plain `SCAN <table>` (full table scan without an index) on one of
+the large tables fails the check unless the statement is a known,
+intentional whole-table aggregate.
+
+Usage: python benchmarks/check_query_plans.py
+"""
+import sys
+from datetime import date
+from sqlalchemy import event, text
+from common import setup_database, seed, make_client, login
+
+PAGES = [
+    ('admin', '/admin/dashboard'),
+    ('admin', '/admin/appointments'),
+    ('admin', '/admin/appointments?status=pending'),
+    ('admin', '/admin/patients'),
+    ('admin', '/admin/patients/lookup?q=user12'),
+    ('admin', '/admin/patients/lookup?q=xample.com'),
+    ('admin', '/admin/patient/51/records'),
+    ('admin', '/admin/records/search?q=migraine&doctor=1&from=2024-01-01&to=2024-06-30'),
+    ('admin', '/admin/reports/age-bands'),
+    ('admin', '/admin/reports/age-bands?by=doctor'),
+    ('admin', '/admin/reports/age-bands?by=specialization'),
+    ('admin', '/admin/export/appointments.csv?from=2024-01-01&to=2024-01-31'),
+    ('admin', '/admin/export/appointments.ndjson?doctor=1&status=approved'),
+    ('admin', '/admin/export/records.csv?from=2024-01-01&to=2024-01-31'),
+    ('admin', '/admin/export/records.ndjson?doctor=1'),
+    ('user1', '/doctor/dashboard'),
+    ('user1', '/doctor/appointments'),
+    ('user1', '/doctor/appointments?status=approved'),
+    ('user1', '/doctor/records'),
+    ('user1', '/doctor/patient-records/51'),
+    ('user1', '/doctor/records/search?q=migraine'),
+    ('user51', '/patient/dashboard'),
+    ('user51', '/patient/appointments'),
+    ('user51', '/patient/appointments?status=pending'),
+    ('user51', '/patient/records'),
+    ('user51', f'/patient/check-slots/1/{date.today()}'),
+    ('user51', '/patient/availability/1'),
+    ('user51', '/patient/next-slot/1'),
+    ('user51', '/patient/availability?specialization=Cardiology'),
+]
+
+LARGE_TABLES = ('users', 'appointments', 'patient_records', 'slots')
+
+# Hospital-wide counters on the admin dashboard read every appointment by design
+ALLOWED_FULL_SCANS = ('sum(CASE WHEN (appointments.status',)
+
+
+def capture(app, client, url):
+    from models import db
+
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', on_execute)
+    try:
+        response = client.get(url)
+        assert response.status_code == 200, f'{url} returned {response.status_code}'
+        response.get_data() # Streamed responses only query while they are read
+    finally:
+        event.remove(engine, 'before_cursor_execute', on_execute)
+    return statements
+
+
+def full_scans(plan):
+    """
+    Return plan details that are full scans of a large table.
+    """
+    return [
+        detail for detail in plan
+        if detail.startswith('SCAN ')
+        and detail.split()[1] in LARGE_TABLES
+        and 'USING' not in detail
+    ]
+
+
+def check(app, db_path):
+    """
+    Seed the database, request every page and EXPLAIN the SELECTs it sent.
+    Yields (url, statement, plan) for each page, with plan None when the
+    statement uses indexes (or is an allowed full scan).
+    """
+    seed(db_path, 20_000, n_records=20_000)
+
+    from models import db
+    with app.app_context():
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+
+    client = make_client(app)
+
+    for username, url in PAGES:
+        login(client, username)
+        for statement, parameters in capture(app, client, url):
+            with app.app_context():
+                conn = db.session.connection().connection.driver_connection
+                plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+            scans = full_scans(plan)
+            if scans and not any(marker in statement for marker in ALLOWED_FULL_SCANS):
+                yield url, statement, plan
+            else:
+                yield url, statement, None
+
+
+def run():
+    app, db_path = setup_database()
+    pages = {}
+    for url, statement, plan in check(app, db_path):
+        pages.setdefault(url, [])
+        if plan is not None:
+            pages[url].append((statement, plan))
+
+    failures = 0
+    for url, failed in pages.items():
+        for statement, plan in failed:
+            failures += 1
+            print(f'FAIL {url}\n  {" ".join(statement.split())}\n  plan: {plan}')
+        if not failed:
+            print(f'ok   {url}')
+
+    if failures:
+        print(f'{failures} statement(s) without an index')
+        sys.exit(1)
+    print('All route queries use an index.')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,348 @@
+"""
+Shared helpers for the benchmark scripts.
+Builds a throwaway SQLite database populated with synthetic data so
+benchmarks never touch instance/hospital.db, and for aws_app.py the same
+for DynamoDB tables (moto or DynamoDB Local).
+"""
+import os
+import sys
+import random
+import sqlite3
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+STATUSES = ('pending', 'approved', 'rejected')
+TIMES = ('09:00 AM', '10:00 AM', '11:00 AM', '02:00 PM', '03:00 PM', '04:00 PM')
+
+
+def setup_database():
+    """
+    Point the application at a fresh temporary database and create the schema.
+    Must be called before anything imports app.py.
+    Returns (app, db_path).
+    """
+    db_path = os.path.join(tempfile.mkdtemp(prefix='hospital-bench-'), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from app import app
+    from models import db
+
+    with app.app_context():
+        db.create_all()
+    return app, db_path
+
+
+def seed(db_path, n_appointments, n_patients=5000, n_doctors=50, n_records=0, seed_value=42):
+    """
+    Bulk-insert synthetic users, doctors, appointments and records with raw
+    executemany calls (the ORM is far too slow for millions of rows).
+    Users and doctors are only created on the first call, so repeated calls
+    grow the appointment/record tables of the same database.
+    """
+    rng = random.Random(seed_value + n_appointments)
+    now = datetime.utcnow()
+    today = date.today()
+
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+
+    if cur.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
+        _seed_people(cur, rng, n_patients, n_doctors, now, today)
+
+    _seed_activity(cur, rng, n_appointments, n_patients, n_doctors, n_records, now, today)
+    conn.commit()
+    conn.close()
+
+
+def _seed_people(cur, rng, n_patients, n_doctors, now, today):
+    cur.executemany(
+        "INSERT INTO users (id, username, email, password_hash, role, created_at, date_of_birth) "
+        "VALUES (?, ?, ?, 'x', ?, ?, ?)",
+        (
+            (i, f'user{i}', f'user{i}@example.com', 'doctor' if i <= n_doctors else 'patient',
+             now - timedelta(minutes=i), today - timedelta(days=rng.randint(365, 365 * 90)))
+            for i in range(1, n_doctors + n_patients + 1)
+        ),
+    )
+    cur.executemany(
+        "INSERT INTO doctors (id, user_id, name, specialization, available_slots_per_day, created_at) "
+        "VALUES (?, ?, ?, ?, 10, ?)",
+        (
+            (i, i, f'Dr. Doctor {i}', rng.choice(('Cardiology', 'Neurology', 'General Physician')), now)
+            for i in range(1, n_doctors + 1)
+        ),
+    )
+
+
+
+def _seed_activity(cur, rng, n_appointments, n_patients, n_doctors, n_records, now, today):
+    patient_ids = (n_doctors + 1, n_doctors + n_patients)
+    cur.executemany(
+        "INSERT INTO appointments (patient_id, doctor_id, appointment_date, appointment_time, status, reason, created_at) "
+        "VALUES (?, ?, ?, ?, ?, 'Routine checkup', ?)",
+        (
+            (rng.randint(*patient_ids), rng.randint(1, n_doctors),
+             today + timedelta(days=rng.randint(-180, 60)), rng.choice(TIMES),
+             rng.choice(STATUSES), now - timedelta(seconds=i))
+            for i in range(n_appointments)
+        ),
+    )
+    cur.executemany(
+        "INSERT INTO patient_records (patient_id, doctor_id, diagnosis, prescription, visit_date, notes, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            (rng.randint(*patient_ids), rng.randint(1, n_doctors),
+             rng.choice(('Seasonal influenza', 'Hypertension', 'Migraine', 'Type 2 diabetes', 'Sprained ankle')),
+             rng.choice(('Paracetamol 500mg', 'Amlodipine 5mg', 'Metformin 500mg', 'Rest and ice')),
+             today - timedelta(days=rng.randint(0, 3650)), 'Follow up in two weeks', now)
+            for _ in range(n_records)
+        ),
+    )
+
+
+def make_client(app):
+    """
+    Return a test client with an 'admin' account added and the passwords of
+    admin, user1 (doctor #1) and user51 (first patient) set to 'bench'.
+    """
+    from models import db, User
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        if not User.query.filter_by(username='admin').first():
+            db.session.add(User(username='admin', email='admin@example.com', role='admin', password_hash='x'))
+        for user in User.query.filter(User.username.in_(['admin', 'user1', 'user51'])):
+            user.set_password('bench')
+        db.session.commit()
+    return app.test_client()
+
+
+def login(client, username):
+    """
+    Log the test client in as username (password 'bench').
+    """
+    client.get('/logout')
+    response = client.post('/login', data={'username': username, 'password': 'bench'})
+    assert response.status_code == 302, f'login failed for {username}'
+
+
+def timeit(fn, repeat=5):
+    """
+    Run fn repeat times and return the best wall-clock time in milliseconds.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def count_queries(fn):
+    """
+    Run fn once and return how many SQL statements it sent to the database.
+    Must be called inside an application context.
+    """
+    from sqlalchemy import event
+    from models import db
+
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', on_execute)
+    try:
+        fn()
+    finally:
+        event.remove(engine, 'before_cursor_execute', on_execute)
+    return len(statements)
+
+
+# --- DynamoDB (aws_app.py) ---
+
+DYNAMO_DOCTORS = 50
+DYNAMO_PATIENTS = 2000
+
+
+def dynamo_item_size(item):
+    """
+    Approximate DynamoDB item size: attribute names plus values.
+    """
+    return sum(len(name) + len(str(value)) for name, value in item.items())
+
+
+def seed_dynamo(store, n_appointments, reason='Routine checkup', seed_value=42):
+    """
+    Fill the DynamoDB tables of a DynamoStore with synthetic users, doctors
+    (doc-0.., linked to logins doctor0..) and appointments, then rebuild
+    the dashboard counters (batch writes bypass them).
+    Returns {'doctors': [...], 'appointments': [...]} with the items written.
+    """
+    from services.dynamo_counters import rebuild_counters
+
+    rng = random.Random(seed_value)
+    today = date.today()
+    now = datetime.utcnow()
+    written = {'doctors': [], 'appointments': []}
+
+    with store.users.batch_writer() as batch:
+        for i in range(DYNAMO_PATIENTS):
+            batch.put_item(Item={'username': f'patient{i}', 'email': f'patient{i}@example.com',
+                                 'password_hash': 'x', 'role': 'patient', 'date_of_birth': '1980-01-01',
+                                 'created_at': now.isoformat()})
+        for i in range(DYNAMO_DOCTORS):
+            batch.put_item(Item={'username': f'doctor{i}', 'email': f'doctor{i}@example.com',
+                                 'password_hash': 'x', 'role': 'doctor', 'created_at': now.isoformat()})
+    with store.doctors.batch_writer() as batch:
+        for i in range(DYNAMO_DOCTORS):
+            item = {'id': f'doc-{i}', 'user_id': f'doctor{i}', 'name': f'Dr. Doctor {i}',
+                    'specialization': 'Cardiology', 'available_slots_per_day': 10}
+            written['doctors'].append(item)
+            batch.put_item(Item=item)
+    with store.appointments.batch_writer() as batch:
+        for _ in range(n_appointments):
+            item = {
+                'id': str(uuid.uuid4()),
+                'patient_id': f'patient{rng.randrange(DYNAMO_PATIENTS)}',
+                'doctor_id': f'doc-{rng.randrange(DYNAMO_DOCTORS)}',
+                'appointment_date': (today + timedelta(days=rng.randint(-30, 30))).isoformat(),
+                'appointment_time': '10:00 AM',
+                'reason': reason,
+                'status': rng.choice(STATUSES),
+                'created_at': (now - timedelta(minutes=rng.randint(0, 100000))).isoformat(),
+            }
+            written['appointments'].append(item)
+            batch.put_item(Item=item)
+    rebuild_counters(store)
+    return written
+
+
+def run_with_dynamodb(fn, *args):
+    """
+    Call fn(store, *args) with a DynamoStore over freshly created tables:
+    in moto's in-process DynamoDB, or in DynamoDB Local when
+    DYNAMODB_ENDPOINT is set.
+    """
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+    def run():
+        import boto3
+        from services.dynamo_tables import create_tables
+        from services.dynamo_store import DynamoStore
+
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1',
+                                  endpoint_url=os.environ.get('DYNAMODB_ENDPOINT'))
+        create_tables(dynamodb)
+        return fn(DynamoStore(dynamodb), *args)
+
+    if os.environ.get('DYNAMODB_ENDPOINT'):
+        return run()
+    try:
+        from moto import mock_aws
+    except ImportError:
+        sys.exit("Install moto (pip install moto) or set DYNAMODB_ENDPOINT to a DynamoDB Local endpoint.")
+    with mock_aws():
+        return run()
+
+
+def serialize_moto_calls(store):
+    """
+    Make the store's DynamoDB calls take turns when running under moto.
+    moto copies whole tables inside TransactWriteItems and is not
+    thread-safe there; each API call is still a separate step, so races
+    between calls (e.g. a check followed by a write) still happen.
+    No-op against DynamoDB Local (DYNAMODB_ENDPOINT), which runs calls
+    truly concurrently.
+    """
+    import threading
+
+    if os.environ.get('DYNAMODB_ENDPOINT'):
+        return
+    client = store.client
+    call = client._make_api_call
+    lock = threading.Lock()
+
+    def serialized(operation_name, api_params):
+        with lock:
+            return call(operation_name, api_params)
+    client._make_api_call = serialized
+
+
+def inject_transaction_conflicts(store, rate, seed_value=0):
+    """
+    Make a share (rate, 0..1) of the store's TransactWriteItems calls fail
+    the way DynamoDB cancels a transaction that collided with another one
+    (TransactionCanceledException, reason TransactionConflict), without
+    writing anything. moto never reports conflicts, and serialized calls
+    could not collide anyway, so this is how the retry path gets exercised.
+    Returns a dict counting 'calls' and 'conflicts'; set its 'rate' to
+    change the share later.
+    """
+    import threading
+    from botocore.exceptions import ClientError
+
+    client = store.client
+    call = client._make_api_call
+    rng = random.Random(seed_value)
+    lock = threading.Lock()
+    stats = {'calls': 0, 'conflicts': 0, 'rate': rate}
+
+    def maybe_conflict(operation_name, api_params):
+        if operation_name == 'TransactWriteItems':
+            with lock:
+                stats['calls'] += 1
+                conflict = rng.random() < stats['rate']
+                stats['conflicts'] += conflict
+            if conflict:
+                reasons = [{'Code': 'None'} for _ in api_params['TransactItems']]
+                reasons[-1] = {'Code': 'TransactionConflict', 'Message': 'Transaction is ongoing for the item'}
+                raise ClientError({'Error': {'Code': 'TransactionCanceledException',
+                                             'Message': 'Transaction cancelled'},
+                                   'CancellationReasons': reasons}, operation_name)
+        return call(operation_name, api_params)
+    client._make_api_call = maybe_conflict
+    return stats
+
+
+# Template name and context of the last aws_app.py view rendered by aws_client
+RENDERED = {}
+
+
+def _capture_render(template, **context):
+    from flask import current_app
+
+    # Context processors run as they would in render_template
+    current_app.update_template_context(context)
+    RENDERED['template'] = template
+    RENDERED['context'] = context
+    return template
+
+
+def aws_client(role, username):
+    """
+    Return a test client for aws_app.py logged in as username with role.
+    The shared templates link to the blueprint endpoints of app.py
+    (auth.login, ...), which aws_app.py does not define, so templates are
+    not rendered: views return the template name, and the context they
+    would have rendered is kept in RENDERED.
+    """
+    import aws_app
+
+    aws_app.app.config['TESTING'] = True
+    aws_app.render_template = _capture_render
+    client = aws_app.app.test_client()
+    with client.session_transaction() as session:
+        session['username'] = username
+        session['role'] = role
+    return client
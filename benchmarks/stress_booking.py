@@ -0,0 +1,111 @@
+"""
+Stress test: concurrent bookings and approvals for one doctor/day.
+Hundreds of booking requests are fired at the same doctor, date and
+handful of time slots from many threads at once, then several admin
+sessions race to approve every one of them. Checks that no time slot is
+held twice, that the number of approved appointments never exceeds the
+doctor's daily limit, and that the capacity counter agrees.
+
+Usage: python benchmarks/stress_booking.py [threads] [bookings_per_thread]
+"""
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from common import setup_database, seed, make_client, login
+
+DOCTOR_ID = 1
+DAY = date.today() + timedelta(days=90)  # outside the seeded date range
+
+
+def run_threads(count, target):
+    barrier = threading.Barrier(count)
+    errors = []
+
+    def worker(index):
+        try:
+            barrier.wait()
+            target(index)
+        except Exception as e:  # surfaced after join
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return time.perf_counter() - start
+
+
+def stress(app, db_path, threads, per_thread):
+    """
+    Seed the database, race the bookings and then the approvals, and
+    assert the invariants after each. Returns (accepted, approved, limit).
+    """
+    seed(db_path, 1_000)
+    make_client(app)
+
+    from models import db, Appointment, Doctor, DailyCapacity, Slot
+    from services.slots import schedule_minutes, minute_to_label
+
+    with app.app_context():
+        doctor = db.session.get(Doctor, DOCTOR_ID)
+        limit = doctor.available_slots_per_day
+        times = [minute_to_label(minute) for minute in schedule_minutes(doctor)]
+
+    def book(index):
+        client = app.test_client()
+        login(client, 'user51')
+        for attempt in range(per_thread):
+            client.post('/patient/book-appointment', data={
+                'doctor_id': DOCTOR_ID,
+                'appointment_date': DAY.isoformat(),
+                'appointment_time': times[(index + attempt) % len(times)],
+                'reason': 'Stress test'
+            })
+
+    elapsed = run_threads(threads, book)
+    with app.app_context():
+        pending_ids = [a.id for a in Appointment.query.filter_by(doctor_id=DOCTOR_ID, appointment_date=DAY)]
+    print(f'{len(pending_ids)} of {threads * per_thread} bookings accepted from {threads} threads in {elapsed:.2f}s')
+
+    with app.app_context():
+        held = Slot.query.filter(Slot.doctor_id == DOCTOR_ID, Slot.day == DAY, Slot.appointment_id.isnot(None)).count()
+        minutes = [a.start_minute for a in Appointment.query.filter_by(doctor_id=DOCTOR_ID, appointment_date=DAY)]
+    assert len(minutes) == len(set(minutes)), 'a time slot was booked twice'
+    assert held == len(pending_ids) <= limit, 'slot holders out of sync'
+
+    def approve(index):
+        client = app.test_client()
+        login(client, 'admin')
+        # Every thread walks the whole list from a different offset, so each
+        # appointment is approved by several sessions at once
+        offset = index * len(pending_ids) // threads
+        for appointment_id in pending_ids[offset:] + pending_ids[:offset]:
+            client.get(f'/admin/approve/{appointment_id}')
+
+    elapsed = run_threads(threads, approve)
+
+    with app.app_context():
+        approved = Appointment.query.filter_by(doctor_id=DOCTOR_ID, appointment_date=DAY, status='approved').count()
+        counter = db.session.get(DailyCapacity, (DOCTOR_ID, DAY))
+    print(f'{threads * len(pending_ids)} approval attempts in {elapsed:.2f}s')
+    print(f'approved={approved} counter={counter.booked if counter else None} limit={limit}')
+
+    assert approved <= limit, 'doctor overbooked'
+    assert counter is not None and counter.booked == approved, 'capacity counter out of sync'
+    return len(pending_ids), approved, limit
+
+
+def run(threads, per_thread):
+    app, db_path = setup_database()
+    stress(app, db_path, threads, per_thread)
+    print('OK: capacity never exceeded')
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:]]
+    run(args[0] if args else 16, args[1] if len(args) > 1 else 20)
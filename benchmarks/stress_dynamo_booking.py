@@ -0,0 +1,182 @@
+"""
+Stress test: concurrent DynamoDB bookings for one doctor/day.
+Many threads book the same doctor, date and handful of time slots at
+once, first with the old check-then-put sequence (query the day, then
+put_item) and then through POST /patient/book-appointment of aws_app.py,
+which books with one TransactWriteItems conditioned on the doctor's day
+item. Checks that the transactional path never holds a minute twice or
+exceeds the daily limit, and that the day item agrees with the table.
+
+Bookings of the same day touch the same items, so DynamoDB cancels some
+of them with TransactionConflict; DynamoStore retries those, and answers
+"try again" once a burst of conflicts outlasts TRANSACT_ATTEMPTS. Every
+request must get one of: booked, slot taken, try again - never an error.
+
+Runs against DynamoDB Local when DYNAMODB_ENDPOINT is set: the threads
+run truly concurrently and the conflicts are real. Under moto's
+in-process DynamoDB (pip install moto, the default) the threads take
+turns per API call (moto is not thread-safe inside transactions, see
+serialize_moto_calls; they still interleave between a check and a
+write), so conflicts cannot happen and a share of the booking
+transactions is cancelled with TransactionConflict on purpose
+(inject_transaction_conflicts).
+
+Usage: python benchmarks/stress_dynamo_booking.py [threads] [bookings_per_thread]
+"""
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import date, datetime, timedelta
+from common import seed_dynamo, run_with_dynamodb, aws_client, serialize_moto_calls, inject_transaction_conflicts
+from services.dynamo_counters import capacity_key
+from services.schedule import ACTIVE_STATUSES, minute_to_label
+
+DAILY_LIMIT = 4
+MINUTES = [540 + 60 * i for i in range(6)]  # More times offered than the limit allows
+CONFLICT_RATE = 0.3 # Share of booking transactions cancelled under moto
+
+
+def run_threads(count, target):
+    barrier = threading.Barrier(count)
+    errors = []
+
+    def worker(index):
+        try:
+            barrier.wait()
+            target(index)
+        except Exception as e:  # surfaced after join
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return time.perf_counter() - start
+
+
+def active(store, doctor_id, day):
+    return [item for item in store.appointments_for_doctor(doctor_id, day=day)
+            if item['status'] in ACTIVE_STATUSES]
+
+
+def check_then_put(store, threads, per_thread, doctor_id, day):
+    """
+    The old sequence: read the day's bookings, then write if there is room.
+    """
+    def book(index):
+        for i in range(per_thread):
+            minute = MINUTES[(index + i) % len(MINUTES)]
+            held = active(store, doctor_id, day)
+            if len(held) >= DAILY_LIMIT or any(int(item['start_minute']) == minute for item in held):
+                continue
+            store.appointments.put_item(Item={
+                'id': str(uuid.uuid4()), 'patient_id': f'patient{index}', 'doctor_id': doctor_id,
+                'appointment_date': day, 'appointment_time': minute_to_label(minute), 'start_minute': minute,
+                'reason': 'Stress', 'status': 'pending', 'created_at': datetime.utcnow().isoformat(),
+            })
+
+    elapsed = run_threads(threads, book)
+    held = active(store, doctor_id, day)
+    duplicates = sum(n - 1 for n in Counter(int(item['start_minute']) for item in held).values())
+    print(f"check-then-put: {len(held)} bookings kept for a limit of {DAILY_LIMIT}, "
+          f"{duplicates} double-booked minutes ({elapsed:.2f}s)")
+
+
+def post_booking(client, doctor_id, day, minute):
+    """
+    POST one booking; returns 'booked', 'taken' or 'busy' from where the
+    app redirected and what it flashed.
+    """
+    response = client.post('/patient/book-appointment', data={
+        'doctor_id': doctor_id, 'appointment_date': day,
+        'appointment_time': minute_to_label(minute), 'reason': 'Stress'})
+    assert response.status_code == 302, response.status_code
+    with client.session_transaction() as session:
+        flashed = ' '.join(str(message) for message in session.pop('_flashes', []))
+    if response.location.endswith('/patient/appointments'):
+        return 'booked'
+    return 'busy' if 'try again' in flashed else 'taken'
+
+
+def transactional(store, threads, per_thread, doctor_id, day, conflicts):
+    """
+    POST /patient/book-appointment from one logged-in client per thread.
+    """
+    outcomes = Counter()
+    accepted = []
+    lock = threading.Lock()
+
+    def book(index):
+        client = aws_client('patient', f'patient{index}')
+        for i in range(per_thread):
+            minute = MINUTES[(index + i) % len(MINUTES)]
+            outcome = post_booking(client, doctor_id, day, minute)
+            with lock:
+                outcomes[outcome] += 1
+                if outcome == 'booked':
+                    accepted.append(minute)
+
+    elapsed = run_threads(threads, book)
+    held = active(store, doctor_id, day)
+    minutes = [int(item['start_minute']) for item in held]
+    print(f"transactional: {outcomes['booked']} booked, {outcomes['taken']} slot taken, "
+          f"{outcomes['busy']} try again, of {threads * per_thread} requests from {threads} threads in {elapsed:.2f}s")
+    if conflicts is not None:
+        print(f"  {conflicts['conflicts']} of {conflicts['calls']} transactions cancelled with "
+              f"TransactionConflict and retried")
+
+    day_item = store.get_counters(capacity_key(doctor_id, day))[capacity_key(doctor_id, day)]
+    print(f"held={len(held)} limit={DAILY_LIMIT} day item booked={int(day_item['booked'])}")
+    assert len(held) == len(accepted) <= DAILY_LIMIT, 'daily limit exceeded'
+    assert len(set(minutes)) == len(minutes), 'a minute was booked twice'
+    assert int(day_item['booked']) == len(held)
+    assert sorted(int(m) for m in day_item['minutes']) == sorted(minutes)
+    if conflicts is not None:
+        assert conflicts['conflicts'], 'no conflicts were injected'
+
+
+def conflict_burst(store, doctor_id, day, conflicts):
+    """
+    Every transaction conflicts: the booking must answer "try again" and
+    write nothing.
+    """
+    conflicts['rate'] = 1.0
+    outcome = post_booking(aws_client('patient', 'patient0'), doctor_id, day, MINUTES[0])
+    conflicts['rate'] = CONFLICT_RATE
+    assert outcome == 'busy', outcome
+    assert not active(store, doctor_id, day)
+    print("conflicts outlasting the retries: 'try again', nothing written")
+
+
+def run(store, threads, per_thread):
+    import aws_app
+
+    seed_dynamo(store, 0)
+    serialize_moto_calls(store)
+    serialize_moto_calls(aws_app.get_store())
+    conflicts = None
+    if not os.environ.get('DYNAMODB_ENDPOINT'):
+        conflicts = inject_transaction_conflicts(aws_app.get_store(), CONFLICT_RATE)
+    day = (date.today() + timedelta(days=90)).isoformat()
+    for doctor_id in ('doc-0', 'doc-1', 'doc-2'):
+        store.doctors.update_item(Key={'id': doctor_id}, UpdateExpression='SET available_slots_per_day = :n',
+                                  ExpressionAttributeValues={':n': DAILY_LIMIT})
+
+    check_then_put(store, threads, per_thread, 'doc-0', day)
+    transactional(store, threads, per_thread, 'doc-1', day, conflicts)
+    if conflicts is not None:
+        conflict_burst(store, 'doc-2', day, conflicts)
+    print("OK: capacity never exceeded")
+
+
+if __name__ == '__main__':
+    run_with_dynamodb(run,
+                      int(sys.argv[1]) if len(sys.argv) > 1 else 16,
+                      int(sys.argv[2]) if len(sys.argv) > 2 else 5)
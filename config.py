@@ -23,3 +23,42 @@ class Config:
     # Flask-WTF configuration for Forms
     WTF_CSRF_ENABLED = True # Enable Cross-Site Request Forgery protection
     WTF_CSRF_TIME_LIMIT = None # Token validity time
+    
+    # Pagination for admin listings
+    PAGE_SIZE = int(os.environ.get('PAGE_SIZE', 50)) # Rows per page unless ?per_page= is given
+    PAGE_SIZE_MAX = 200 # Upper bound for ?per_page=
+    PAGINATION_COUNT_TTL = 30 # Seconds a listing's total row count is cached
+    PAGINATION_COUNT_CACHE_SIZE = 256 # Max cached listing totals (LRU eviction)
+    RECORDS_PER_PATIENT = 3 # Latest records shown per patient on the doctor's records page
+    PATIENT_LOOKUP_LIMIT = 10 # Patients returned by the admin autocomplete unless ?limit= is given
+    PATIENT_LOOKUP_LIMIT_MAX = 50 # Upper bound for ?limit=
+    EXPORT_BATCH_SIZE = 1000 # Rows fetched at a time by the streaming CSV/NDJSON exports
+    
+    # Full-text search over patient records (services/record_search.py)
+    SEARCH_PAGE_SIZE = 20 # Results per page
+    SEARCH_RANK_WINDOW = 2000 # The newest N matches are ranked by relevance; older ones follow, newest first
+    SEARCH_COMMON_TERM_SHARE = 0.5 # Terms in more than this share of the searched scope's recent records are left out of the ranking
+    SEARCH_MAX_MONTHS = 24 # Date ranges up to this many months narrow the index lookup itself
+    
+    # Slot availability cache used by /patient/check-slots
+    AVAILABILITY_CACHE_SIZE = 1024 # Max cached (doctor, date) entries (LRU eviction)
+    AVAILABILITY_CACHE_TTL = 60 # Seconds before an entry is recomputed
+    AVAILABILITY_MAX_RANGE_DAYS = 62 # Longest range served by /patient/availability
+    SLOT_HORIZON_DAYS = 30 # Days ahead /patient/next-slot searches and warm_slots.py creates slots for
+    
+    # Identity cache used by the Flask-Login user loader
+    IDENTITY_CACHE_SIZE = 4096 # Max cached users (LRU eviction)
+    IDENTITY_CACHE_TTL = 30 # Seconds before a user's role/profile is re-read
+    
+    # Password hashing (werkzeug methods: 'scrypt', 'scrypt:N:r:p', 'pbkdf2:sha256:iterations')
+    # Stored hashes made with other parameters are upgraded at the next login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    PASSWORD_SALT_LENGTH = 16
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0)) # Concurrent verifications; 0 = one per CPU
+    PASSWORD_HASH_QUEUE = 64 # Logins allowed to wait for a worker before answering 503
+    PASSWORD_HASH_TIMEOUT = 5 # Seconds a login waits for its verification before answering 503
+    
+    # Storage backend used by the blueprints (services/repository.py): 'sql' or 'dynamodb'
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'sql')
+    DYNAMODB_REGION = os.environ.get('AWS_REGION', 'us-east-1') # Region of the DynamoDB tables
+    DYNAMODB_ENDPOINT = os.environ.get('DYNAMODB_ENDPOINT') # Local stand-in (e.g. DynamoDB Local) when set
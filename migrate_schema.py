@@ -0,0 +1,142 @@
+import sqlite3
+import os
+import re
+from datetime import datetime
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateTable, CreateIndex
+from models import db, User, Appointment, SEARCH_INDEXES
+
+DB_PATH = os.path.join("instance", "hospital.db")
+
+def _column_ddl(column, dialect):
+    """
+    Build the "name TYPE [DEFAULT x]" clause for ALTER TABLE ADD COLUMN.
+    Scalar Python-side defaults are written as SQL defaults so existing
+    rows get the same value new rows would.
+    """
+    ddl = f"{column.name} {column.type.compile(dialect=dialect)}"
+    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+    if default is not None:
+        ddl += f" DEFAULT {default!r}" if isinstance(default, str) else f" DEFAULT {default}"
+    return ddl
+
+def _require_column(cursor, table, column):
+    """
+    Make a nullable column NOT NULL, as models.py now declares it.
+    NULLs are backfilled with the oldest value in the column, so those rows
+    sort as the oldest. SQLite cannot alter a column's constraints, so the
+    table is rebuilt from its own CREATE statement (keeping every column,
+    index and trigger) with NOT NULL added to the column.
+    Returns True if the table was changed.
+    """
+    cursor.execute(f"PRAGMA table_info({table})")
+    info = {row[1]: row for row in cursor.fetchall()}
+    if column not in info or info[column][3]:
+        return False
+
+    print(f"Making '{table}.{column}' NOT NULL...")
+    cursor.execute(f"SELECT MIN({column}) FROM {table}")
+    # Same text format SQLAlchemy stores DateTime values in, so comparisons stay consistent
+    oldest = cursor.fetchone()[0] or datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f')
+    cursor.execute(f"UPDATE {table} SET {column} = ? WHERE {column} IS NULL", (oldest,))
+
+    cursor.execute("SELECT type, sql FROM sqlite_master WHERE tbl_name = ? AND sql IS NOT NULL", (table,))
+    statements = cursor.fetchall()
+    create = next(sql for kind, sql in statements if kind == 'table')
+    create, found = re.subn(rf'(\b{column}\s+\w+)', r'\1 NOT NULL', create.replace(table, f"_new_{table}", 1), count=1)
+    if not found:
+        print(f" Could not find '{column}' in the definition of '{table}'. Skipping.")
+        return False
+
+    cursor.execute(create)
+    cursor.execute(f"INSERT INTO _new_{table} SELECT * FROM {table}")
+    cursor.execute(f"DROP TABLE {table}")
+    cursor.execute(f"ALTER TABLE _new_{table} RENAME TO {table}")
+    for kind, sql in statements:
+        if kind != 'table':
+            cursor.execute(sql)
+    return True
+
+def migrate_schema(db_path=DB_PATH):
+    """
+    Bring an existing SQLite database up to date with models.py:
+    - creates tables that don't exist yet
+    - adds missing columns (nullable ones, or ones with a scalar default)
+    - creates missing indexes
+    - creates missing full-text search indexes and fills them
+    - makes the keyset pagination columns NOT NULL (backfilling NULLs)
+    Safe to run repeatedly: anything that already exists is skipped.
+    """
+    if not os.path.exists(db_path):
+        print(f"Database not found at {db_path}")
+        return
+
+    print(f"Connecting to database: {db_path}")
+    conn = sqlite3.connect(db_path)
+    # Tables are rebuilt below; other tables' foreign keys must not fire meanwhile
+    conn.execute("PRAGMA foreign_keys = OFF")
+    cursor = conn.cursor()
+    dialect = sqlite.dialect()
+
+    try:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        tables = {row[0] for row in cursor.fetchall()}
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+        existing = {row[0] for row in cursor.fetchall()}
+
+        changes = 0
+        for table in db.metadata.sorted_tables:
+            if table.name not in tables:
+                print(f"Creating table '{table.name}'...")
+                cursor.execute(str(CreateTable(table).compile(dialect=dialect)))
+                changes += 1
+            else:
+                cursor.execute(f"PRAGMA table_info({table.name})")
+                columns = {info[1] for info in cursor.fetchall()}
+                for column in table.columns:
+                    if column.name in columns:
+                        continue
+                    if not column.nullable and (column.default is None or not column.default.is_scalar):
+                        print(f" Cannot add NOT NULL column '{table.name}.{column.name}' without a default. Skipping.")
+                        continue
+                    print(f"Adding column '{table.name}.{column.name}'...")
+                    cursor.execute(f"ALTER TABLE {table.name} ADD COLUMN {_column_ddl(column, dialect)}")
+                    changes += 1
+
+            for index in sorted(table.indexes, key=lambda ix: ix.name):
+                if index.name in existing:
+                    print(f" '{index.name}' already exists. Skipping.")
+                    continue
+
+                print(f"Creating '{index.name}' on {table.name}...")
+                ddl = CreateIndex(index, if_not_exists=True).compile(dialect=dialect)
+                cursor.execute(str(ddl))
+                changes += 1
+
+        for table in (User.__table__, Appointment.__table__):
+            if table.name in tables and _require_column(cursor, table.name, 'created_at'):
+                changes += 1
+
+        for name, statements, _ in SEARCH_INDEXES:
+            if name in tables:
+                continue
+            print(f"Creating full-text index '{name}' and its triggers...")
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute(f"INSERT INTO {name} ({name}) VALUES ('rebuild')")
+            changes += 1
+
+        if changes:
+            # Refresh planner statistics so new indexes are actually picked
+            cursor.execute("ANALYZE")
+        conn.commit()
+        print(f" Migration successful! {changes} change(s) applied.")
+
+    except Exception as e:
+        print(f"Error during migration: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate_schema()
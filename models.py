@@ -1,23 +1,52 @@
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.query import Query
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from sqlalchemy import text, func, case, cast, Integer, event, DDL
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import joinedload
+from datetime import datetime, date
+from services.passwords import hash_password, verify_password, needs_rehash
 
 db = SQLAlchemy()
 
+
+class PartiesQuery(Query):
+    """
+    Query class for models that belong to both a patient and a doctor
+    (appointments and patient records).
+    """
+
+    def with_parties(self):
+        """
+        Eager-load the patient and doctor of every row with a JOIN, so listing
+        pages don't issue two lazy SELECTs per row when templates touch
+        `row.patient` / `row.doctor`.
+        """
+        model = self.column_descriptions[0]['entity']
+        return self.options(joinedload(model.patient), joinedload(model.doctor))
+
 class User(UserMixin, db.Model):
     """
     User model for storing authentication details and general user information.
     This model serves as the base for Patients, Admins, and potentially linked Doctors.
     """
     __tablename__ = 'users'
+    __table_args__ = (
+        # Patient listings filter on role and page by (created_at, id)
+        db.Index('ix_users_role_created_at', 'role', 'created_at'),
+        # Age filters and age-band reports compare date_of_birth with cutoff dates
+        db.Index('ix_users_role_date_of_birth', 'role', 'date_of_birth'),
+        # Case-insensitive prefix lookups of patients (services/patient_lookup.py)
+        db.Index('ix_users_role_username_lower', 'role', text('lower(username)')),
+        db.Index('ix_users_role_email_lower', 'role', text('lower(email)')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False) # Used for login and communications
     password_hash = db.Column(db.String(255), nullable=False) # Stored securely hashed
     role = db.Column(db.String(20), nullable=False, default='patient')  # Role-based access control: 'patient', 'admin', or 'doctor'
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow) # Keyset pagination key, so never NULL
     date_of_birth = db.Column(db.Date, nullable=True) # Required for patients
     
     # Relationships to other models
@@ -28,30 +57,71 @@ class User(UserMixin, db.Model):
     # If the user is a doctor, this links to their professional profile
     doctor_profile = db.relationship('Doctor', backref='user', lazy=True, uselist=False)
     
-    @property
+    @hybrid_property
     def age(self):
         """
         Calculate and return the user's age based on their date of birth.
         Returns None if date_of_birth is not set.
+        In queries (User.age) the same calculation runs in SQLite, e.g. for
+        AVG(age); to filter by age use born_by(), which can use the index.
         """
         if not self.date_of_birth:
             return None
         today = datetime.now().date()
         return today.year - self.date_of_birth.year - ((today.month, today.day) < (self.date_of_birth.month, self.date_of_birth.day))
 
+    @age.expression
+    def age(cls):
+        today = datetime.now().date()
+        birthday_ahead = case((func.strftime('%m-%d', cls.date_of_birth) > today.strftime('%m-%d'), 1), else_=0)
+        return today.year - cast(func.strftime('%Y', cls.date_of_birth), Integer) - birthday_ahead
+
+    @staticmethod
+    def birth_cutoff(years, today=None):
+        """
+        Latest date of birth of someone who is at least `years` old today
+        (a 29 February birthday counts from 28 February in other years).
+        """
+        today = today or datetime.now().date()
+        try:
+            return today.replace(year=today.year - years)
+        except ValueError:
+            return date(today.year - years, 2, 28)
+
+    @classmethod
+    def born_by(cls, years, today=None):
+        """
+        SQL condition "at least `years` old": a plain date_of_birth
+        comparison, so it uses ix_users_role_date_of_birth.
+        """
+        return cls.date_of_birth <= cls.birth_cutoff(years, today)
+
     def set_password(self, password):
         """
         Hashes the provided password and stores it in the password_hash field.
         Always use this method to set passwords.
+        Hashing parameters come from PASSWORD_HASH_METHOD / PASSWORD_SALT_LENGTH.
         """
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
         """
         Verifies if the provided password matches the stored hash.
         Returns True if accurate, False otherwise.
+        The hash is computed on the bounded hashing pool (services/passwords.py).
         """
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+    
+    def rehash_password(self, password):
+        """
+        Re-hash a just-verified password if its stored hash was made with
+        other parameters than the current policy.
+        Returns True if password_hash changed (the caller commits).
+        """
+        if not needs_rehash(self.password_hash):
+            return False
+        self.set_password(password)
+        return True
     
     def __repr__(self):
         return f'<User {self.username}>'
@@ -68,7 +138,9 @@ class Doctor(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), unique=True, nullable=True)  # Link to User for login credentials
     name = db.Column(db.String(100), nullable=False) # Professional name displayed to patients
     specialization = db.Column(db.String(100), nullable=False) # e.g., "Cardiology", "General Physician"
-    available_slots_per_day = db.Column(db.Integer, default=10) # Daily appointment capacity
+    available_slots_per_day = db.Column(db.Integer, default=10) # Daily appointment capacity (number of time slots)
+    day_start_minute = db.Column(db.Integer, default=540) # First slot, in minutes after midnight (540 = 09:00 AM)
+    slot_length_minutes = db.Column(db.Integer, default=60) # Length of one appointment slot
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -84,15 +156,29 @@ class Appointment(db.Model):
     Appointment model representing a scheduled meeting between a Patient and a Doctor.
     """
     __tablename__ = 'appointments'
+    __table_args__ = (
+        # Doctor views and slot counting: doctor + day (+ status)
+        db.Index('ix_appointments_doctor_date_status', 'doctor_id', 'appointment_date', 'status'),
+        # Patient views and per-patient stats
+        db.Index('ix_appointments_patient_status', 'patient_id', 'status'),
+        # Admin listing filtered by status, newest first
+        db.Index('ix_appointments_status_created_at', 'status', 'created_at'),
+        # Admin listing keyset pagination on (created_at, id)
+        db.Index('ix_appointments_created_at', 'created_at'),
+        # Exports filtered by date stream in (appointment_date, id) order
+        db.Index('ix_appointments_date', 'appointment_date'),
+    )
+    query_class = PartiesQuery
     
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False)
     appointment_date = db.Column(db.Date, nullable=False)
-    appointment_time = db.Column(db.String(10), nullable=False)  # Format: "09:00 AM"
+    appointment_time = db.Column(db.String(10), nullable=False)  # Display label, format: "09:00 AM"
+    start_minute = db.Column(db.Integer) # Same time as minutes after midnight; used for sorting and slot lookups
     status = db.Column(db.String(20), default='pending')  # Status workflow: 'pending' -> 'approved' or 'rejected'
     reason = db.Column(db.Text) # Reason for visit provided by patient
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow) # Keyset pagination key, so never NULL
     
     def __repr__(self):
         return f'<Appointment {self.id} - {self.status}>'
@@ -104,6 +190,17 @@ class PatientRecord(db.Model):
     Stores diagnosis, prescriptions, and notes from a specific visit.
     """
     __tablename__ = 'patient_records'
+    __table_args__ = (
+        # A patient's history, most recent visit first
+        db.Index('ix_patient_records_patient_visit', 'patient_id', 'visit_date'),
+        # Records written by a doctor, most recent visit first
+        db.Index('ix_patient_records_doctor_visit', 'doctor_id', 'visit_date'),
+        # A doctor's records grouped by patient (doctor records page)
+        db.Index('ix_patient_records_doctor_patient_visit', 'doctor_id', 'patient_id', 'visit_date'),
+        # Exports filtered by date stream in (visit_date, id) order
+        db.Index('ix_patient_records_visit', 'visit_date'),
+    )
+    query_class = PartiesQuery
     
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -116,3 +213,112 @@ class PatientRecord(db.Model):
     
     def __repr__(self):
         return f'<PatientRecord {self.id} - Patient {self.patient_id}>'
+
+
+# Full-text index over patient records (SQLite FTS5, see services/record_search.py).
+# The index reads its text from the patient_records_search view: the three
+# text columns plus a `scope` column of tokens ("p<patient id> d<doctor id>
+# m<yyyymm of the visit>") so patient/doctor/month filters are part of the
+# MATCH instead of a join. Triggers keep it in sync with patient_records.
+RECORD_SEARCH_TABLE = 'patient_records_fts'
+_RECORD_SCOPE = "'p' || {0}.patient_id || ' d' || {0}.doctor_id || ' m' || strftime('%Y%m', {0}.visit_date)"
+_RECORD_SEARCH_DELETE = (
+    f"INSERT INTO {RECORD_SEARCH_TABLE} ({RECORD_SEARCH_TABLE}, rowid, diagnosis, prescription, notes, scope) "
+    f"VALUES ('delete', old.id, old.diagnosis, old.prescription, old.notes, {_RECORD_SCOPE.format('old')});"
+)
+_RECORD_SEARCH_INSERT = (
+    f"INSERT INTO {RECORD_SEARCH_TABLE} (rowid, diagnosis, prescription, notes, scope) "
+    f"SELECT id, diagnosis, prescription, notes, scope FROM patient_records_search WHERE id = new.id;"
+)
+RECORD_SEARCH_DDL = (
+    "CREATE VIEW IF NOT EXISTS patient_records_search AS "
+    f"SELECT id, diagnosis, prescription, notes, {_RECORD_SCOPE.format('patient_records')} AS scope "
+    "FROM patient_records",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {RECORD_SEARCH_TABLE} USING fts5("
+    "diagnosis, prescription, notes, scope, "
+    "content='patient_records_search', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS patient_records_search_insert AFTER INSERT ON patient_records BEGIN "
+    f"{_RECORD_SEARCH_INSERT} END",
+    "CREATE TRIGGER IF NOT EXISTS patient_records_search_delete AFTER DELETE ON patient_records BEGIN "
+    f"{_RECORD_SEARCH_DELETE} END",
+    "CREATE TRIGGER IF NOT EXISTS patient_records_search_update AFTER UPDATE ON patient_records BEGIN "
+    f"{_RECORD_SEARCH_DELETE} {_RECORD_SEARCH_INSERT} END",
+)
+
+# Trigram index of usernames and emails for substring lookups of patients
+# (services/patient_lookup.py); prefixes use the lower() indexes on users.
+USER_SEARCH_TABLE = 'users_fts'
+_USER_SEARCH_DELETE = (
+    f"INSERT INTO {USER_SEARCH_TABLE} ({USER_SEARCH_TABLE}, rowid, username, email) "
+    "VALUES ('delete', old.id, old.username, old.email);"
+)
+_USER_SEARCH_INSERT = f"INSERT INTO {USER_SEARCH_TABLE} (rowid, username, email) VALUES (new.id, new.username, new.email);"
+USER_SEARCH_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {USER_SEARCH_TABLE} USING fts5("
+    "username, email, content='users', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS users_search_insert AFTER INSERT ON users BEGIN {_USER_SEARCH_INSERT} END",
+    f"CREATE TRIGGER IF NOT EXISTS users_search_delete AFTER DELETE ON users BEGIN {_USER_SEARCH_DELETE} END",
+    "CREATE TRIGGER IF NOT EXISTS users_search_update AFTER UPDATE OF username, email ON users BEGIN "
+    f"{_USER_SEARCH_DELETE} {_USER_SEARCH_INSERT} END",
+)
+
+# Full-text tables, their DDL and the table they index; db.create_all()
+# creates them with that table, migrate_schema.py adds and fills missing ones
+SEARCH_INDEXES = (
+    (RECORD_SEARCH_TABLE, RECORD_SEARCH_DDL, PatientRecord.__table__),
+    (USER_SEARCH_TABLE, USER_SEARCH_DDL, User.__table__),
+)
+
+for _name, _statements, _table in SEARCH_INDEXES:
+    for _statement in _statements:
+        # DDL() formats its statement with %, so strftime's % signs are doubled
+        event.listen(_table, 'after_create', DDL(_statement.replace('%', '%%')).execute_if(dialect='sqlite'))
+    event.listen(_table, 'before_drop', DDL(f'DROP TABLE IF EXISTS {_name}').execute_if(dialect='sqlite'))
+event.listen(PatientRecord.__table__, 'before_drop',
+             DDL('DROP VIEW IF EXISTS patient_records_search').execute_if(dialect='sqlite'))
+
+
+class DailyCapacity(db.Model):
+    """
+    Number of approved appointments a Doctor has on a given day.
+    Maintained alongside appointment status changes so the capacity check
+    and the increment happen in one conditional UPDATE (see services/capacity.py).
+    """
+    __tablename__ = 'daily_capacity'
+    
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    booked = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DailyCapacity Doctor {self.doctor_id} {self.day}: {self.booked}>'
+
+
+class Slot(db.Model):
+    """
+    One bookable time slot in a Doctor's schedule on a given day.
+    Slots are materialized from the doctor's schedule (day_start_minute,
+    slot_length_minutes, available_slots_per_day) the first time a day is
+    looked at. A slot is free while appointment_id is NULL.
+    """
+    __tablename__ = 'slots'
+    __table_args__ = (
+        db.UniqueConstraint('doctor_id', 'day', 'start_minute', name='uq_slots_doctor_day_minute'),
+        # Free slots only: "free slots today" / "next free slot" are index range scans
+        db.Index('ix_slots_free', 'doctor_id', 'day', 'start_minute',
+                 sqlite_where=text('appointment_id IS NULL'),
+                 postgresql_where=text('appointment_id IS NULL')),
+        # Held slots only: one slot per appointment, and releasing by appointment is a lookup
+        db.Index('ix_slots_holder', 'appointment_id', unique=True,
+                 sqlite_where=text('appointment_id IS NOT NULL'),
+                 postgresql_where=text('appointment_id IS NOT NULL')),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    start_minute = db.Column(db.Integer, nullable=False) # Minutes after midnight
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id')) # Holder of the slot, if any
+    
+    def __repr__(self):
+        return f'<Slot Doctor {self.doctor_id} {self.day} {self.start_minute}>'
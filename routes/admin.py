@@ -1,7 +1,14 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, current_app, jsonify, \
+    Response, stream_with_context
 from flask_login import login_required, current_user
-from models import db, User, Doctor, Appointment, PatientRecord
-from datetime import datetime
+from models import Doctor
+from services.repository import get_repository, CHANGED, DAY_FULL
+from services.demographics import DEFAULT_AGE_BANDS, GROUPINGS, parse_bands, age_band_histogram
+from services.exports import EXPORTS, FORMATS, STATUSES, export_chunks, parse_export_filters
+from services.patient_lookup import lookup_limit, lookup_patients
+from services.record_search import parse_filters, search_records
+from services.schedule import label_to_minute, minute_to_label
+from datetime import datetime, date
 from functools import wraps
 
 # Define the Blueprint for Admin routes
@@ -22,6 +29,22 @@ def admin_required(f):
     return decorated_function
 
 
+def sql_only(f):
+    """
+    Decorator for admin pages that only exist on the SQL storage backend
+    (full-text record search, patient autocomplete, age reports and the
+    streaming exports, which rely on SQLite indexes and aggregates).
+    Redirects to the dashboard on other backends.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if current_app.config.get('STORAGE_BACKEND', 'sql') != 'sql':
+            flash('This page is only available with the SQL storage backend.', 'info')
+            return redirect(url_for('admin.dashboard'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+
 @admin_bp.route('/dashboard')
 @admin_required
 def dashboard():
@@ -34,23 +57,20 @@ def dashboard():
     - Active doctors count
     - List of recent pending appointments
     """
-    # Get statistics
-    total_patients = User.query.filter_by(role='patient').count()
-    total_appointments = Appointment.query.count()
-    pending_appointments = Appointment.query.filter_by(status='pending').count()
-    approved_appointments = Appointment.query.filter_by(status='approved').count()
-    total_doctors = Doctor.query.count()
+    repository = get_repository()
+    
+    # Get statistics (single aggregate query on SQL)
+    stats = repository.dashboard_stats()
     
     # Get recent pending appointments
-    recent_pending = Appointment.query.filter_by(status='pending')\
-        .order_by(Appointment.created_at.desc()).limit(5).all()
+    recent_pending = repository.recent_pending_appointments(limit=5)
     
     return render_template('admin/dashboard.html',
-                         total_patients=total_patients,
-                         total_appointments=total_appointments,
-                         pending_appointments=pending_appointments,
-                         approved_appointments=approved_appointments,
-                         total_doctors=total_doctors,
+                         total_patients=stats.total_patients,
+                         total_appointments=stats.total_appointments,
+                         pending_appointments=stats.pending_appointments,
+                         approved_appointments=stats.approved_appointments,
+                         total_doctors=stats.total_doctors,
                          recent_pending=recent_pending)
 
 
@@ -58,69 +78,92 @@ def dashboard():
 @admin_required
 def appointments():
     """
-    View all appointments with optional filtering by status (pending, approved, rejected).
+    View appointments newest first with optional filtering by status (pending, approved, rejected).
+    Paginated with a keyset cursor (?after= / ?before=) and ?per_page=.
     """
     status_filter = request.args.get('status', 'all')
+    # The status is part of the cached count's key, so only known values get one
+    if status_filter != 'all' and status_filter not in STATUSES:
+        flash('Unknown appointment status.', 'error')
+        return redirect(url_for('admin.appointments'))
     
-    doctors = Doctor.query.all()
+    repository = get_repository()
+    doctors = repository.list_doctors()
     
-    if status_filter == 'all':
-        all_appointments = Appointment.query.order_by(Appointment.created_at.desc()).all()
-    else:
-        all_appointments = Appointment.query.filter_by(status=status_filter)\
-            .order_by(Appointment.created_at.desc()).all()
+    page = repository.list_appointments(status=status_filter if status_filter != 'all' else None,
+                                        after=request.args.get('after'),
+                                        before=request.args.get('before'),
+                                        per_page=request.args.get('per_page'))
     
     return render_template('admin/appointments.html', 
-                         appointments=all_appointments,
+                         appointments=page.items,
+                         page=page,
                          doctors=doctors,
                          status_filter=status_filter)
 
 
-@admin_bp.route('/approve/<int:appointment_id>')
+def _appointment_or_404(repository, appointment_id):
+    # Appointment URLs take any id: integers on SQL, UUIDs on DynamoDB
+    appointment = repository.get_appointment(appointment_id)
+    if appointment is None:
+        abort(404)
+    return appointment
+
+
+@admin_bp.route('/approve/<appointment_id>')
 @admin_required
 def approve_appointment(appointment_id):
     """
     Approve a specific appointment.
-    Updates the status to 'approved'.
+    Takes one of the doctor's slots for that day atomically and updates
+    the status to 'approved'; refuses if the day is already full.
     """
-    appointment = Appointment.query.get_or_404(appointment_id)
+    repository = get_repository()
+    appointment = _appointment_or_404(repository, appointment_id)
     
     if appointment.status == 'approved':
         flash('Appointment is already approved!', 'info')
         return redirect(url_for('admin.appointments'))
     
-    appointment.status = 'approved'
-    
     try:
-        db.session.commit()
+        result = repository.change_appointment_status(appointment, 'approved')
+        if result != CHANGED:
+            if result == DAY_FULL:
+                flash('No slots left for this doctor on that date!', 'error')
+            else:
+                flash('Appointment was changed by someone else. Please try again.', 'info')
+            return redirect(url_for('admin.appointments'))
+        
         flash(f'Appointment #{appointment_id} approved successfully!', 'success')
     except Exception as e:
-        db.session.rollback()
+        repository.rollback()
         flash('An error occurred while approving the appointment.', 'error')
     
     return redirect(url_for('admin.appointments'))
 
 
-@admin_bp.route('/reject/<int:appointment_id>')
+@admin_bp.route('/reject/<appointment_id>')
 @admin_required
 def reject_appointment(appointment_id):
     """
     Reject a specific appointment.
-    Updates the status to 'rejected'.
+    Updates the status to 'rejected', giving the slot back if it was approved.
     """
-    appointment = Appointment.query.get_or_404(appointment_id)
+    repository = get_repository()
+    appointment = _appointment_or_404(repository, appointment_id)
     
     if appointment.status == 'rejected':
         flash('Appointment is already rejected!', 'info')
         return redirect(url_for('admin.appointments'))
     
-    appointment.status = 'rejected'
-    
     try:
-        db.session.commit()
+        if repository.change_appointment_status(appointment, 'rejected') != CHANGED:
+            flash('Appointment was changed by someone else. Please try again.', 'info')
+            return redirect(url_for('admin.appointments'))
+        
         flash(f'Appointment #{appointment_id} rejected.', 'success')
     except Exception as e:
-        db.session.rollback()
+        repository.rollback()
         flash('An error occurred while rejecting the appointment.', 'error')
     
     return redirect(url_for('admin.appointments'))
@@ -131,11 +174,16 @@ def reject_appointment(appointment_id):
 def set_slots():
     """
     Manage doctor availability.
-    Sets the number of appointment slots available per day for a selected doctor.
+    Sets a selected doctor's daily schedule: number of slots per day,
+    first slot time and slot length.
     """
+    repository = get_repository()
+    
     if request.method == 'POST':
         doctor_id = request.form.get('doctor_id')
         slots = request.form.get('slots')
+        start_time = request.form.get('start_time', '09:00')
+        slot_length = request.form.get('slot_length', '60')
         
         if not doctor_id or not slots:
             flash('Please select a doctor and enter slot limit!', 'error')
@@ -143,59 +191,161 @@ def set_slots():
         
         try:
             slots = int(slots)
+            slot_length = int(slot_length)
             if slots < 1:
                 flash('Slot limit must be at least 1!', 'error')
                 return redirect(url_for('admin.set_slots'))
             
-            doctor = Doctor.query.get(doctor_id)
+            day_start_minute = label_to_minute(start_time)
+            if day_start_minute is None or slot_length < 5:
+                flash('Invalid start time or slot length!', 'error')
+                return redirect(url_for('admin.set_slots'))
+            
+            if day_start_minute + slots * slot_length > 24 * 60:
+                flash('That schedule runs past midnight!', 'error')
+                return redirect(url_for('admin.set_slots'))
+            
+            doctor = repository.get_doctor(doctor_id)
             if not doctor:
                 flash('Doctor not found!', 'error')
                 return redirect(url_for('admin.set_slots'))
             
-            doctor.available_slots_per_day = slots
-            db.session.commit()
+            repository.update_schedule(doctor, slots, day_start_minute, slot_length)
             
-            flash(f'Slot limit for Dr. {doctor.name} updated to {slots} slots per day!', 'success')
+            flash(f'Schedule for Dr. {doctor.name} updated to {slots} slots per day '
+                  f'from {minute_to_label(day_start_minute)} ({slot_length} min each)!', 'success')
             return redirect(url_for('admin.set_slots'))
             
         except ValueError:
             flash('Invalid slot number!', 'error')
             return redirect(url_for('admin.set_slots'))
         except Exception as e:
-            db.session.rollback()
+            repository.rollback()
             flash('An error occurred. Please try again.', 'error')
             return redirect(url_for('admin.set_slots'))
     
     # GET request
-    doctors = Doctor.query.all()
-    return render_template('admin/set_slots.html', doctors=doctors)
+    doctors = repository.list_doctors()
+    return render_template('admin/set_slots.html', doctors=doctors, slot_label=minute_to_label)
 
 
 @admin_bp.route('/patients')
 @admin_required
 def patients():
     """
-    View complete list of registered patients.
+    View registered patients newest first.
+    Paginated with a keyset cursor (?after= / ?before=) and ?per_page=.
     """
-    all_patients = User.query.filter_by(role='patient').all()
-    return render_template('admin/patients.html', patients=all_patients)
+    page = get_repository().list_patients(after=request.args.get('after'),
+                                          before=request.args.get('before'),
+                                          per_page=request.args.get('per_page'))
+    return render_template('admin/patients.html', patients=page.items, page=page)
 
 
-@admin_bp.route('/patient/<int:patient_id>/records')
+@admin_bp.route('/patients/lookup')
+@admin_required
+@sql_only
+def patient_lookup():
+    """
+    Autocomplete for the patients page: JSON list of at most ?limit=
+    patients whose username or email starts with (or contains) ?q=.
+    """
+    patients = lookup_patients(request.args.get('q'), lookup_limit(request.args.get('limit')))
+    return jsonify({'patients': patients})
+
+
+@admin_bp.route('/reports/age-bands')
+@admin_required
+@sql_only
+def age_bands():
+    """
+    JSON histogram of patient ages, counted in the database.
+    - ?by=all (default), doctor or specialization
+    - ?specialization= to count only the patients of that specialization's doctors
+    - ?bands=0,18,30,45,65 for the lower bound of each band
+    """
+    group_by = request.args.get('by', 'all')
+    if group_by not in GROUPINGS:
+        return jsonify({'error': f"by must be one of: {', '.join(GROUPINGS)}"}), 400
+    try:
+        bands = parse_bands(request.args['bands']) if request.args.get('bands') else DEFAULT_AGE_BANDS
+    except ValueError:
+        return jsonify({'error': 'bands must be ages from 0 to 150 starting at 0, e.g. 0,18,65'}), 400
+    return jsonify(age_band_histogram(group_by, bands, request.args.get('specialization') or None))
+
+
+@admin_bp.route('/export/<kind>.<fmt>')
+@admin_required
+@sql_only
+def export(kind, fmt):
+    """
+    Stream appointments or patient records as CSV or NDJSON, e.g.
+    /admin/export/appointments.csv or /admin/export/records.ndjson.
+    - ?from= / ?to= (YYYY-MM-DD) on the appointment / visit date
+    - ?doctor= and, for appointments, ?status=
+    Rows are written while they are read, and gzipped on the fly when the
+    client accepts it, so memory use does not grow with the export.
+    """
+    if kind not in EXPORTS or fmt not in FORMATS:
+        abort(404)
+    try:
+        filters = parse_export_filters(request.args)
+    except ValueError:
+        return jsonify({'error': 'from/to must be YYYY-MM-DD, doctor an id and status one of: '
+                                 'pending, approved, rejected'}), 400
+    
+    gzip = request.accept_encodings.quality('gzip') > 0
+    response = Response(stream_with_context(export_chunks(kind, fmt, gzip, **filters)), mimetype=FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={kind}-{date.today()}.{fmt}'
+    response.headers['Vary'] = 'Accept-Encoding'
+    if gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+@admin_bp.route('/records/search')
+@admin_required
+@sql_only
+def record_search():
+    """
+    Full-text search over all patient records (?q=), ranked by relevance.
+    Optional ?patient=, ?doctor=, ?from= / ?to= filters; paginated with
+    ?after= / ?before= cursors.
+    """
+    try:
+        filters = parse_filters(request.args)
+    except ValueError:
+        flash('Invalid search filter. Dates use YYYY-MM-DD.', 'error')
+        filters = {}
+    
+    query = request.args.get('q', '').strip()
+    page = search_records(query, after=request.args.get('after'), before=request.args.get('before'), **filters)
+    doctors = Doctor.query.order_by(Doctor.name).all()
+    return render_template('admin/record_search.html', page=page, query=query, doctors=doctors)
+
+
+def _patient_or_404(repository, patient_id):
+    patient = repository.get_user(patient_id)
+    if patient is None:
+        abort(404)
+    return patient
+
+
+@admin_bp.route('/patient/<patient_id>/records')
 @admin_required
 def patient_records(patient_id):
     """
     View medical records for a specific patient.
     Accessible by admins for oversight.
     """
-    patient = User.query.get_or_404(patient_id)
+    repository = get_repository()
+    patient = _patient_or_404(repository, patient_id)
     
     if patient.role != 'patient':
         flash('Invalid patient ID!', 'error')
         return redirect(url_for('admin.patients'))
     
-    records = PatientRecord.query.filter_by(patient_id=patient_id)\
-        .order_by(PatientRecord.visit_date.desc()).all()
+    records = repository.patient_records(patient.id)
     
     return render_template('admin/patient_records.html', patient=patient, records=records)
 
@@ -206,7 +356,7 @@ def manage_doctors():
     """
     View list of all doctors in the system.
     """
-    all_doctors = Doctor.query.all()
+    all_doctors = get_repository().list_doctors()
     return render_template('admin/manage_doctors.html', doctors=all_doctors)
 
 
@@ -229,12 +379,15 @@ def create_doctor():
             flash('Please fill all required fields!', 'error')
             return redirect(url_for('admin.create_doctor'))
         
+        repository = get_repository()
+        
         # Check if username or email already exists
-        if User.query.filter_by(username=username).first():
+        taken = repository.username_or_email_taken(username, email)
+        if taken == 'username':
             flash('Username already exists!', 'error')
             return redirect(url_for('admin.create_doctor'))
         
-        if User.query.filter_by(email=email).first():
+        if taken == 'email':
             flash('Email already exists!', 'error')
             return redirect(url_for('admin.create_doctor'))
         
@@ -244,25 +397,10 @@ def create_doctor():
                 flash('Slots must be at least 1!', 'error')
                 return redirect(url_for('admin.create_doctor'))
             
-            # Create user account
-            new_user = User(
-                username=username,
-                email=email,
-                role='doctor'
-            )
-            new_user.set_password(password)
-            db.session.add(new_user)
-            db.session.flush()  # Get the user ID
-            
-            # Create doctor profile
-            new_doctor = Doctor(
-                user_id=new_user.id,
-                name=name,
-                specialization=specialization,
-                available_slots_per_day=slots_int
-            )
-            db.session.add(new_doctor)
-            db.session.commit()
+            # Create the login and the doctor profile together
+            if repository.create_doctor(username, email, password, name, specialization, slots_int) is None:
+                flash('Username or email already exists!', 'error')
+                return redirect(url_for('admin.create_doctor'))
             
             flash(f'Doctor account created successfully! Username: {username}', 'success')
             return redirect(url_for('admin.manage_doctors'))
@@ -271,7 +409,7 @@ def create_doctor():
             flash('Invalid slot number!', 'error')
             return redirect(url_for('admin.create_doctor'))
         except Exception as e:
-            db.session.rollback()
+            repository.rollback()
             flash(f'An error occurred: {str(e)}', 'error')
             return redirect(url_for('admin.create_doctor'))
     
@@ -279,14 +417,15 @@ def create_doctor():
     return render_template('admin/create_doctor.html')
 
 
-@admin_bp.route('/patient/<int:patient_id>/add-record', methods=['GET', 'POST'])
+@admin_bp.route('/patient/<patient_id>/add-record', methods=['GET', 'POST'])
 @admin_required
 def add_record(patient_id):
     """
     Add a new medical record for a patient.
     Allows admins to manually enter record data on behalf of a doctor if needed.
     """
-    patient = User.query.get_or_404(patient_id)
+    repository = get_repository()
+    patient = _patient_or_404(repository, patient_id)
     
     if patient.role != 'patient':
         flash('Invalid patient ID!', 'error')
@@ -306,17 +445,12 @@ def add_record(patient_id):
         try:
             visit_date = datetime.strptime(visit_date_str, '%Y-%m-%d').date()
             
-            record = PatientRecord(
-                patient_id=patient.id,
-                doctor_id=doctor_id,
-                diagnosis=diagnosis,
-                prescription=prescription,
-                visit_date=visit_date,
-                notes=notes
-            )
+            doctor = repository.get_doctor(doctor_id)
+            if not doctor:
+                flash('Doctor not found!', 'error')
+                return redirect(url_for('admin.add_record', patient_id=patient.id))
             
-            db.session.add(record)
-            db.session.commit()
+            repository.add_record(patient, doctor, diagnosis, prescription, visit_date, notes)
             
             flash('Medical record added successfully!', 'success')
             return redirect(url_for('admin.patient_records', patient_id=patient.id))
@@ -324,9 +458,9 @@ def add_record(patient_id):
         except ValueError:
             flash('Invalid date format!', 'error')
         except Exception as e:
-            db.session.rollback()
+            repository.rollback()
             flash(f'Error adding record: {str(e)}', 'error')
             
     # GET request
-    doctors = Doctor.query.all()
+    doctors = repository.list_doctors()
     return render_template('admin/add_record.html', patient=patient, doctors=doctors)
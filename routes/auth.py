@@ -1,7 +1,7 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required, current_user
-from models import db, User
-from werkzeug.security import generate_password_hash
+from services.repository import get_repository
+from services.passwords import HashPoolBusy
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -46,26 +46,27 @@ def register():
             flash('Invalid date format!', 'error')
             return render_template('auth/register.html')
         
+        repository = get_repository()
+        
         # Check if user already exists
-        if User.query.filter_by(username=username).first():
+        taken = repository.username_or_email_taken(username, email)
+        if taken == 'username':
             flash('Username already exists!', 'error')
             return render_template('auth/register.html')
         
-        if User.query.filter_by(email=email).first():
+        if taken == 'email':
             flash('Email already registered!', 'error')
             return render_template('auth/register.html')
         
         # Create new user
-        new_user = User(username=username, email=email, role='patient', date_of_birth=date_of_birth)
-        new_user.set_password(password)
-        
         try:
-            db.session.add(new_user)
-            db.session.commit()
+            if repository.create_user(username, email, password, role='patient', date_of_birth=date_of_birth) is None:
+                flash('Username already exists!', 'error')
+                return render_template('auth/register.html')
             flash('Registration successful! Please login.', 'success')
             return redirect(url_for('auth.login'))
         except Exception as e:
-            db.session.rollback()
+            repository.rollback()
             flash('An error occurred. Please try again.', 'error')
             return render_template('auth/register.html')
     
@@ -96,10 +97,17 @@ def login():
             flash('Please provide both username and password!', 'error')
             return render_template('auth/login.html')
         
-        user = User.query.filter_by(username=username).first()
+        repository = get_repository()
+        
+        try:
+            user = repository.authenticate(username, password)
+        except HashPoolBusy:
+            flash('The server is busy, please try logging in again in a moment.', 'error')
+            return render_template('auth/login.html'), 503
         
-        if user and user.check_password(password):
+        if user:
             login_user(user)
+            repository.remember_login(user)
             flash(f'Welcome back, {user.username}!', 'success')
             
             # Redirect based on role
@@ -124,6 +132,7 @@ def logout():
     Clears the user session and redirects to homepage.
     """
     logout_user()
+    get_repository().forget_login()
     flash('You have been logged out successfully.', 'success')
     return redirect(url_for('index'))
 
@@ -147,9 +156,7 @@ def forgot_password():
             flash('Please provide your email address!', 'error')
             return render_template('auth/forgot_password.html')
         
-        user = User.query.filter_by(email=email).first()
-        
-        if user:
+        if get_repository().email_taken(email):
             # In a real application, you would send an email with a reset token
             # For now, we'll just flash a success message
             flash('Password reset instructions have been sent to your email.', 'success')
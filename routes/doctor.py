@@ -1,6 +1,6 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, current_app
 from flask_login import login_required, current_user
-from models import db, User, Doctor, Appointment, PatientRecord
+from services.repository import get_repository
 from datetime import datetime
 from functools import wraps
 
@@ -32,29 +32,28 @@ def dashboard():
     - Total, Pending, and Approved appointment counts
     - Total patient records created count
     """
+    repository = get_repository()
+    
     # Get doctor profile associated with current user
-    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
+    doctor = repository.doctor_for_user(current_user)
     
     if not doctor:
         flash('Doctor profile not found!', 'error')
         return redirect(url_for('index'))
     
     # Get recent appointments
-    recent_appointments = Appointment.query.filter_by(doctor_id=doctor.id)\
-        .order_by(Appointment.appointment_date.desc()).limit(5).all()
+    recent_appointments = repository.doctor_appointments(doctor.id, limit=5)
     
     # Get statistics
-    total_appointments = Appointment.query.filter_by(doctor_id=doctor.id).count()
-    pending_appointments = Appointment.query.filter_by(doctor_id=doctor.id, status='pending').count()
-    approved_appointments = Appointment.query.filter_by(doctor_id=doctor.id, status='approved').count()
-    total_records = PatientRecord.query.filter_by(doctor_id=doctor.id).count()
+    stats = repository.appointment_stats(doctor_id=doctor.id)
+    total_records = repository.count_doctor_records(doctor.id)
     
     return render_template('doctor/dashboard.html',
                          doctor=doctor,
                          recent_appointments=recent_appointments,
-                         total_appointments=total_appointments,
-                         pending_appointments=pending_appointments,
-                         approved_appointments=approved_appointments,
+                         total_appointments=stats.total_appointments,
+                         pending_appointments=stats.pending_appointments,
+                         approved_appointments=stats.approved_appointments,
                          total_records=total_records)
 
 
@@ -65,7 +64,8 @@ def appointments():
     View all appointments for the current doctor.
     Supports filtering by status.
     """
-    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
+    repository = get_repository()
+    doctor = repository.doctor_for_user(current_user)
     
     if not doctor:
         flash('Doctor profile not found!', 'error')
@@ -73,12 +73,8 @@ def appointments():
     
     status_filter = request.args.get('status', 'all')
     
-    if status_filter == 'all':
-        all_appointments = Appointment.query.filter_by(doctor_id=doctor.id)\
-            .order_by(Appointment.appointment_date.desc()).all()
-    else:
-        all_appointments = Appointment.query.filter_by(doctor_id=doctor.id, status=status_filter)\
-            .order_by(Appointment.appointment_date.desc()).all()
+    all_appointments = repository.doctor_appointments(
+        doctor.id, status=None if status_filter == 'all' else status_filter)
     
     return render_template('doctor/appointments.html', 
                          appointments=all_appointments,
@@ -90,65 +86,98 @@ def appointments():
 @doctor_required
 def records():
     """
-    View all patient records created by this doctor, grouped by patient.
+    View the patients this doctor has written records for, alphabetically,
+    with their latest records. Paginated with ?after= / ?before= cursors
+    and ?per_page=.
     """
-    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
+    repository = get_repository()
+    doctor = repository.doctor_for_user(current_user)
     
     if not doctor:
         flash('Doctor profile not found!', 'error')
         return redirect(url_for('index'))
     
-    # Group records by patient
-    patients_map = {}
-    all_records = PatientRecord.query.filter_by(doctor_id=doctor.id)\
-        .order_by(PatientRecord.visit_date.desc()).all()
+    page = repository.doctor_patient_groups(doctor.id,
+                                            after=request.args.get('after'),
+                                            before=request.args.get('before'),
+                                            per_page=request.args.get('per_page'),
+                                            per_patient=current_app.config.get('RECORDS_PER_PATIENT', 3))
+    
+    return render_template('doctor/records.html', groups=page.groups, page=page, doctor=doctor)
+
+
+@doctor_bp.route('/records/search')
+@doctor_required
+def record_search():
+    """
+    Full-text search over the records this doctor wrote, or with ?patient=
+    over that patient's whole history (as on the full records page).
+    Optional ?from= / ?to= visit dates; paginated with ?after= / ?before=.
+    """
+    if current_app.config.get('STORAGE_BACKEND', 'sql') != 'sql':
+        flash('Record search is only available with the SQL storage backend.', 'info')
+        return redirect(url_for('doctor.records'))
+    
+    # The search index lives in SQLite, so it is imported on first use only
+    from services.record_search import parse_filters, search_records
     
-    for record in all_records:
-        if record.patient not in patients_map:
-            patients_map[record.patient] = []
-        patients_map[record.patient].append(record)
+    doctor = get_repository().doctor_for_user(current_user)
+    if not doctor:
+        flash('Doctor profile not found!', 'error')
+        return redirect(url_for('index'))
     
-    # Sort patients alphabetically by username
-    sorted_patients_map = dict(sorted(patients_map.items(), key=lambda item: item[0].username.lower()))
+    try:
+        filters = parse_filters(request.args)
+    except ValueError:
+        flash('Invalid search filter. Dates use YYYY-MM-DD.', 'error')
+        filters = {'patient_id': None, 'date_from': None, 'date_to': None}
+    filters['doctor_id'] = None if filters['patient_id'] else doctor.id
     
-    return render_template('doctor/records.html', patients_map=sorted_patients_map, doctor=doctor)
+    query = request.args.get('q', '').strip()
+    page = search_records(query, after=request.args.get('after'), before=request.args.get('before'), **filters)
+    return render_template('doctor/record_search.html', page=page, query=query, doctor=doctor)
 
 
-@doctor_bp.route('/patient-records/<int:patient_id>')
+@doctor_bp.route('/patient-records/<patient_id>')
 @doctor_required
 def patient_records_view(patient_id):
     """
     View full medical history for a specific patient.
     Includes records from all doctors, allowing for comprehensive care.
     """
-    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
+    repository = get_repository()
+    doctor = repository.doctor_for_user(current_user)
     if not doctor:
         flash('Doctor profile not found!', 'error')
         return redirect(url_for('index'))
         
-    patient = User.query.get_or_404(patient_id)
+    patient = repository.get_user(patient_id)
+    if not patient:
+        abort(404)
     
     # Show all records for this patient (history from all doctors)
-    records = PatientRecord.query.filter_by(patient_id=patient_id)\
-        .order_by(PatientRecord.visit_date.desc()).all()
+    records = repository.patient_records(patient.id)
         
     return render_template('doctor/patient_full_records.html', patient=patient, records=records)
 
 
-@doctor_bp.route('/add-record/<int:patient_id>', methods=['GET', 'POST'])
+@doctor_bp.route('/add-record/<patient_id>', methods=['GET', 'POST'])
 @doctor_required
 def add_record(patient_id):
     """
     Add a new medical record for a patient.
     Collects diagnosis, prescription, date, and notes.
     """
-    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
+    repository = get_repository()
+    doctor = repository.doctor_for_user(current_user)
     
     if not doctor:
         flash('Doctor profile not found!', 'error')
         return redirect(url_for('doctor.dashboard'))
     
-    patient = User.query.get_or_404(patient_id)
+    patient = repository.get_user(patient_id)
+    if not patient:
+        abort(404)
     
     if patient.role != 'patient':
         flash('Invalid patient ID!', 'error')
@@ -167,17 +196,7 @@ def add_record(patient_id):
         try:
             visit_date_obj = datetime.strptime(visit_date, '%Y-%m-%d').date()
             
-            new_record = PatientRecord(
-                patient_id=patient_id,
-                doctor_id=doctor.id,
-                diagnosis=diagnosis,
-                prescription=prescription,
-                visit_date=visit_date_obj,
-                notes=notes
-            )
-            
-            db.session.add(new_record)
-            db.session.commit()
+            repository.add_record(patient, doctor, diagnosis, prescription, visit_date_obj, notes)
             
             flash('Patient record added successfully!', 'success')
             return redirect(url_for('doctor.records'))
@@ -186,7 +205,7 @@ def add_record(patient_id):
             flash('Invalid date format!', 'error')
             return redirect(url_for('doctor.add_record', patient_id=patient_id))
         except Exception as e:
-            db.session.rollback()
+            repository.rollback()
             flash('An error occurred. Please try again.', 'error')
             return redirect(url_for('doctor.add_record', patient_id=patient_id))
     
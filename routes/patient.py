@@ -1,7 +1,8 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required, current_user
-from models import db, Doctor, Appointment, PatientRecord, User
-from datetime import datetime, date
+from services.repository import get_repository, SLOT_TAKEN, BUSY
+from services.slots import schedule_minutes, label_to_minute, minute_to_label
+from datetime import datetime, date, timedelta
 from functools import wraps
 
 # Define the Blueprint for Patient routes
@@ -31,20 +32,19 @@ def dashboard():
     - Recent appointments (limit 5)
     - Total, Pending, and Approved appointment counts
     """
+    repository = get_repository()
+    
     # Get recent appointments
-    recent_appointments = Appointment.query.filter_by(patient_id=current_user.id)\
-        .order_by(Appointment.created_at.desc()).limit(5).all()
+    recent_appointments = repository.patient_appointments(current_user.id, recent=5)
     
     # Get statistics
-    total_appointments = Appointment.query.filter_by(patient_id=current_user.id).count()
-    pending_appointments = Appointment.query.filter_by(patient_id=current_user.id, status='pending').count()
-    approved_appointments = Appointment.query.filter_by(patient_id=current_user.id, status='approved').count()
+    stats = repository.appointment_stats(patient_id=current_user.id)
     
     return render_template('patient/dashboard.html',
                          recent_appointments=recent_appointments,
-                         total_appointments=total_appointments,
-                         pending_appointments=pending_appointments,
-                         approved_appointments=approved_appointments)
+                         total_appointments=stats.total_appointments,
+                         pending_appointments=stats.pending_appointments,
+                         approved_appointments=stats.approved_appointments)
 
 
 @patient_bp.route('/book-appointment', methods=['GET', 'POST'])
@@ -54,9 +54,11 @@ def book_appointment():
     Handle appointment booking.
     - Validates doctor, date, and time selection.
     - Checks for valid dates (no past dates).
-    - Checks doctor's daily available slots against approved appointments.
-    - Creates a 'pending' appointment request if all checks pass.
+    - Checks the time is one of the doctor's slots.
+    - Creates a 'pending' appointment request holding that time slot if all checks pass.
     """
+    repository = get_repository()
+    
     if request.method == 'POST':
         doctor_id = request.form.get('doctor_id')
         appointment_date = request.form.get('appointment_date')
@@ -78,35 +80,30 @@ def book_appointment():
                 return redirect(url_for('patient.book_appointment'))
             
             # Check if doctor exists
-            doctor = Doctor.query.get(doctor_id)
+            doctor = repository.get_doctor(doctor_id)
             if not doctor:
                 flash('Invalid doctor selection!', 'error')
                 return redirect(url_for('patient.book_appointment'))
             
-            # Check slot availability
-            # We count only 'approved' appointments towards the limit
-            existing_appointments = Appointment.query.filter_by(
-                doctor_id=doctor_id,
-                appointment_date=appt_date,
-                status='approved'
-            ).count()
-            
-            if existing_appointments >= doctor.available_slots_per_day:
-                flash('Sorry, no slots available for this doctor on the selected date!', 'error')
+            # The time must be one of the doctor's slots and not already started
+            start_minute = label_to_minute(appointment_time)
+            if start_minute not in schedule_minutes(doctor):
+                flash('Please pick one of the available time slots!', 'error')
                 return redirect(url_for('patient.book_appointment'))
             
-            # Create appointment
-            new_appointment = Appointment(
-                patient_id=current_user.id,
-                doctor_id=doctor_id,
-                appointment_date=appt_date,
-                appointment_time=appointment_time,
-                reason=reason,
-                status='pending'
-            )
+            now = datetime.now()
+            if appt_date == now.date() and start_minute <= now.hour * 60 + now.minute:
+                flash('That time slot has already passed!', 'error')
+                return redirect(url_for('patient.book_appointment'))
             
-            db.session.add(new_appointment)
-            db.session.commit()
+            # Create appointment holding the slot; fails if another patient got it first
+            result = repository.book_appointment(current_user, doctor, appt_date, start_minute, reason)
+            if result == SLOT_TAKEN:
+                flash('Sorry, that time slot is no longer available. Please choose another time!', 'error')
+                return redirect(url_for('patient.book_appointment'))
+            if result == BUSY:
+                flash('Many patients are booking right now. Please try again in a moment.', 'error')
+                return redirect(url_for('patient.book_appointment'))
             
             flash('Appointment request submitted successfully! Waiting for admin approval.', 'success')
             return redirect(url_for('patient.appointments'))
@@ -115,12 +112,12 @@ def book_appointment():
             flash('Invalid date format!', 'error')
             return redirect(url_for('patient.book_appointment'))
         except Exception as e:
-            db.session.rollback()
+            repository.rollback()
             flash('An error occurred. Please try again.', 'error')
             return redirect(url_for('patient.book_appointment'))
     
     # GET request - show form
-    doctors = Doctor.query.all()
+    doctors = repository.list_doctors()
     return render_template('patient/book_appointment.html', doctors=doctors)
 
 
@@ -133,12 +130,8 @@ def appointments():
     """
     status_filter = request.args.get('status', 'all')
     
-    if status_filter == 'all':
-        all_appointments = Appointment.query.filter_by(patient_id=current_user.id)\
-            .order_by(Appointment.appointment_date.desc()).all()
-    else:
-        all_appointments = Appointment.query.filter_by(patient_id=current_user.id, status=status_filter)\
-            .order_by(Appointment.appointment_date.desc()).all()
+    all_appointments = get_repository().patient_appointments(
+        current_user.id, status=None if status_filter == 'all' else status_filter)
     
     return render_template('patient/appointments.html', 
                          appointments=all_appointments,
@@ -151,45 +144,92 @@ def records():
     """
     View all medical records for the current patient.
     """
-    patient_records = PatientRecord.query.filter_by(patient_id=current_user.id)\
-        .order_by(PatientRecord.visit_date.desc()).all()
+    patient_records = get_repository().patient_records(current_user.id)
     
     return render_template('patient/records.html', records=patient_records)
 
 
-@patient_bp.route('/check-slots/<int:doctor_id>/<appointment_date>')
+@patient_bp.route('/check-slots/<doctor_id>/<appointment_date>')
 @patient_required
 def check_slots(doctor_id, appointment_date):
     """
     API endpoint to check available slots for a specific doctor on a specific date.
     Returns JSON with available slots count.
-    Used by the frontend for real-time validation.
+    Used by the frontend for real-time validation; served from the
+    in-process availability cache when possible.
     """
     try:
         appt_date = datetime.strptime(appointment_date, '%Y-%m-%d').date()
-        doctor = Doctor.query.get(doctor_id)
+        availability = get_repository().availability(doctor_id, appt_date)
         
-        if not doctor:
+        if availability is None:
             return jsonify({'error': 'Doctor not found'}), 404
         
-        # Count approved appointments
-        booked_slots = Appointment.query.filter_by(
-            doctor_id=doctor_id,
-            appointment_date=appt_date,
-            status='approved'
-        ).count()
-        
-        available_slots = doctor.available_slots_per_day - booked_slots
-        
-        return jsonify({
-            'available_slots': max(0, available_slots),
-            'total_slots': doctor.available_slots_per_day,
-            'booked_slots': booked_slots
-        })
+        return jsonify(availability)
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
 
+@patient_bp.route('/availability')
+@patient_bp.route('/availability/<doctor_id>')
+@patient_required
+def availability(doctor_id=None):
+    """
+    API endpoint returning free slots per day over a date range in one request.
+    - /availability/<doctor_id>?start=YYYY-MM-DD&end=YYYY-MM-DD for one doctor
+    - /availability?specialization=...&start=...&end=... for every doctor of a specialization
+    `start` defaults to today and `end` to 30 days later; the range is capped
+    at AVAILABILITY_MAX_RANGE_DAYS.
+    """
+    try:
+        start_str = request.args.get('start')
+        end_str = request.args.get('end')
+        start = datetime.strptime(start_str, '%Y-%m-%d').date() if start_str else date.today()
+        end = datetime.strptime(end_str, '%Y-%m-%d').date() if end_str else start + timedelta(days=30)
+    except ValueError:
+        return jsonify({'error': 'Invalid date format'}), 400
+    
+    if end < start:
+        return jsonify({'error': 'end must not be before start'}), 400
+    
+    max_days = current_app.config.get('AVAILABILITY_MAX_RANGE_DAYS', 62)
+    if (end - start).days + 1 > max_days:
+        return jsonify({'error': f'Date range is limited to {max_days} days'}), 400
+    
+    repository = get_repository()
+    if doctor_id is not None:
+        doctor = repository.get_doctor(doctor_id)
+        if not doctor:
+            return jsonify({'error': 'Doctor not found'}), 404
+        doctors = [doctor]
+    else:
+        specialization = request.args.get('specialization')
+        if not specialization:
+            return jsonify({'error': 'Provide a doctor id or a specialization'}), 400
+        doctors = repository.list_doctors(specialization)
+    
+    return jsonify(repository.availability_range(doctors, start, end))
+
+
+@patient_bp.route('/next-slot/<doctor_id>')
+@patient_required
+def next_slot(doctor_id):
+    """
+    API endpoint returning the doctor's earliest free time slot
+    within SLOT_HORIZON_DAYS, or nulls if there is none.
+    """
+    repository = get_repository()
+    doctor = repository.get_doctor(doctor_id)
+    if not doctor:
+        return jsonify({'error': 'Doctor not found'}), 404
+    
+    slot = repository.next_free_slot(doctor)
+    
+    if not slot:
+        return jsonify({'date': None, 'minute': None, 'time': None})
+    return jsonify({'date': slot[0].isoformat(), 'minute': slot[1], 'time': minute_to_label(slot[1])})
+
+
 @patient_bp.route('/update-profile', methods=['GET', 'POST'])
 @patient_required
 def update_profile():
@@ -204,9 +244,10 @@ def update_profile():
             flash('All fields are required!', 'error')
             return redirect(url_for('patient.update_profile'))
             
+        repository = get_repository()
+        
         # Check if email is taken by another user
-        existing_user = User.query.filter(User.email == email, User.id != current_user.id).first()
-        if existing_user:
+        if repository.email_taken(email, exclude_user=current_user):
             flash('Email already registered by another user!', 'error')
             return redirect(url_for('patient.update_profile'))
             
@@ -214,10 +255,7 @@ def update_profile():
             date_of_birth = datetime.strptime(dob_str, '%Y-%m-%d').date()
             
             # Update user
-            current_user.email = email
-            current_user.date_of_birth = date_of_birth
-            
-            db.session.commit()
+            repository.update_profile(current_user, email, date_of_birth)
             flash('Profile updated successfully!', 'success')
             return redirect(url_for('patient.dashboard'))
             
@@ -225,7 +263,7 @@ def update_profile():
             flash('Invalid date format!', 'error')
             return redirect(url_for('patient.update_profile'))
         except Exception as e:
-            db.session.rollback()
+            repository.rollback()
             flash('An error occurred. Please try again.', 'error')
             return redirect(url_for('patient.update_profile'))
             
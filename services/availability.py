@@ -0,0 +1,120 @@
+import threading
+from datetime import date, timedelta
+from flask import current_app
+from models import db, Doctor
+from services.cache import TTLCache
+from services.slots import free_slots, held_slots, free_slot_counts, minute_to_label, now_minute
+
+
+class AvailabilityCache(TTLCache):
+    """
+    Availability cache keyed by (doctor_id, date) tuples.
+    """
+
+    def invalidate(self, doctor_id, day=None):
+        """
+        Drop one (doctor, day) entry, or every cached day of a doctor when
+        day is None.
+        """
+        if day is not None:
+            self.pop((doctor_id, day))
+        else:
+            self.pop_matching(lambda key: key[0] == doctor_id)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Return the process-wide availability cache, sized from the app config.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AvailabilityCache(
+                    maxsize=current_app.config.get('AVAILABILITY_CACHE_SIZE', 1024),
+                    ttl=current_app.config.get('AVAILABILITY_CACHE_TTL', 60),
+                )
+    return _cache
+
+
+def get_availability(doctor_id, day):
+    """
+    Return slot availability for a doctor on a given date as a dict with
+    available_slots, total_slots, booked_slots and the free slot times
+    (free_slots), or None if the doctor does not exist.
+    Served from the cache when possible.
+    """
+    cache = get_cache()
+    key = (doctor_id, day)
+    availability = cache.get(key)
+    if availability is not None:
+        return _unstarted(availability) if day == date.today() else availability
+
+    doctor = db.session.get(Doctor, doctor_id)
+    if not doctor:
+        return None
+
+    minutes = free_slots(doctor, day)
+    availability = {
+        'available_slots': len(minutes),
+        'total_slots': doctor.available_slots_per_day,
+        'booked_slots': held_slots(doctor_id, day),
+        'free_slots': [{'minute': minute, 'time': minute_to_label(minute)} for minute in minutes]
+    }
+    cache.set(key, availability)
+    return availability
+
+
+def _unstarted(availability):
+    """
+    Today's cached availability without the slots that have started since
+    it was cached.
+    """
+    started = now_minute()
+    free = [slot for slot in availability['free_slots'] if slot['minute'] > started]
+    if len(free) == len(availability['free_slots']):
+        return availability
+    return dict(availability, available_slots=len(free), free_slots=free)
+
+
+def invalidate_availability(doctor_id, day=None):
+    """
+    Forget cached availability after a write that changes it.
+    Call only after the write has been committed.
+    """
+    get_cache().invalidate(int(doctor_id), day)
+
+
+def get_availability_range(doctors, start, end):
+    """
+    Compute availability for several doctors over the inclusive date range
+    [start, end] with a single grouped query over the free slots.
+
+    Returns a compact calendar: one entry per doctor with its daily slot
+    limit and a list of available slot counts, one per day starting at
+    `start`.
+    """
+    doctors = list(doctors)
+    days = (end - start).days + 1
+    calendar = {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'doctors': []
+    }
+    if not doctors or days < 1:
+        return calendar
+
+    free = free_slot_counts(doctors, start, end)
+    for doctor in doctors:
+        calendar['doctors'].append({
+            'id': doctor.id,
+            'name': doctor.name,
+            'specialization': doctor.specialization,
+            'total_slots': doctor.available_slots_per_day,
+            'available': [free.get((doctor.id, start + timedelta(days=offset)), 0) for offset in range(days)]
+        })
+    return calendar
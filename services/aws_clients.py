@@ -0,0 +1,204 @@
+"""
+Shared boto3 clients for the DynamoDB deployment.
+
+aws_app.py, auth.py and the DynamoDB repository get their DynamoDB
+resource and SNS client from here instead of calling boto3 themselves,
+so a process keeps one client (and one HTTP connection pool) per
+service, region and endpoint, all configured from the environment:
+
+    AWS_MAX_POOL_CONNECTIONS  pooled connections per client (default 50;
+                              botocore's own default is 10)
+    AWS_RETRY_MODE            'adaptive' (default): standard retries plus
+                              client-side rate limiting when throttled
+    AWS_MAX_ATTEMPTS          attempts per call, the first included (5)
+    AWS_CONNECT_TIMEOUT       seconds to open a connection (2)
+    AWS_READ_TIMEOUT          seconds to wait for a response (10)
+
+TCP keepalive is on, so idle pooled connections survive load balancer
+and NAT timeouts. boto3 is imported and clients are created on first
+use, so importing an app module stays cheap. A forked child
+(e.g. gunicorn --preload workers) closes the connections it inherited
+before its first call, so parent and child never share a socket.
+
+metrics() reports, per client, calls, errors, retries, calls in flight
+and how often the pool ran out: a call started while every pooled
+connection was busy has to open an extra one, which urllib3 discards
+afterwards ("Connection pool is full").
+"""
+import logging
+import os
+import threading
+import time
+
+MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 50))
+RETRY_MODE = os.environ.get('AWS_RETRY_MODE', 'adaptive') # 'legacy', 'standard' or 'adaptive'
+MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', 5))
+CONNECT_TIMEOUT = float(os.environ.get('AWS_CONNECT_TIMEOUT', 2))
+READ_TIMEOUT = float(os.environ.get('AWS_READ_TIMEOUT', 10))
+
+_lock = threading.Lock()
+_session = None
+_cache = {} # (kind, service, region, endpoint) -> boto3 client or resource
+_metrics = {} # metrics name -> ClientMetrics
+
+
+def client_config(**overrides):
+    """
+    botocore Config used for every shared client; overrides replace
+    single settings (e.g. max_pool_connections=10).
+    """
+    from botocore.config import Config
+
+    settings = {
+        'max_pool_connections': MAX_POOL_CONNECTIONS,
+        'retries': {'mode': RETRY_MODE, 'max_attempts': MAX_ATTEMPTS},
+        'connect_timeout': CONNECT_TIMEOUT,
+        'read_timeout': READ_TIMEOUT,
+        'tcp_keepalive': True,
+    }
+    settings.update(overrides)
+    return Config(**settings)
+
+
+class ClientMetrics:
+    """
+    Call counters of one client, fed by its botocore before-call /
+    after-call events.
+    """
+
+    def __init__(self, pool_size):
+        self.pool_size = pool_size
+        self.reset()
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'errors': 0, 'retries': 0, 'in_flight': 0, 'peak_in_flight': 0,
+                       'pool_exhausted': 0, 'latency_total': 0.0}
+
+    def attach(self, events):
+        events.register('before-call', self._started)
+        events.register('after-call', self._finished)
+        events.register('after-call-error', self._failed)
+
+    def _started(self, context=None, **kwargs):
+        context['metrics_started'] = time.monotonic()
+        with self._lock:
+            stats = self._stats
+            if stats['in_flight'] >= self.pool_size:
+                stats['pool_exhausted'] += 1
+            stats['calls'] += 1
+            stats['in_flight'] += 1
+            stats['peak_in_flight'] = max(stats['peak_in_flight'], stats['in_flight'])
+
+    def _done(self, context, retries, error):
+        elapsed = time.monotonic() - context.pop('metrics_started', time.monotonic())
+        with self._lock:
+            self._stats['in_flight'] -= 1
+            self._stats['retries'] += retries
+            self._stats['errors'] += error
+            self._stats['latency_total'] += elapsed
+
+    def _finished(self, http_response=None, parsed=None, context=None, **kwargs):
+        retries = (parsed or {}).get('ResponseMetadata', {}).get('RetryAttempts', 0)
+        self._done(context, retries, http_response.status_code >= 300)
+
+    def _failed(self, exception=None, context=None, **kwargs):
+        # Connection errors and timeouts still failing after the retries
+        self._done(context, 0, True)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self._stats)
+        total = stats.pop('latency_total')
+        return {
+            'pool_size': self.pool_size,
+            **stats,
+            'latency_avg_seconds': round(total / stats['calls'], 4) if stats['calls'] else 0.0,
+        }
+
+
+class _DiscardedConnections(logging.Handler):
+    """
+    Counts urllib3's "Connection pool is full, discarding connection" warnings.
+    """
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.count = 0
+
+    def emit(self, record):
+        if str(record.msg).startswith('Connection pool is full'):
+            self.count += 1
+
+
+_discarded = _DiscardedConnections()
+logging.getLogger('urllib3.connectionpool').addHandler(_discarded)
+
+
+def _get(kind, service, region, endpoint_url, overrides):
+    global _session
+    import boto3
+
+    region = region or os.environ.get('AWS_REGION', 'us-east-1')
+    key = (kind, service, region, endpoint_url, tuple(sorted(overrides.items())))
+    with _lock:
+        if key not in _cache:
+            # boto3's default session is not safe to create clients from concurrently
+            if _session is None:
+                _session = boto3.session.Session()
+            config = client_config(**overrides)
+            factory = _session.resource if kind == 'resource' else _session.client
+            made = factory(service, region_name=region, endpoint_url=endpoint_url, config=config)
+            metrics = ClientMetrics(config.max_pool_connections)
+            metrics.attach(_low_level(made).meta.events)
+            name = ':'.join([service, region] + [endpoint_url] * bool(endpoint_url)
+                            + [f'{k}={v}' for k, v in sorted(overrides.items())])
+            _metrics[name] = metrics
+            _cache[key] = made
+        return _cache[key]
+
+
+def _low_level(made):
+    return made.meta.client if hasattr(made.meta, 'client') else made
+
+
+def resource(service, region=None, endpoint_url=None, **overrides):
+    """
+    Shared boto3 resource (e.g. 'dynamodb'), created on first use.
+    """
+    return _get('resource', service, region, endpoint_url, overrides)
+
+
+def client(service, region=None, endpoint_url=None, **overrides):
+    """
+    Shared boto3 low-level client (e.g. 'sns'), created on first use.
+    """
+    return _get('client', service, region, endpoint_url, overrides)
+
+
+def metrics():
+    """
+    {client name: call and pool counters} for this process, plus the
+    number of connections urllib3 discarded because a pool was full.
+    """
+    with _lock:
+        clients = dict(_metrics)
+    return {
+        'clients': {name: m.snapshot() for name, m in clients.items()},
+        'discarded_connections': _discarded.count,
+    }
+
+
+def _after_fork():
+    global _lock
+    # The parent keeps its connections; the child reconnects on its next call
+    _lock = threading.Lock()
+    for made in _cache.values():
+        _low_level(made).close()
+    for m in _metrics.values():
+        m.reset()
+    _discarded.count = 0
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
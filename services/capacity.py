@@ -0,0 +1,101 @@
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from models import db, Doctor, Appointment, DailyCapacity
+from services.slots import claim_slot, release_slot, label_to_minute
+
+
+def _ensure_counter(doctor_id, day):
+    """
+    Create the (doctor, day) counter row if it doesn't exist yet, seeded
+    with the current number of approved appointments so days booked before
+    the counter existed start from the right value.
+    """
+    if db.session.query(DailyCapacity.booked).filter_by(doctor_id=doctor_id, day=day).scalar() is not None:
+        return
+
+    approved = Appointment.query.filter_by(
+        doctor_id=doctor_id,
+        appointment_date=day,
+        status='approved'
+    ).count()
+    try:
+        # Savepoint: losing the insert race to another request is fine
+        with db.session.begin_nested():
+            db.session.add(DailyCapacity(doctor_id=doctor_id, day=day, booked=approved))
+    except IntegrityError:
+        pass
+
+
+def _take_slot(doctor_id, day, limit):
+    # Capacity check and increment in one statement: the row only changes
+    # while it is still below the limit
+    result = db.session.execute(
+        update(DailyCapacity)
+        .where(DailyCapacity.doctor_id == doctor_id,
+               DailyCapacity.day == day,
+               DailyCapacity.booked < limit)
+        .values(booked=DailyCapacity.booked + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def _give_back_slot(doctor_id, day):
+    db.session.execute(
+        update(DailyCapacity)
+        .where(DailyCapacity.doctor_id == doctor_id,
+               DailyCapacity.day == day,
+               DailyCapacity.booked > 0)
+        .values(booked=DailyCapacity.booked - 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def change_status(appointment, new_status):
+    """
+    Move an appointment to new_status, keeping the doctor's daily counter
+    and the appointment's time slot in step. Every step is a conditional
+    UPDATE, so concurrent requests can neither overbook a day nor count
+    the same appointment twice.
+
+    Returns:
+    - 'ok'       status changed; the caller commits
+    - 'full'     the doctor has no slots left that day, or the appointment's
+                 time was taken while it was rejected
+    - 'conflict' another request changed the appointment first
+    On anything but 'ok' the caller must roll back.
+    """
+    old_status = appointment.status
+    doctor_id = appointment.doctor_id
+    day = appointment.appointment_date
+
+    if 'approved' in (old_status, new_status):
+        _ensure_counter(doctor_id, day)
+
+    moved = db.session.execute(
+        update(Appointment)
+        .where(Appointment.id == appointment.id, Appointment.status == old_status)
+        .values(status=new_status)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not moved:
+        return 'conflict'
+
+    if new_status == 'approved':
+        limit = db.session.query(Doctor.available_slots_per_day).filter_by(id=doctor_id).scalar()
+        if not _take_slot(doctor_id, day, limit):
+            return 'full'
+    elif old_status == 'approved':
+        _give_back_slot(doctor_id, day)
+
+    # Rejected appointments give their time slot back; reviving one needs it again
+    if new_status == 'rejected':
+        release_slot(appointment.id)
+    elif old_status == 'rejected':
+        minute = appointment.start_minute
+        if minute is None:
+            minute = label_to_minute(appointment.appointment_time)
+        if not claim_slot(appointment.doctor, day, minute, appointment.id):
+            return 'full'
+
+    return 'ok'
@@ -0,0 +1,91 @@
+from datetime import datetime
+from sqlalchemy import func, case, select, literal
+from models import db, User, Doctor, Appointment
+
+# Lower bounds (years) of the default age bands: 0-17, 18-29, 30-44, 45-64, 65+
+DEFAULT_AGE_BANDS = (0, 18, 30, 45, 65)
+UNKNOWN_BAND = 'unknown'
+GROUPINGS = ('all', 'doctor', 'specialization')
+
+
+def parse_bands(text):
+    """
+    Parse "0,18,65" into increasing band lower bounds starting at 0.
+    Raises ValueError for anything else.
+    """
+    bounds = sorted({int(part) for part in text.split(',') if part.strip()})
+    if not bounds or bounds[0] != 0 or bounds[-1] > 150:
+        raise ValueError('bands must be ages from 0 to 150, starting at 0')
+    return tuple(bounds)
+
+
+def band_labels(bands):
+    labels = [f'{low}-{high - 1}' for low, high in zip(bands, bands[1:])]
+    return labels + [f'{bands[-1]}+']
+
+
+def age_band(bands, today=None):
+    """
+    SQL expression giving the index of a user's age band, or -1 when the
+    date of birth is unknown. Compares date_of_birth with the cutoff date
+    of each band, so no per-row date arithmetic runs in the database.
+    """
+    today = today or datetime.now().date()
+    whens = [(User.date_of_birth.is_(None), -1)]
+    whens += [(User.born_by(low, today), index) for index, low in reversed(list(enumerate(bands))) if low]
+    return case(*whens, else_=0)
+
+
+def age_band_histogram(group_by='all', bands=DEFAULT_AGE_BANDS, specialization=None):
+    """
+    Count patients per age band, hospital-wide or per doctor/specialization
+    (the patients with at least one appointment with that doctor /
+    specialization, counted once each), optionally only for the doctors
+    of one specialization. One GROUP BY query.
+    Returns {'bands': [labels..., 'unknown'], 'groups': [{'key', 'name',
+    'counts', 'total', 'average_age'}]}.
+    """
+    labels = band_labels(bands)
+    band = age_band(bands).label('band')
+
+    if group_by == 'all' and not specialization:
+        patients = select(literal('all').label('key'), User.id.label('patient_id'))\
+            .where(User.role == 'patient')
+    else:
+        key = {'all': literal('all'), 'doctor': Appointment.doctor_id,
+               'specialization': Doctor.specialization}[group_by]
+        patients = select(key.label('key'), Appointment.patient_id.label('patient_id')).distinct()
+        if group_by == 'specialization' or specialization:
+            patients = patients.join(Doctor, Doctor.id == Appointment.doctor_id)
+        if specialization:
+            patients = patients.where(Doctor.specialization == specialization)
+    patients = patients.subquery()
+
+    rows = db.session.execute(
+        select(patients.c.key, band, func.count(), func.avg(User.age))
+        .join(User, User.id == patients.c.patient_id)
+        .group_by(patients.c.key, band)
+    ).all()
+
+    names = {}
+    if group_by == 'doctor':
+        names = {doctor_id: name for doctor_id, name in db.session.execute(select(Doctor.id, Doctor.name))}
+
+    groups = {}
+    for key, band_index, count, average_age in rows:
+        group = groups.setdefault(key, {'key': key, 'name': names.get(key, key), 'counts': [0] * (len(labels) + 1),
+                                        'total': 0, 'age_total': 0.0, 'aged': 0})
+        group['counts'][band_index] += count # -1: the trailing 'unknown' column
+        group['total'] += count
+        if average_age is not None:
+            group['age_total'] += average_age * count
+            group['aged'] += count
+
+    result = []
+    for key in sorted(groups, key=lambda k: (str(groups[k]['name']).lower(), str(k))):
+        group = groups[key]
+        aged = group.pop('aged')
+        age_total = group.pop('age_total')
+        group['average_age'] = round(age_total / aged, 1) if aged else None
+        result.append(group)
+    return {'bands': labels + [UNKNOWN_BAND], 'groups': result}
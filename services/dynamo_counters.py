@@ -0,0 +1,236 @@
+"""
+Aggregate counter items for the DynamoDB dashboards.
+
+The Counters table holds one item per scope, keyed by id:
+
+    global, global#<n>  appointments, pending, approved, rejected,
+                        patients, doctors (GLOBAL_SHARDS items, summed)
+    doctor#<doctor id>  appointments, pending, approved, rejected, records
+    patient#<username>  appointments, pending, approved, rejected
+    day#<doctor id>#<date>
+                        booked (active appointments that day),
+                        minutes (their start minutes, a number set)
+
+DynamoStore writes users, appointments and records in a TransactWriteItems
+call that also ADDs to the affected counters, so an item and its counts
+change together. Dashboards then read a few counter items instead of
+scanning or querying every appointment.
+
+Every write touches the hospital-wide counts, so they are split over
+GLOBAL_SHARDS items and each write adds to a random one. A single item
+would make all concurrent transactions conflict on it; the admin
+dashboard reads the shards with one BatchGetItem and adds them up.
+
+The day items make booking safe across app instances: a booking claims
+its start minute on the doctor's day with a ConditionExpression (minute
+not held, fewer than the daily limit booked) in the same transaction
+that inserts the appointment, so two bookings can never both succeed.
+
+rebuild_counters() recomputes every counter from the tables. Run it once
+after creating the Counters table on existing data, or after bulk loads
+that bypass DynamoStore:
+    python -m services.dynamo_counters
+"""
+import random
+from collections import defaultdict
+from services import dynamo_tables as layout
+from services.schedule import ACTIVE_STATUSES, label_to_minute
+
+GLOBAL = 'global'
+GLOBAL_SHARDS = 10 # Items the hospital-wide counts are spread over
+STATUSES = ('pending', 'approved', 'rejected')
+
+
+def global_key(shard=None):
+    """
+    Key of one shard of the hospital-wide counts, a random one by default.
+    Shard 0 is the original 'global' item, so counts written before the
+    counts were sharded still add up.
+    """
+    if shard is None:
+        shard = random.randrange(GLOBAL_SHARDS)
+    return GLOBAL if shard == 0 else f'{GLOBAL}#{shard}'
+
+
+GLOBAL_KEYS = tuple(global_key(shard) for shard in range(GLOBAL_SHARDS))
+
+
+def doctor_key(doctor_id):
+    return f'doctor#{doctor_id}'
+
+
+def patient_key(username):
+    return f'patient#{username}'
+
+
+def capacity_key(doctor_id, day):
+    return f'day#{doctor_id}#{day}'
+
+
+def slot_minute(item):
+    """
+    Start minute of an appointment item (older items only have the label).
+    """
+    if item.get('start_minute') is not None:
+        return int(item['start_minute'])
+    return label_to_minute(item.get('appointment_time'))
+
+
+def claim_update(item, daily_limit=None):
+    """
+    TransactWriteItems entry holding an appointment's slot on its doctor's
+    day. The transaction is cancelled if the minute is already held or
+    daily_limit appointments are already booked that day.
+    """
+    minute = slot_minute(item)
+    condition = 'NOT contains(#m, :minute)'
+    values = {':one': 1, ':minutes': {minute}, ':minute': minute}
+    if daily_limit is not None:
+        condition = '(attribute_not_exists(#b) OR #b < :limit) AND ' + condition
+        values[':limit'] = daily_limit
+    return {'Update': {
+        'TableName': layout.COUNTERS,
+        'Key': {'id': capacity_key(item['doctor_id'], item['appointment_date'])},
+        'UpdateExpression': 'ADD #b :one, #m :minutes',
+        'ConditionExpression': condition,
+        'ExpressionAttributeNames': {'#b': 'booked', '#m': 'minutes'},
+        'ExpressionAttributeValues': values,
+    }}
+
+
+def release_update(item):
+    """
+    TransactWriteItems entry giving an appointment's slot back.
+    """
+    return {'Update': {
+        'TableName': layout.COUNTERS,
+        'Key': {'id': capacity_key(item['doctor_id'], item['appointment_date'])},
+        'UpdateExpression': 'ADD #b :minus_one DELETE #m :minutes',
+        'ExpressionAttributeNames': {'#b': 'booked', '#m': 'minutes'},
+        'ExpressionAttributeValues': {':minus_one': -1, ':minutes': {slot_minute(item)}},
+    }}
+
+
+def counter_update(key, deltas):
+    """
+    TransactWriteItems entry adding deltas ({attribute: n}) to one counter
+    item. ADD creates the item and attributes as needed.
+    """
+    names = {f'#c{i}': name for i, name in enumerate(deltas)}
+    values = {f':c{i}': delta for i, delta in enumerate(deltas.values())}
+    return {'Update': {
+        'TableName': layout.COUNTERS,
+        'Key': {'id': key},
+        'UpdateExpression': 'ADD ' + ', '.join(f'#c{i} :c{i}' for i in range(len(deltas))),
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values,
+    }}
+
+
+def appointment_counters(item):
+    """
+    {counter key: deltas} for adding an appointment item.
+    """
+    deltas = {'appointments': 1}
+    if item.get('status') in STATUSES:
+        deltas[item['status']] = 1
+    return {
+        global_key(): deltas,
+        doctor_key(item['doctor_id']): deltas,
+        patient_key(item['patient_id']): deltas,
+    }
+
+
+def status_change_counters(item, new_status):
+    """
+    {counter key: deltas} for moving an appointment item to new_status.
+    """
+    deltas = {}
+    if item.get('status') in STATUSES:
+        deltas[item['status']] = -1
+    if new_status in STATUSES:
+        deltas[new_status] = deltas.get(new_status, 0) + 1
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return {}
+    return {
+        global_key(): deltas,
+        doctor_key(item['doctor_id']): deltas,
+        patient_key(item['patient_id']): deltas,
+    }
+
+
+def count(counter, name):
+    """
+    Value of one counter attribute (0 when absent).
+    """
+    return int((counter or {}).get(name, 0))
+
+
+def merge_counters(counters):
+    """
+    Add up counter items (the shards of the global counts) into one
+    {attribute: total}.
+    """
+    total = defaultdict(int)
+    for counter in counters:
+        for name, value in counter.items():
+            if name != 'id':
+                total[name] += int(value)
+    return dict(total)
+
+
+def rebuild_counters(store, segments=1):
+    """
+    Recompute every counter item (including the booked days) from a scan
+    of the tables and overwrite the Counters table. Writes made while it runs may be lost from the
+    counts, so run it while the app is idle.
+    Returns the number of counter items written.
+    """
+    from services.dynamo_store import iter_items, parallel_scan
+
+    counters = defaultdict(lambda: defaultdict(int))
+    for key in GLOBAL_KEYS:
+        counters[key]  # Written even for empty tables; totals go to the first shard
+    held = defaultdict(set)
+
+    for item in parallel_scan(store.users, segments, projection=['role']):
+        if item.get('role') == 'patient':
+            counters[GLOBAL]['patients'] += 1
+    for item in iter_items(store.doctors.scan, projection=['id']):
+        counters[GLOBAL]['doctors'] += 1
+    projection = ['doctor_id', 'patient_id', 'status', 'appointment_date', 'appointment_time', 'start_minute']
+    for item in parallel_scan(store.appointments, segments, projection=projection):
+        for key, deltas in appointment_counters(item).items():
+            key = GLOBAL if key in GLOBAL_KEYS else key
+            for name, delta in deltas.items():
+                counters[key][name] += delta
+        if item.get('status') in ACTIVE_STATUSES:
+            key = capacity_key(item['doctor_id'], item['appointment_date'])
+            counters[key]['booked'] += 1
+            held[key].add(slot_minute(item))
+    for item in parallel_scan(store.records, segments, projection=['doctor_id']):
+        counters[doctor_key(item['doctor_id'])]['records'] += 1
+
+    # Counters of scopes that no longer have any items go back to zero
+    for item in iter_items(store.counters.scan, projection=['id']):
+        counters[item['id']]
+
+    with store.counters.batch_writer() as batch:
+        for key, values in counters.items():
+            item = {'id': key, **values}
+            if held[key]:
+                item['minutes'] = held[key]
+            batch.put_item(Item=item)
+    return len(counters)
+
+
+if __name__ == '__main__':
+    import os
+    from services import aws_clients
+    from services.dynamo_store import DynamoStore
+
+    dynamodb = aws_clients.resource('dynamodb', endpoint_url=os.environ.get('DYNAMODB_ENDPOINT'))
+    written = rebuild_counters(DynamoStore(dynamodb),
+                               segments=int(os.environ.get('DYNAMODB_SCAN_SEGMENTS', 4)))
+    print(f'{written} counter items written')
@@ -0,0 +1,65 @@
+class RelatedLoader:
+    """
+    Request-scoped identity map for the users and doctors referenced by
+    DynamoDB appointments and records (aws_app.py).
+
+    Wrappers register the keys they point to when they are built (want_*);
+    the first lookup then fetches every key registered so far with one
+    BatchGetItem, so a page of N appointments costs one round trip instead
+    of 2N GetItems. Each user/doctor is loaded and wrapped once per request.
+    """
+
+    def __init__(self, store, make_user=dict, make_doctor=dict):
+        self.store = store
+        self.make_user = make_user
+        self.make_doctor = make_doctor
+        self.users = {}
+        self.doctors = {}
+        self.wanted_users = set()
+        self.wanted_doctors = set()
+
+    def want_user(self, username):
+        if username and username not in self.users:
+            self.wanted_users.add(username)
+
+    def want_doctor(self, doctor_id):
+        if doctor_id and doctor_id not in self.doctors:
+            self.wanted_doctors.add(doctor_id)
+
+    def user(self, username):
+        """
+        Return the wrapped user for username, or None if there is none.
+        """
+        if username not in self.users:
+            self.want_user(username)
+            self.load()
+        return self.users.get(username)
+
+    def doctor(self, doctor_id):
+        """
+        Return the wrapped doctor for doctor_id, or None if there is none.
+        """
+        if doctor_id not in self.doctors:
+            self.want_doctor(doctor_id)
+            self.load()
+        return self.doctors.get(doctor_id)
+
+    def load(self):
+        """
+        Fetch every registered key that is not loaded yet.
+        """
+        usernames = self.wanted_users - self.users.keys()
+        doctor_ids = self.wanted_doctors - self.doctors.keys()
+        self.wanted_users.clear()
+        self.wanted_doctors.clear()
+        if not usernames and not doctor_ids:
+            return
+
+        users, doctors = self.store.get_users_and_doctors(usernames, doctor_ids)
+        # Missing keys are remembered as None so they are not fetched again
+        for username in usernames:
+            item = users.get(username)
+            self.users[username] = self.make_user(item) if item else None
+        for doctor_id in doctor_ids:
+            item = doctors.get(doctor_id)
+            self.doctors[doctor_id] = self.make_doctor(item) if item else None
@@ -0,0 +1,174 @@
+"""
+Model objects for DynamoDB items.
+
+They expose the same attributes as the SQLAlchemy models in models.py
+(including the patient/doctor relationships), so the shared templates
+and blueprints work on items from either store. Related users and
+doctors are resolved through the request's RelatedLoader, which batches
+the lookups of a whole page into one BatchGetItem.
+"""
+from datetime import datetime, date
+from decimal import Decimal
+from flask import g, has_app_context
+from flask_login import UserMixin
+from services.dynamo_loader import RelatedLoader
+from services.schedule import label_to_minute
+
+_store = None
+
+
+def bind_store(store):
+    """
+    Set the DynamoStore used to resolve relationships.
+    """
+    global _store
+    _store = store
+
+
+def get_loader():
+    # One identity map per request: related users/doctors are batch-loaded once.
+    # Outside an app context (scripts, tests) each lookup gets its own loader.
+    if not has_app_context():
+        return RelatedLoader(_store, make_user=User, make_doctor=Doctor)
+    if 'related' not in g:
+        g.related = RelatedLoader(_store, make_user=User, make_doctor=Doctor)
+    return g.related
+
+
+def _want_related(patient_id, doctor_id):
+    # Fetched together with the rest of the page on first access
+    if has_app_context():
+        get_loader().want_user(patient_id)
+        get_loader().want_doctor(doctor_id)
+
+
+def _to_int(value, default=None):
+    if value is None or value == '':
+        return default
+    return int(value) if isinstance(value, (int, Decimal)) else int(str(value))
+
+
+def _to_date(value):
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+    except ValueError:
+        return None
+
+
+def _to_datetime(value):
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+class Item:
+    """
+    Base class: keeps the raw item and copies its attributes.
+    """
+
+    def __init__(self, data):
+        self.item = data
+        self.__dict__.update(data)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.id == other.id
+
+    def __hash__(self):
+        return hash((type(self), self.id))
+
+
+class User(UserMixin, Item):
+    def __init__(self, data):
+        super().__init__(data)
+        self.username = data.get('username')
+        self.email = data.get('email')
+        self.role = data.get('role')
+        self.id = data.get('username') # Using username as ID for FKs mostly
+        self.date_of_birth = _to_date(data.get('date_of_birth'))
+        self.created_at = _to_datetime(data.get('created_at'))
+
+    @property
+    def age(self):
+        if not self.date_of_birth:
+            return None
+        today = date.today()
+        return today.year - self.date_of_birth.year - ((today.month, today.day) < (self.date_of_birth.month, self.date_of_birth.day))
+
+    @staticmethod
+    def get(username):
+        return get_loader().user(username)
+
+    def __repr__(self):
+        return f'<User {self.username}>'
+
+
+class Doctor(Item):
+    def __init__(self, data):
+        super().__init__(data)
+        self.id = data.get('id')
+        self.user_id = data.get('user_id')
+        self.name = data.get('name')
+        self.specialization = data.get('specialization')
+        self.available_slots_per_day = _to_int(data.get('available_slots_per_day'), 10)
+        self.day_start_minute = _to_int(data.get('day_start_minute'), 540)
+        self.slot_length_minutes = _to_int(data.get('slot_length_minutes'), 60)
+        self.created_at = _to_datetime(data.get('created_at'))
+
+    @property
+    def user(self):
+        return User.get(self.user_id) if self.user_id else None
+
+    @staticmethod
+    def get(doc_id):
+        return get_loader().doctor(doc_id)
+
+    def __repr__(self):
+        return f'<Doctor {self.name} - {self.specialization}>'
+
+
+class Appointment(Item):
+    def __init__(self, data):
+        super().__init__(data)
+        self.id = data.get('id')
+        self.patient_id = data.get('patient_id')
+        self.doctor_id = data.get('doctor_id')
+        self.status = data.get('status')
+        self.appointment_time = data.get('appointment_time')
+        self.start_minute = _to_int(data.get('start_minute'), label_to_minute(self.appointment_time))
+        self.reason = data.get('reason')
+        self.appointment_date = _to_date(data.get('appointment_date'))
+        self.created_at = _to_datetime(data.get('created_at'))
+        _want_related(self.patient_id, self.doctor_id)
+
+    @property
+    def patient(self):
+        return User.get(self.patient_id)
+
+    @property
+    def doctor(self):
+        return Doctor.get(self.doctor_id)
+
+
+class PatientRecord(Item):
+    def __init__(self, data):
+        super().__init__(data)
+        self.id = data.get('id')
+        self.patient_id = data.get('patient_id')
+        self.doctor_id = data.get('doctor_id')
+        self.diagnosis = data.get('diagnosis')
+        self.prescription = data.get('prescription')
+        self.notes = data.get('notes')
+        self.visit_date = _to_date(data.get('visit_date'))
+        self.created_at = _to_datetime(data.get('created_at'))
+        _want_related(self.patient_id, self.doctor_id)
+
+    @property
+    def patient(self):
+        return User.get(self.patient_id)
+
+    @property
+    def doctor(self):
+        return Doctor.get(self.doctor_id)
@@ -0,0 +1,610 @@
+import itertools
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from services import dynamo_tables as layout
+from services.dynamo_counters import (GLOBAL_KEYS, global_key, counter_update, appointment_counters,
+                                      status_change_counters, merge_counters, doctor_key, claim_update, release_update)
+from services.schedule import ACTIVE_STATUSES
+
+def _key(name):
+    # boto3 is imported on first use (by then the resource has loaded it)
+    from boto3.dynamodb.conditions import Key
+    return Key(name)
+
+
+def _attr(name):
+    from boto3.dynamodb.conditions import Attr
+    return Attr(name)
+
+
+def _condition_failed(error):
+    """
+    True if a ClientError (or a cancelled transaction) was caused by a
+    failed ConditionExpression.
+    """
+    code = error.response['Error']['Code']
+    if code == 'ConditionalCheckFailedException':
+        return True
+    if code == 'TransactionCanceledException':
+        reasons = error.response.get('CancellationReasons', [])
+        return any(reason.get('Code') == 'ConditionalCheckFailed' for reason in reasons)
+    return False
+
+
+def _conflicted(error):
+    """
+    True if a ClientError was caused only by another transaction writing
+    the same items at the same time (worth retrying), not by a condition.
+    """
+    code = error.response['Error']['Code']
+    if code == 'TransactionConflictException':
+        return True
+    if code == 'TransactionCanceledException':
+        reasons = [reason.get('Code') for reason in error.response.get('CancellationReasons', [])]
+        return 'TransactionConflict' in reasons and all(r in (None, 'None', 'TransactionConflict') for r in reasons)
+    return False
+
+
+class TransactionBusy(Exception):
+    """
+    Raised when a write was still cancelled by conflicting transactions
+    after TRANSACT_ATTEMPTS tries; the caller should ask to try again.
+    """
+
+
+def _with_projection(kwargs, attributes):
+    """
+    Add a ProjectionExpression for attributes to query/scan arguments,
+    using placeholder names so reserved words (status, name, ...) work.
+    """
+    if not attributes:
+        return kwargs
+    names = {f'#p{i}': attribute for i, attribute in enumerate(attributes)}
+    kwargs = dict(kwargs)
+    kwargs['ProjectionExpression'] = ', '.join(names)
+    kwargs['ExpressionAttributeNames'] = {**kwargs.get('ExpressionAttributeNames', {}), **names}
+    return kwargs
+
+
+def iter_pages(operation, projection=None, **kwargs):
+    """
+    Yield the items of a query or scan one page (list) at a time,
+    following LastEvaluatedKey until the last page. operation is a bound
+    table method (table.query or table.scan) and kwargs are its arguments;
+    projection is an optional list of attribute names to fetch.
+    Pages are requested lazily, so stopping early reads no further pages.
+    """
+    kwargs = _with_projection(kwargs, projection)
+    while True:
+        response = operation(**kwargs)
+        yield response.get('Items', [])
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return
+        kwargs['ExclusiveStartKey'] = last_key
+
+
+def iter_items(operation, projection=None, **kwargs):
+    """
+    Yield every item of a query or scan, following LastEvaluatedKey until
+    the last page (see iter_pages).
+    """
+    for page in iter_pages(operation, projection, **kwargs):
+        yield from page
+
+
+def count_items(operation, **kwargs):
+    """
+    Count the items matched by a query or scan across all pages
+    (Select='COUNT': only counts travel over the wire).
+    """
+    kwargs = dict(kwargs, Select='COUNT')
+    total = 0
+    while True:
+        response = operation(**kwargs)
+        total += response['Count']
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return total
+        kwargs['ExclusiveStartKey'] = last_key
+
+
+BATCH_GET_LIMIT = 100 # Keys per BatchGetItem request (DynamoDB maximum)
+BATCH_GET_ATTEMPTS = 8 # Tries per chunk while DynamoDB returns UnprocessedKeys
+TRANSACT_ATTEMPTS = 5 # Tries per TransactWriteItems cancelled by a TransactionConflict
+TRANSACT_BACKOFF = 0.025 # Seconds; the wait before try n is random up to TRANSACT_BACKOFF * 2**n
+SCAN_QUEUE_PAGES = 8 # Scanned pages parallel_scan buffers before its segment workers wait
+
+
+def batch_get(dynamodb, keys_by_table):
+    """
+    Fetch many items by primary key with BatchGetItem.
+    keys_by_table maps a table name to a list of key dicts; keys are sent
+    in chunks of BATCH_GET_LIMIT and UnprocessedKeys (throttling, 16 MB
+    response limit) are retried with exponential backoff.
+    Returns {table name: [items]}; missing keys are simply absent.
+    """
+    pending = [(table, key) for table, keys in keys_by_table.items() for key in keys]
+    found = {table: [] for table in keys_by_table}
+
+    for start in range(0, len(pending), BATCH_GET_LIMIT):
+        request = {}
+        for table, key in pending[start:start + BATCH_GET_LIMIT]:
+            request.setdefault(table, {'Keys': []})['Keys'].append(key)
+
+        for attempt in range(BATCH_GET_ATTEMPTS):
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for table, items in response.get('Responses', {}).items():
+                found[table].extend(items)
+            request = response.get('UnprocessedKeys') or {}
+            if not request:
+                break
+            time.sleep(min(0.05 * 2 ** attempt, 2))
+        else:
+            raise RuntimeError(f'BatchGetItem left keys unprocessed after {BATCH_GET_ATTEMPTS} attempts')
+    return found
+
+
+def parallel_scan(table, segments, projection=None, **kwargs):
+    """
+    Yield every item of a table using a parallel scan: the table is split
+    into `segments` segments, each scanned (with its own LastEvaluatedKey
+    chain) on a worker thread. Pages are handed over through a queue of
+    at most SCAN_QUEUE_PAGES pages and yielded in the order they arrive
+    from any segment, so the first items come back after one page and
+    memory stays at a few pages however large the table. Workers wait
+    while the queue is full; stopping early stops them after their
+    current page, and a worker's error is raised here.
+    Meant for admin-wide reports on large tables. Table actions go
+    through the table's low-level client, which is thread-safe.
+    """
+    if segments <= 1:
+        yield from iter_items(table.scan, projection=projection, **kwargs)
+        return
+
+    pages = queue.Queue(maxsize=SCAN_QUEUE_PAGES)
+    stop = threading.Event()
+    finished = object()
+
+    def hand_over(value):
+        # Give up if the caller has stopped reading
+        while not stop.is_set():
+            try:
+                pages.put(value, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def scan_segment(segment):
+        try:
+            for page in iter_pages(table.scan, projection=projection,
+                                   Segment=segment, TotalSegments=segments, **kwargs):
+                if stop.is_set():
+                    return
+                hand_over(page)
+        except Exception as e:
+            hand_over(e)
+        finally:
+            hand_over(finished)
+
+    with ThreadPoolExecutor(max_workers=segments) as pool:
+        for segment in range(segments):
+            pool.submit(scan_segment, segment)
+        try:
+            remaining = segments
+            while remaining:
+                page = pages.get()
+                if page is finished:
+                    remaining -= 1
+                elif isinstance(page, Exception):
+                    raise page
+                else:
+                    yield from page
+        finally:
+            stop.set()
+
+
+def parallel_count(table, segments, **kwargs):
+    """
+    Count the items of a table scan, scanning `segments` segments in parallel.
+    """
+    if segments <= 1:
+        return count_items(table.scan, **kwargs)
+
+    def count_segment(segment):
+        return count_items(table.scan, Segment=segment, TotalSegments=segments, **kwargs)
+
+    with ThreadPoolExecutor(max_workers=segments) as pool:
+        return sum(pool.map(count_segment, range(segments)))
+
+
+def _set_fields(table, key, fields):
+    """
+    Set attributes of an existing item with one UpdateItem.
+    """
+    names = {f'#f{i}': field for i, field in enumerate(fields)}
+    values = {f':v{i}': value for i, value in enumerate(fields.values())}
+    table.update_item(
+        Key=key,
+        UpdateExpression='SET ' + ', '.join(f'#f{i} = :v{i}' for i in range(len(fields))),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values
+    )
+
+
+def _ordered_by_created_at(table, index, hash_key, value, newest_first, start, page_size):
+    # Lazy query of a <hash_key>-created_at index from `start` on
+    condition = _key(hash_key).eq(value)
+    if start is not None:
+        condition = condition & (_key('created_at').lte(start) if newest_first else _key('created_at').gte(start))
+    kwargs = {'IndexName': index, 'KeyConditionExpression': condition, 'ScanIndexForward': not newest_first}
+    if page_size:
+        kwargs['Limit'] = page_size
+    return iter_items(table.query, **kwargs)
+
+
+class DynamoStore:
+    """
+    Data access for the DynamoDB deployment (aws_app.py and the
+    'dynamodb' storage backend).
+    Every per-patient / per-doctor read is a Key query against a table key
+    or a global secondary index (see services/dynamo_tables.py), so its
+    cost grows with the rows returned rather than with the table.
+    All reads follow LastEvaluatedKey, so results are complete however
+    many 1 MB pages they span.
+    Writes of users, appointments and records update the dashboard
+    counter items (services/dynamo_counters.py) in the same transaction.
+    """
+
+    def __init__(self, dynamodb):
+        self.dynamodb = dynamodb
+        self.client = dynamodb.meta.client
+        self.users = dynamodb.Table(layout.USERS)
+        self.doctors = dynamodb.Table(layout.DOCTORS)
+        self.appointments = dynamodb.Table(layout.APPOINTMENTS)
+        self.records = dynamodb.Table(layout.RECORDS)
+        self.counters = dynamodb.Table(layout.COUNTERS)
+
+    def _write(self, operation, counters, extra=()):
+        """
+        Run one Put/Update entry together with the counter updates it
+        implies ({counter key: deltas}) and any extra entries as a single
+        TransactWriteItems.
+        The resource's client converts plain Python values to attribute
+        values, as for table actions.
+        Transactions cancelled only because a concurrent transaction held
+        the same items are retried with jittered exponential backoff
+        (botocore does not retry them); TransactionBusy is raised once
+        TRANSACT_ATTEMPTS tries have conflicted. Failed conditions raise
+        the ClientError straight away.
+        """
+        items = [operation, *extra] + [counter_update(key, deltas) for key, deltas in counters.items()]
+        for attempt in range(TRANSACT_ATTEMPTS):
+            try:
+                self.client.transact_write_items(TransactItems=items)
+                return
+            except self.client.exceptions.ClientError as e:
+                if not _conflicted(e):
+                    raise
+                if attempt == TRANSACT_ATTEMPTS - 1:
+                    raise TransactionBusy() from e
+            time.sleep(random.uniform(0, TRANSACT_BACKOFF * 2 ** attempt))
+
+    # Users and doctors
+
+    def get_user(self, username):
+        return self.users.get_item(Key={'username': username}).get('Item')
+
+    def user_by_email(self, email):
+        response = self.users.query(
+            IndexName=layout.USER_EMAIL_INDEX,
+            KeyConditionExpression=_key('email').eq(email),
+            Limit=1
+        )
+        items = response.get('Items', [])
+        return items[0] if items else None
+
+    def put_user(self, item):
+        """
+        Insert a new user. Returns False if the username is already taken.
+        """
+        put = {'Put': {
+            'TableName': layout.USERS,
+            'Item': item,
+            'ConditionExpression': 'attribute_not_exists(username)',
+        }}
+        try:
+            self._write(put, {global_key(): {'patients': 1}} if item.get('role') == 'patient' else {})
+        except self.client.exceptions.ClientError as e:
+            if _condition_failed(e):
+                return False
+            raise
+        return True
+
+    def update_user(self, username, **fields):
+        """
+        Set attributes of an existing user.
+        """
+        _set_fields(self.users, {'username': username}, fields)
+
+    def users_by_role(self, role, newest_first=True, start=None, page_size=None):
+        """
+        Yield the users with a role ordered by created_at, starting at the
+        created_at `start` (inclusive) when given. Pages of page_size items
+        are read as the caller iterates.
+        """
+        return _ordered_by_created_at(self.users, layout.ROLE_USERS_INDEX, 'role', role,
+                                      newest_first, start, page_size)
+
+    def get_doctor(self, doctor_id):
+        return self.doctors.get_item(Key={'id': doctor_id}).get('Item')
+
+    def put_doctor(self, user_item, doctor_item):
+        """
+        Insert a doctor login and its Doctor item in one transaction.
+        Returns False, writing nothing, if the username is already taken.
+        """
+        put_user = {'Put': {
+            'TableName': layout.USERS,
+            'Item': user_item,
+            'ConditionExpression': 'attribute_not_exists(username)',
+        }}
+        put_doctor = {'Put': {'TableName': layout.DOCTORS, 'Item': doctor_item}}
+        try:
+            self._write(put_user, {global_key(): {'doctors': 1}}, extra=[put_doctor])
+        except self.client.exceptions.ClientError as e:
+            if _condition_failed(e):
+                return False
+            raise
+        return True
+
+    def update_doctor(self, doctor_id, **fields):
+        """
+        Set attributes of an existing doctor.
+        """
+        _set_fields(self.doctors, {'id': doctor_id}, fields)
+
+    def get_users_and_doctors(self, usernames=(), doctor_ids=()):
+        """
+        Fetch several users and doctors in as few BatchGetItem calls as
+        possible. Returns (users by username, doctors by id).
+        """
+        found = batch_get(self.dynamodb, {
+            layout.USERS: [{'username': username} for username in usernames],
+            layout.DOCTORS: [{'id': doctor_id} for doctor_id in doctor_ids],
+        })
+        return ({item['username']: item for item in found[layout.USERS]},
+                {item['id']: item for item in found[layout.DOCTORS]})
+
+    def list_doctors(self, specialization=None):
+        """
+        Return every Doctor item (all pages), optionally of one specialization.
+        """
+        kwargs = {}
+        if specialization is not None:
+            kwargs['FilterExpression'] = _attr('specialization').eq(specialization)
+        return list(iter_items(self.doctors.scan, **kwargs))
+
+    def count_doctors(self):
+        return count_items(self.doctors.scan)
+
+    def count_patients(self, segments=1):
+        """
+        Count users with the patient role (a full scan; admin only).
+        """
+        return parallel_count(self.users, segments, FilterExpression=_attr('role').eq('patient'))
+
+    def doctor_for_user(self, username):
+        """
+        Return the Doctor item linked to a login, or None.
+        """
+        response = self.doctors.query(
+            IndexName=layout.DOCTOR_USER_INDEX,
+            KeyConditionExpression=_key('user_id').eq(username),
+            Limit=1
+        )
+        items = response.get('Items', [])
+        return items[0] if items else None
+
+    # Appointments
+
+    def get_appointment(self, appointment_id):
+        return self.appointments.get_item(Key={'id': appointment_id}).get('Item')
+
+    def scan_appointments(self, projection=None, segments=1):
+        """
+        Yield every appointment (a full scan; admin reports only), fetching
+        only the attributes in projection when given.
+        """
+        return parallel_scan(self.appointments, segments, projection=projection)
+
+    def put_appointment(self, item):
+        self._write({'Put': {'TableName': layout.APPOINTMENTS, 'Item': item}},
+                    appointment_counters(item))
+
+    def book_appointment(self, item, daily_limit):
+        """
+        Insert an active (pending/approved) appointment and hold its slot
+        in one transaction: the doctor's day item must not hold the start
+        minute yet and must have fewer than daily_limit bookings.
+        Returns False, writing nothing, if the slot or the day is taken.
+        Raises TransactionBusy if other bookings kept conflicting with it.
+        """
+        put = {'Put': {
+            'TableName': layout.APPOINTMENTS,
+            'Item': item,
+            'ConditionExpression': 'attribute_not_exists(id)',
+        }}
+        try:
+            self._write(put, appointment_counters(item), extra=[claim_update(item, daily_limit)])
+        except self.client.exceptions.ClientError as e:
+            if _condition_failed(e):
+                return False
+            raise
+        return True
+
+    def set_appointment_status(self, item, status, daily_limit=None):
+        """
+        Move an appointment to status if it still has the status it had
+        when item was read. Leaving the active statuses gives the slot
+        back; re-entering them claims it again (up to daily_limit).
+        Returns False if the appointment was changed in between or its
+        slot is no longer free.
+        """
+        was_active = item['status'] in ACTIVE_STATUSES
+        if was_active and status not in ACTIVE_STATUSES:
+            extra = [release_update(item)]
+        elif not was_active and status in ACTIVE_STATUSES:
+            extra = [claim_update(item, daily_limit)]
+        else:
+            extra = []
+        update = {'Update': {
+            'TableName': layout.APPOINTMENTS,
+            'Key': {'id': item['id']},
+            'UpdateExpression': 'SET #s = :new',
+            'ConditionExpression': '#s = :old',
+            'ExpressionAttributeNames': {'#s': 'status'},
+            'ExpressionAttributeValues': {':new': status, ':old': item['status']},
+        }}
+        try:
+            self._write(update, status_change_counters(item, status), extra)
+        except self.client.exceptions.ClientError as e:
+            if _condition_failed(e):
+                return False
+            raise
+        return True
+
+    def appointments_by_status(self, status, newest_first=True, start=None, page_size=None):
+        """
+        Yield the appointments with a status ordered by created_at,
+        starting at the created_at `start` (inclusive) when given. Pages of
+        page_size items are read as the caller iterates.
+        """
+        return _ordered_by_created_at(self.appointments, layout.STATUS_APPOINTMENTS_INDEX, 'status', status,
+                                      newest_first, start, page_size)
+
+    def recent_by_status(self, status, limit):
+        """
+        Return the `limit` most recently created appointments with a status.
+        """
+        response = self.appointments.query(
+            IndexName=layout.STATUS_APPOINTMENTS_INDEX,
+            KeyConditionExpression=_key('status').eq(status),
+            ScanIndexForward=False,
+            Limit=limit
+        )
+        return response.get('Items', [])
+
+    def appointments_for_patient(self, patient_id, newest_first=True, limit=None, projection=None):
+        """
+        Return a patient's appointments ordered by created_at, at most
+        `limit` of them, fetching only the attributes in projection when given.
+        """
+        items = iter_items(
+            self.appointments.query,
+            projection=projection,
+            IndexName=layout.PATIENT_APPOINTMENTS_INDEX,
+            KeyConditionExpression=_key('patient_id').eq(patient_id),
+            ScanIndexForward=not newest_first
+        )
+        return list(itertools.islice(items, limit))
+
+    def appointments_for_doctor(self, doctor_id, day=None, status=None, newest_first=True, limit=None,
+                                projection=None):
+        """
+        Return a doctor's appointments ordered by appointment_date,
+        optionally limited to one day (YYYY-MM-DD) and one status, at most
+        `limit` of them.
+        """
+        condition = _key('doctor_id').eq(doctor_id)
+        if day is not None:
+            condition = condition & _key('appointment_date').eq(day)
+        kwargs = {
+            'IndexName': layout.DOCTOR_APPOINTMENTS_INDEX,
+            'KeyConditionExpression': condition,
+            'ScanIndexForward': not newest_first,
+        }
+        if status is not None:
+            kwargs['FilterExpression'] = _attr('status').eq(status)
+        return list(itertools.islice(iter_items(self.appointments.query, projection=projection, **kwargs), limit))
+
+    def appointments_between(self, doctor_id, start, end, projection=None):
+        """
+        Return a doctor's appointments dated within [start, end]
+        (YYYY-MM-DD, inclusive).
+        """
+        return list(iter_items(
+            self.appointments.query,
+            projection=projection,
+            IndexName=layout.DOCTOR_APPOINTMENTS_INDEX,
+            KeyConditionExpression=_key('doctor_id').eq(doctor_id) & _key('appointment_date').between(start, end)
+        ))
+
+    def count_appointments(self, doctor_id, day, status='approved'):
+        """
+        Count a doctor's appointments on one day with the given status.
+        Reads only that doctor's appointments of that day.
+        """
+        return count_items(
+            self.appointments.query,
+            IndexName=layout.DOCTOR_APPOINTMENTS_INDEX,
+            KeyConditionExpression=_key('doctor_id').eq(doctor_id) & _key('appointment_date').eq(day),
+            FilterExpression=_attr('status').eq(status)
+        )
+
+    # Patient records
+
+    def put_record(self, item):
+        self._write({'Put': {'TableName': layout.RECORDS, 'Item': item}},
+                    {doctor_key(item['doctor_id']): {'records': 1}})
+
+    def records_for_doctor(self, doctor_id, newest_first=True):
+        """
+        Return the medical records written by a doctor ordered by visit_date.
+        """
+        return list(iter_items(
+            self.records.query,
+            IndexName=layout.DOCTOR_RECORDS_INDEX,
+            KeyConditionExpression=_key('doctor_id').eq(doctor_id),
+            ScanIndexForward=not newest_first
+        ))
+
+    def count_records_for_doctor(self, doctor_id):
+        return count_items(
+            self.records.query,
+            IndexName=layout.DOCTOR_RECORDS_INDEX,
+            KeyConditionExpression=_key('doctor_id').eq(doctor_id)
+        )
+
+    def records_for_patient(self, patient_id, newest_first=True):
+        """
+        Return a patient's medical records ordered by visit_date.
+        """
+        return list(iter_items(
+            self.records.query,
+            IndexName=layout.PATIENT_RECORDS_INDEX,
+            KeyConditionExpression=_key('patient_id').eq(patient_id),
+            ScanIndexForward=not newest_first
+        ))
+
+    # Dashboard counters
+
+    def get_counters(self, *keys):
+        """
+        Return {counter key: counter item} for the given keys; counters
+        that were never written come back as empty dicts.
+        """
+        found = batch_get(self.dynamodb, {layout.COUNTERS: [{'id': key} for key in keys]})
+        counters = {key: {} for key in keys}
+        counters.update((item['id'], item) for item in found[layout.COUNTERS])
+        return counters
+
+    def global_counter(self):
+        """
+        The hospital-wide counts: the GLOBAL_KEYS shards read in one batch
+        and added up, as {attribute: total}.
+        """
+        return merge_counters(self.get_counters(*GLOBAL_KEYS).values())
@@ -0,0 +1,146 @@
+"""
+Table layout for the DynamoDB deployment (aws_app.py and the 'dynamodb'
+storage backend).
+
+Every access pattern of the patient and doctor views is served by a key
+or a global secondary index, so no request has to scan a whole table:
+
+    Users           username                     login, profile
+      email-index         email                  unique email check
+      role-created_at-index                      admin patient list, newest first
+    Doctors         id                           booking, admin
+      user_id-index       user_id                doctor profile of a login
+    Appointments    id                           approve / reject
+      patient_id-created_at-index                patient dashboard and list
+      doctor_id-appointment_date-index           doctor views, capacity check
+      status-created_at-index                    admin appointment list, latest pending
+    PatientRecords  id
+      patient_id-visit_date-index                patient history
+      doctor_id-visit_date-index                 records written by a doctor
+    Counters        id                           dashboard counts (services/dynamo_counters.py)
+"""
+
+USERS = 'Users'
+DOCTORS = 'Doctors'
+APPOINTMENTS = 'Appointments'
+RECORDS = 'PatientRecords'
+COUNTERS = 'Counters'
+
+USER_EMAIL_INDEX = 'email-index'
+ROLE_USERS_INDEX = 'role-created_at-index'
+DOCTOR_USER_INDEX = 'user_id-index'
+PATIENT_APPOINTMENTS_INDEX = 'patient_id-created_at-index'
+DOCTOR_APPOINTMENTS_INDEX = 'doctor_id-appointment_date-index'
+STATUS_APPOINTMENTS_INDEX = 'status-created_at-index'
+PATIENT_RECORDS_INDEX = 'patient_id-visit_date-index'
+DOCTOR_RECORDS_INDEX = 'doctor_id-visit_date-index'
+
+
+def _index(name, hash_key, range_key=None):
+    key_schema = [{'AttributeName': hash_key, 'KeyType': 'HASH'}]
+    if range_key:
+        key_schema.append({'AttributeName': range_key, 'KeyType': 'RANGE'})
+    return {
+        'IndexName': name,
+        'KeySchema': key_schema,
+        'Projection': {'ProjectionType': 'ALL'},
+    }
+
+
+# create_table arguments per table; all keys are strings
+TABLES = {
+    USERS: {
+        'KeySchema': [{'AttributeName': 'username', 'KeyType': 'HASH'}],
+        'GlobalSecondaryIndexes': [
+            _index(USER_EMAIL_INDEX, 'email'),
+            _index(ROLE_USERS_INDEX, 'role', 'created_at'),
+        ],
+    },
+    DOCTORS: {
+        'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}],
+        'GlobalSecondaryIndexes': [
+            _index(DOCTOR_USER_INDEX, 'user_id'),
+        ],
+    },
+    APPOINTMENTS: {
+        'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}],
+        'GlobalSecondaryIndexes': [
+            _index(PATIENT_APPOINTMENTS_INDEX, 'patient_id', 'created_at'),
+            _index(DOCTOR_APPOINTMENTS_INDEX, 'doctor_id', 'appointment_date'),
+            _index(STATUS_APPOINTMENTS_INDEX, 'status', 'created_at'),
+        ],
+    },
+    RECORDS: {
+        'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}],
+        'GlobalSecondaryIndexes': [
+            _index(PATIENT_RECORDS_INDEX, 'patient_id', 'visit_date'),
+            _index(DOCTOR_RECORDS_INDEX, 'doctor_id', 'visit_date'),
+        ],
+    },
+    COUNTERS: {
+        'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}],
+        'GlobalSecondaryIndexes': [],
+    },
+}
+
+
+def _attribute_definitions(layout):
+    names = [key['AttributeName'] for key in layout['KeySchema']]
+    for index in layout['GlobalSecondaryIndexes']:
+        names.extend(key['AttributeName'] for key in index['KeySchema'])
+    return [{'AttributeName': name, 'AttributeType': 'S'} for name in dict.fromkeys(names)]
+
+
+def create_tables(dynamodb):
+    """
+    Create missing tables and add missing global secondary indexes to
+    existing ones. Safe to re-run.
+    DynamoDB accepts one index creation per update_table call and builds
+    it in the background; re-run until nothing is reported.
+    Returns a list of the changes made.
+    """
+    client = dynamodb.meta.client
+    existing = set(client.list_tables()['TableNames'])
+    changes = []
+
+    for name, layout in TABLES.items():
+        definitions = _attribute_definitions(layout)
+        if name not in existing:
+            kwargs = {
+                'TableName': name,
+                'KeySchema': layout['KeySchema'],
+                'AttributeDefinitions': definitions,
+                'BillingMode': 'PAY_PER_REQUEST',
+            }
+            if layout['GlobalSecondaryIndexes']:
+                kwargs['GlobalSecondaryIndexes'] = layout['GlobalSecondaryIndexes']
+            dynamodb.create_table(**kwargs)
+            changes.append(f'created table {name}')
+            continue
+
+        described = client.describe_table(TableName=name)['Table']
+        present = {index['IndexName'] for index in described.get('GlobalSecondaryIndexes', [])}
+        for index in layout['GlobalSecondaryIndexes']:
+            if index['IndexName'] in present:
+                continue
+            client.update_table(
+                TableName=name,
+                AttributeDefinitions=definitions,
+                GlobalSecondaryIndexUpdates=[{'Create': index}],
+            )
+            changes.append(f'creating index {name}.{index["IndexName"]}')
+            break
+
+    for name in TABLES:
+        if f'created table {name}' in changes:
+            client.get_waiter('table_exists').wait(TableName=name)
+    return changes
+
+
+if __name__ == '__main__':
+    import os
+    from services import aws_clients
+
+    dynamodb = aws_clients.resource('dynamodb', endpoint_url=os.environ.get('DYNAMODB_ENDPOINT'))
+    for change in create_tables(dynamodb) or ['tables and indexes are up to date']:
+        print(change)
@@ -0,0 +1,151 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from models import db, User, Doctor, Appointment, PatientRecord
+
+STATUSES = ('pending', 'approved', 'rejected')
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+# Bytes of CSV/NDJSON collected before a chunk is sent
+CHUNK_SIZE = 64 * 1024
+
+_patient = aliased(User)
+
+
+def _appointments():
+    columns = [
+        Appointment.id, Appointment.appointment_date, Appointment.appointment_time, Appointment.status,
+        Appointment.doctor_id, Doctor.name.label('doctor_name'), Doctor.specialization,
+        Appointment.patient_id, _patient.username.label('patient_username'), Appointment.reason,
+        Appointment.created_at,
+    ]
+    statement = select(*columns)\
+        .join(Doctor, Doctor.id == Appointment.doctor_id)\
+        .join(_patient, _patient.id == Appointment.patient_id)
+    return statement, Appointment, Appointment.appointment_date
+
+
+def _records():
+    columns = [
+        PatientRecord.id, PatientRecord.visit_date, PatientRecord.doctor_id, Doctor.name.label('doctor_name'),
+        PatientRecord.patient_id, _patient.username.label('patient_username'), PatientRecord.diagnosis,
+        PatientRecord.prescription, PatientRecord.notes, PatientRecord.created_at,
+    ]
+    statement = select(*columns)\
+        .join(Doctor, Doctor.id == PatientRecord.doctor_id)\
+        .join(_patient, _patient.id == PatientRecord.patient_id)
+    return statement, PatientRecord, PatientRecord.visit_date
+
+
+# Export name -> builder of (statement, model, date column)
+EXPORTS = {'appointments': _appointments, 'records': _records}
+
+
+def parse_export_filters(args):
+    """
+    Read the ?from=, ?to= (YYYY-MM-DD), ?doctor= and ?status= export filters.
+    Raises ValueError for malformed values.
+    """
+    def day(name):
+        return datetime.strptime(args[name], '%Y-%m-%d').date() if args.get(name) else None
+
+    status = args.get('status') or None
+    if status and status not in STATUSES:
+        raise ValueError(f"status must be one of: {', '.join(STATUSES)}")
+    return {'date_from': day('from'), 'date_to': day('to'),
+            'doctor_id': int(args['doctor']) if args.get('doctor') else None, 'status': status}
+
+
+def export_query(kind, date_from=None, date_to=None, doctor_id=None, status=None):
+    """
+    SELECT for an export, in (date, id) order so the date and doctor
+    indexes deliver rows already sorted and the first row comes out
+    without a sort of the whole table. `status` applies to appointments.
+    """
+    statement, model, day = EXPORTS[kind]()
+    if date_from:
+        statement = statement.where(day >= date_from)
+    if date_to:
+        statement = statement.where(day <= date_to)
+    if doctor_id is not None:
+        statement = statement.where(model.doctor_id == doctor_id)
+    if status and kind == 'appointments':
+        statement = statement.where(Appointment.status == status)
+    return statement.order_by(day, model.id)
+
+
+def _stream(statement):
+    """
+    Execute `statement` and yield its rows a batch at a time
+    (EXPORT_BATCH_SIZE), so memory stays flat however many rows match.
+    """
+    batch = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    result = db.session.execute(statement.execution_options(yield_per=batch))
+    try:
+        yield result.keys()
+        for partition in result.partitions():
+            yield from partition
+    finally:
+        result.close()
+
+
+def _value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def csv_chunks(rows):
+    """
+    CSV text of `rows` (header first) in chunks of about CHUNK_SIZE.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(next(rows))
+    for row in rows:
+        writer.writerow([_value(value) for value in row])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_chunks(rows):
+    """
+    One JSON object per line for each of `rows`, in chunks of about CHUNK_SIZE.
+    """
+    keys = list(next(rows))
+    lines, size = [], 0
+    for row in rows:
+        line = json.dumps(dict(zip(keys, map(_value, row))), separators=(',', ':')) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield ''.join(lines)
+            lines, size = [], 0
+    yield ''.join(lines)
+
+
+def gzip_chunks(chunks):
+    """
+    Gzip a stream of text chunks as they are produced.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # wbits 31: gzip header and trailer
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_chunks(kind, fmt, gzip=False, **filters):
+    """
+    Generator of the response body for an export: CSV or NDJSON text
+    (bytes when gzip is set), produced while the rows are read.
+    """
+    rows = _stream(export_query(kind, **filters))
+    chunks = csv_chunks(rows) if fmt == 'csv' else ndjson_chunks(rows)
+    return gzip_chunks(chunks) if gzip else chunks
@@ -0,0 +1,115 @@
+import threading
+from flask import current_app, session
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from models import db, User, Doctor
+from services.cache import TTLCache
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Return the process-wide identity cache, sized from the app config.
+    Entries are keyed by user id and hold column snapshots of the User and,
+    for doctors, their Doctor profile.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TTLCache(
+                    maxsize=current_app.config.get('IDENTITY_CACHE_SIZE', 4096),
+                    ttl=current_app.config.get('IDENTITY_CACHE_TTL', 30),
+                )
+    return _cache
+
+
+def _snapshot(obj):
+    return {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
+
+
+def _attach(model, snapshot):
+    """
+    Rebuild an instance from a column snapshot and attach it to the current
+    session without a SELECT (merge with load=False).
+    """
+    obj = model(**snapshot)
+    make_transient_to_detached(obj)
+    return db.session.merge(obj, load=False)
+
+
+def _load(user_id):
+    entry = get_cache().get(user_id)
+    if entry is not None:
+        return entry
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    doctor = None
+    if user.role == 'doctor':
+        # The doctor id saved in the session at login turns this into a primary key lookup
+        doctor_id = session.get('doctor_id')
+        doctor = db.session.get(Doctor, doctor_id) if doctor_id else None
+        if doctor is None or doctor.user_id != user.id:
+            doctor = Doctor.query.filter_by(user_id=user.id).first()
+    entry = {
+        'user': _snapshot(user),
+        'doctor': _snapshot(doctor) if doctor else None
+    }
+    get_cache().set(user_id, entry)
+    return entry
+
+
+def load_identity(user_id):
+    """
+    Flask-Login user_loader backend: return the User for user_id, served
+    from the identity cache in the steady state (no query).
+    """
+    entry = _load(user_id)
+    if entry is None:
+        return None
+    return _attach(User, entry['user'])
+
+
+def get_current_doctor(user):
+    """
+    Return the Doctor profile of a logged-in doctor user, or None.
+    Served from the identity cache instead of querying doctors by user_id
+    on every view.
+    """
+    entry = _load(user.id)
+    if entry is None or entry['doctor'] is None:
+        return None
+    return _attach(Doctor, entry['doctor'])
+
+
+def remember_identity(user):
+    """
+    Store the user's role (and doctor id for doctors) in the session at login.
+    """
+    session['role'] = user.role
+    doctor = Doctor.query.filter_by(user_id=user.id).first() if user.role == 'doctor' else None
+    if doctor:
+        session['doctor_id'] = doctor.id
+    else:
+        session.pop('doctor_id', None)
+
+
+def forget_identity():
+    """
+    Remove the identity keys added by remember_identity (at logout).
+    """
+    session.pop('role', None)
+    session.pop('doctor_id', None)
+
+
+def invalidate_identity(user_id):
+    """
+    Drop a user's cached identity after their User or Doctor row changed.
+    Call only after the change has been committed.
+    """
+    if user_id is not None:
+        get_cache().pop(int(user_id))
@@ -0,0 +1,260 @@
+"""
+Outbound notification pipeline for the DynamoDB deployment (aws_app.py).
+
+Views call NotificationQueue.send(), which only appends to an in-process
+queue. A background thread drains the queue, groups messages into
+batches of up to 10 and hands them to a publisher: SNSPublisher
+(PublishBatch against the SNS topic) in production, InMemoryPublisher
+in benchmarks and tests. Request latency therefore never includes SNS.
+"""
+import collections
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SNS_BATCH_LIMIT = 10 # Entries per PublishBatch call (SNS maximum)
+
+
+class SNSPublisher:
+    """
+    Publishes batches of (subject, message) pairs to one SNS topic.
+    client is an SNS client, or a function returning one that is called at
+    the first publish (so creating the publisher creates no client).
+    """
+
+    def __init__(self, client, topic_arn):
+        self._client = client
+        self.topic_arn = topic_arn
+
+    @property
+    def client(self):
+        if callable(self._client):
+            self._client = self._client()
+        return self._client
+
+    def publish(self, batch):
+        """
+        Publish up to SNS_BATCH_LIMIT (subject, message) pairs with one
+        PublishBatch call. Returns the indexes of the entries that failed;
+        raises ClientError when the whole call fails (e.g. throttling).
+        """
+        response = self.client.publish_batch(
+            TopicArn=self.topic_arn,
+            PublishBatchRequestEntries=[
+                # SNS subjects are limited to 100 characters
+                {'Id': str(i), 'Subject': subject[:100], 'Message': message}
+                for i, (subject, message) in enumerate(batch)
+            ]
+        )
+        return [int(entry['Id']) for entry in response.get('Failed', [])]
+
+
+class InMemoryPublisher:
+    """
+    Publisher stand-in that keeps messages in a list.
+    `delay` simulates the round trip of one call; the first `fail_calls`
+    calls raise ClientError (or `error`, e.g. a BotoCoreError) to exercise
+    the retry path.
+    """
+
+    def __init__(self, delay=0.0, fail_calls=0, error=None):
+        self.delay = delay
+        self.fail_calls = fail_calls
+        self.error = error
+        self.calls = 0
+        self.messages = []
+
+    def publish(self, batch):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.calls <= self.fail_calls:
+            if self.error is not None:
+                raise self.error
+            from botocore.exceptions import ClientError
+            raise ClientError({'Error': {'Code': 'Throttling', 'Message': 'Rate exceeded'}}, 'PublishBatch')
+        self.messages.extend(batch)
+        return []
+
+
+class NotificationQueue:
+    """
+    Bounded in-process queue drained by one background worker thread.
+
+    The worker waits up to `linger` seconds for a batch to fill, publishes
+    it, and retries failed entries with exponential backoff (`backoff`,
+    doubling per attempt) up to `max_attempts` times before dropping them.
+    When `max_queue` messages are already waiting, send() drops the new
+    message instead of blocking the request.
+    """
+
+    def __init__(self, publisher, max_queue=10000, batch_size=SNS_BATCH_LIMIT,
+                 linger=0.05, max_attempts=5, backoff=0.2):
+        self.publisher = publisher
+        self.max_queue = max_queue
+        self.batch_size = min(batch_size, SNS_BATCH_LIMIT)
+        self.linger = linger
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._busy = False
+        self._stopping = False
+        self._stats = self._empty_stats()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    @staticmethod
+    def _empty_stats():
+        return {'sent': 0, 'failed': 0, 'dropped': 0, 'retries': 0, 'batches': 0,
+                'latency_total': 0.0, 'latency_max': 0.0}
+
+    def _after_fork(self):
+        # The parent keeps delivering (and counting) what it queued; the child starts empty
+        self._cond = threading.Condition()
+        self._queue.clear()
+        self._thread = None
+        self._busy = False
+        self._stats = self._empty_stats()
+
+    def send(self, subject, message):
+        """
+        Queue a notification. Returns False if the queue was full and the
+        message was dropped.
+        """
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                self._stats['dropped'] += 1
+                return False
+            self._queue.append((subject, message, time.monotonic()))
+            self._ensure_worker()
+            self._cond.notify_all()
+        return True
+
+    def _ensure_worker(self):
+        # Started lazily, so importing the app (or forking workers) starts no threads
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='notifications', daemon=True)
+            self._thread.start()
+
+    def _next_batch(self):
+        """
+        Wait for messages and return up to batch_size of them, or None
+        when stopping with an empty queue.
+        """
+        with self._cond:
+            while not self._queue:
+                if self._stopping:
+                    return None
+                self._cond.wait()
+            deadline = time.monotonic() + self.linger
+            while len(self._queue) < self.batch_size and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            count = min(self.batch_size, len(self._queue))
+            self._busy = True
+            return [self._queue.popleft() for _ in range(count)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._publish(batch)
+            except Exception:
+                logger.exception('Notification worker error')
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _publish(self, batch):
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        pending = batch
+        for attempt in range(self.max_attempts):
+            try:
+                failed = self.publisher.publish([(subject, message) for subject, message, _ in pending])
+            except (ClientError, BotoCoreError) as e:
+                # ClientError: SNS refused the call (e.g. throttling);
+                # BotoCoreError: it never got there (timeouts, connection errors)
+                logger.warning('Notification batch failed: %s', e)
+                failed = list(range(len(pending)))
+
+            now = time.monotonic()
+            failed_set = set(failed)
+            delivered = [entry for i, entry in enumerate(pending) if i not in failed_set]
+            with self._cond:
+                self._stats['batches'] += 1
+                self._stats['sent'] += len(delivered)
+                for _, _, queued_at in delivered:
+                    latency = now - queued_at
+                    self._stats['latency_total'] += latency
+                    self._stats['latency_max'] = max(self._stats['latency_max'], latency)
+
+            pending = [pending[i] for i in failed]
+            if not pending:
+                return
+            if attempt + 1 < self.max_attempts:
+                with self._cond:
+                    self._stats['retries'] += len(pending)
+                time.sleep(self.backoff * 2 ** attempt)
+
+        with self._cond:
+            self._stats['failed'] += len(pending)
+        logger.error('Dropped %d notifications after %d attempts: %s', len(pending), self.max_attempts,
+                     ', '.join(subject for subject, _, _ in pending))
+
+    def flush(self, timeout=None):
+        """
+        Wait until every queued message has been handled.
+        Returns False if the timeout expired first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stop(self, timeout=5):
+        """
+        Deliver what is queued (up to timeout seconds) and stop the worker.
+        """
+        self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def metrics(self):
+        """
+        Return queue depth, the age of the oldest queued message and
+        delivery counters/latencies (enqueue to publish, in seconds).
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            depth = len(self._queue)
+            oldest = time.monotonic() - self._queue[0][2] if self._queue else 0.0
+        sent = stats.pop('sent')
+        total = stats.pop('latency_total')
+        latency_max = stats.pop('latency_max')
+        return {
+            'queue_depth': depth,
+            'oldest_age_seconds': round(oldest, 3),
+            'sent': sent,
+            **stats,
+            'latency_avg_seconds': round(total / sent, 3) if sent else 0.0,
+            'latency_max_seconds': round(latency_max, 3),
+        }
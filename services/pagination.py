@@ -0,0 +1,214 @@
+import base64
+import threading
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import tuple_
+from services.cache import TTLCache
+
+# Cached COUNT(*) results, keyed by a listing and its filters
+_count_cache = None
+_count_cache_lock = threading.Lock()
+
+
+def get_count_cache():
+    """
+    Return the process-wide cache of listing totals, sized from the app config.
+    """
+    global _count_cache
+    if _count_cache is None:
+        with _count_cache_lock:
+            if _count_cache is None:
+                _count_cache = TTLCache(
+                    maxsize=current_app.config.get('PAGINATION_COUNT_CACHE_SIZE', 256),
+                    ttl=current_app.config.get('PAGINATION_COUNT_TTL', 30),
+                )
+    return _count_cache
+
+
+def encode_cursor(created_at, row_id):
+    """
+    Encode a (created_at, id) keyset position as an opaque URL-safe token.
+    """
+    raw = f'{created_at.isoformat()}|{row_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a token produced by encode_cursor.
+    Returns None for missing or malformed cursors, which means "first page".
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def encode_name_cursor(name, row_id):
+    """
+    Encode a (name, id) keyset position, for listings sorted by name.
+    """
+    raw = f'{row_id}|{name}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_name_cursor(cursor):
+    """
+    Decode a token produced by encode_name_cursor into (name, id string).
+    Returns None for missing or malformed cursors.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        row_id, name = raw.split('|', 1)
+        return name, row_id
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def encode_created_cursor(created_at, row_id):
+    """
+    Encode a (created_at, id) keyset position with both kept as strings,
+    for DynamoDB listings (ISO timestamps, non-numeric ids).
+    """
+    raw = f'{created_at}|{row_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_created_cursor(cursor):
+    """
+    Decode a token produced by encode_created_cursor into (created_at, id).
+    Returns None for missing or malformed cursors.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split('|', 1)
+        return created_at, row_id
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def encode_rank_cursor(window, score, row_id):
+    """
+    Encode a position in ranked search results: the id cutoff of the
+    ranked window, the relevance score (None when ordered by id) and the id.
+    """
+    raw = f'{window}|{score!r}|{row_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_rank_cursor(cursor):
+    """
+    Decode a token produced by encode_rank_cursor into (window, score, id).
+    Returns None for missing or malformed cursors.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        window, score, row_id = raw.split('|')
+        return int(window), None if score == 'None' else float(score), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def cached_count(key, query):
+    """
+    Return query.count(), cached in-process for PAGINATION_COUNT_TTL seconds.
+    Totals are only informational, so a slightly stale value is fine and
+    spares a full COUNT on every page view.
+    """
+    cache = get_count_cache()
+    value = cache.get(key)
+    if value is None:
+        value = query.count()
+        cache.set(key, value)
+    return value
+
+
+def get_page_size(requested=None):
+    """
+    Resolve the page size from the request, falling back to PAGE_SIZE
+    and clamped to PAGE_SIZE_MAX.
+    """
+    default = current_app.config.get('PAGE_SIZE', 50)
+    maximum = current_app.config.get('PAGE_SIZE_MAX', 200)
+    try:
+        size = int(requested) if requested else default
+    except ValueError:
+        size = default
+    return max(1, min(size, maximum))
+
+
+class KeysetPage:
+    """
+    One page of rows ordered newest first by (created_at, id).
+    `total` is computed on first access only, so pages that don't
+    display it never pay for the COUNT.
+    """
+
+    def __init__(self, items, next_cursor, prev_cursor, count_key, count_query):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self._count_key = count_key
+        self._count_query = count_query
+        self._total = None
+
+    @property
+    def total(self):
+        if self._total is None:
+            self._total = cached_count(self._count_key, self._count_query)
+        return self._total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def paginate_keyset(query, model, count_query, count_key, after=None, before=None, per_page=None):
+    """
+    Paginate `query` newest first using a keyset on (model.created_at, model.id).
+    `count_query` is the same filter without eager-load options, used for
+    the (cached) total.
+
+    `after` fetches the page following a cursor (older rows), `before` the
+    page preceding it (newer rows). Each page is one indexed range scan of
+    per_page + 1 rows, so the cost does not grow with the page number the
+    way OFFSET does.
+    """
+    per_page = get_page_size(per_page)
+    key = tuple_(model.created_at, model.id)
+    after = decode_cursor(after)
+    before = decode_cursor(before) if not after else None
+
+    if before:
+        # Walk backwards (ascending) from the cursor, then flip into display order
+        rows = query.filter(key > before)\
+            .order_by(model.created_at.asc(), model.id.asc()).limit(per_page + 1).all()
+        has_more_newer = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_more_older = True
+    else:
+        if after:
+            query = query.filter(key < after)
+        rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(per_page + 1).all()
+        has_more_older = len(rows) > per_page
+        items = rows[:per_page]
+        has_more_newer = after is not None
+
+    next_cursor = encode_cursor(items[-1].created_at, items[-1].id) if items and has_more_older else None
+    prev_cursor = encode_cursor(items[0].created_at, items[0].id) if items and has_more_newer else None
+
+    return KeysetPage(items, next_cursor, prev_cursor, count_key, count_query)
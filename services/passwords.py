@@ -0,0 +1,110 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as ResultTimeout
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashPoolBusy(Exception):
+    """
+    Raised when too many password verifications are already waiting for
+    the hashing pool.
+    """
+
+
+_pool = None
+_pending = None
+_pool_lock = threading.Lock()
+_policy_prefixes = {}
+
+
+def _reset_pool():
+    # A forked worker must not inherit the parent's executor threads
+    global _pool, _pending
+    _pool = None
+    _pending = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pool)
+
+
+def _get_pool():
+    """
+    Return the process-wide hashing pool, sized from the app config.
+    """
+    global _pool, _pending
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = current_app.config.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 1
+                queue = current_app.config.get('PASSWORD_HASH_QUEUE', 64)
+                _pending = threading.BoundedSemaphore(workers + queue)
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+    return _pool
+
+
+def _policy():
+    return (current_app.config.get('PASSWORD_HASH_METHOD', 'scrypt'),
+            current_app.config.get('PASSWORD_SALT_LENGTH', 16))
+
+
+def hash_password(password):
+    """
+    Hash a password with the configured method and salt length.
+    """
+    method, salt_length = _policy()
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+def _policy_prefix(method):
+    """
+    Return the parameter string werkzeug writes for a method, with its
+    defaults filled in (e.g. 'scrypt' -> 'scrypt:32768:8:1').
+    """
+    prefix = _policy_prefixes.get(method)
+    if prefix is None:
+        prefix = generate_password_hash('', method=method, salt_length=1).split('$', 1)[0]
+        _policy_prefixes[method] = prefix
+    return prefix
+
+
+def needs_rehash(pwhash):
+    """
+    True if a stored hash was made with other parameters than the current
+    policy (method, cost or salt length).
+    """
+    method, salt_length = _policy()
+    try:
+        params, salt, _ = pwhash.split('$', 2)
+    except ValueError:
+        return True
+    return params != _policy_prefix(method) or len(salt) != salt_length
+
+
+def verify_password(pwhash, password):
+    """
+    Check a password against a stored hash on the hashing pool, so at most
+    PASSWORD_HASH_WORKERS verifications burn CPU at once however many
+    request threads are logging users in.
+    Raises HashPoolBusy when PASSWORD_HASH_QUEUE verifications are already
+    waiting, or when the result takes longer than PASSWORD_HASH_TIMEOUT
+    seconds (the request thread is not held behind a backed-up pool).
+    """
+    pool = _get_pool()
+    pending = _pending
+    if not pending.acquire(blocking=False):
+        raise HashPoolBusy()
+    try:
+        future = pool.submit(check_password_hash, pwhash, password)
+    except BaseException:
+        pending.release()
+        raise
+    # The place in the pool is given back when the verification ends (or is
+    # cancelled), not when the caller stops waiting for it
+    future.add_done_callback(lambda _: pending.release())
+    try:
+        return future.result(timeout=current_app.config.get('PASSWORD_HASH_TIMEOUT', 5))
+    except ResultTimeout: # Not the builtin TimeoutError before Python 3.11
+        future.cancel()
+        raise HashPoolBusy()
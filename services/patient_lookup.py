@@ -0,0 +1,72 @@
+from flask import current_app
+from sqlalchemy import func, text
+from models import db, User, USER_SEARCH_TABLE
+
+# Shortest input the trigram index can match as a substring
+MIN_SUBSTRING = 3
+
+
+def _prefix_bounds(prefix):
+    """
+    [low, high) range of strings starting with `prefix`, so a prefix match
+    is an index range scan instead of a LIKE.
+    """
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _by_prefix(column, prefix, limit):
+    low, high = _prefix_bounds(prefix)
+    key = func.lower(column)
+    return db.session.query(User.id, User.username, User.email)\
+        .filter(User.role == 'patient', key >= low, key < high)\
+        .order_by(key).limit(limit).all()
+
+
+def _by_substring(fragment, exclude, limit):
+    # The trigram index answers "contains" for both columns; rows come back
+    # in rowid order, so the index stops after `limit` patients
+    rows = db.session.execute(
+        text(f'SELECT u.id, u.username, u.email FROM {USER_SEARCH_TABLE} CROSS JOIN users u '
+             f'ON u.id = {USER_SEARCH_TABLE}.rowid '
+             f"WHERE {USER_SEARCH_TABLE} MATCH :phrase AND u.role = 'patient' "
+             f'ORDER BY {USER_SEARCH_TABLE}.rowid LIMIT :limit'),
+        {'phrase': '"' + fragment.replace('"', '""') + '"', 'limit': limit + len(exclude)},
+    ).all()
+    return [row for row in rows if row.id not in exclude][:limit]
+
+
+def lookup_limit(requested=None):
+    """
+    Resolve ?limit= against PATIENT_LOOKUP_LIMIT / PATIENT_LOOKUP_LIMIT_MAX.
+    """
+    default = current_app.config.get('PATIENT_LOOKUP_LIMIT', 10)
+    maximum = current_app.config.get('PATIENT_LOOKUP_LIMIT_MAX', 50)
+    try:
+        limit = int(requested) if requested else default
+    except ValueError:
+        limit = default
+    return max(1, min(limit, maximum))
+
+
+def lookup_patients(query, limit=10):
+    """
+    Patients for an autocomplete box, at most `limit`: usernames starting
+    with the input first, then emails starting with it (both
+    case-insensitive, from the lower() indexes), then, for inputs of
+    MIN_SUBSTRING characters or more, usernames or emails containing it.
+    Returns [{'id', 'username', 'email'}].
+    """
+    query = (query or '').strip().lower()
+    if not query:
+        return []
+
+    found = {}
+    for column in (User.username, User.email):
+        for row in _by_prefix(column, query, limit):
+            if len(found) < limit:
+                found.setdefault(row.id, row)
+    if len(found) < limit and len(query) >= MIN_SUBSTRING:
+        for row in _by_substring(query, found, limit - len(found)):
+            found[row.id] = row
+
+    return [{'id': row.id, 'username': row.username, 'email': row.email} for row in found.values()]
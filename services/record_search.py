@@ -0,0 +1,291 @@
+import re
+from dataclasses import dataclass
+from datetime import date, datetime
+from functools import partial
+from flask import current_app
+from sqlalchemy import text
+from models import db, PatientRecord, RECORD_SEARCH_TABLE
+from services.pagination import encode_rank_cursor, decode_rank_cursor
+
+# bm25 weight of each indexed column: diagnosis, prescription, notes, scope
+RANK_WEIGHTS = (3.0, 2.0, 1.0, 0.0)
+MAX_TERMS = 8
+# Matches looked at to tell whether a term is common (see _is_common)
+_COMMON_PROBE = 200
+_QUERY = re.compile(r'"([^"]*)"|(\S+)')
+
+
+@dataclass
+class SearchHit:
+    record: object
+    score: float = None # bm25, lower is more relevant; None when ordered newest first
+
+
+@dataclass
+class SearchPage:
+    """
+    One page of search results with cursors for the neighbouring pages.
+    `ranked` is False when the results are newest first instead of by
+    relevance; `common` lists the query terms found in most of the
+    searched records (they must still match but are left out of the ranking);
+    `older` is True when matches older than the ranked window exist (they
+    follow the ranked ones, newest first, with no score).
+    """
+    hits: list
+    next_cursor: str = None
+    prev_cursor: str = None
+    ranked: bool = True
+    common: tuple = ()
+    older: bool = False
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def parse_terms(query):
+    """
+    Turn user input into FTS5 phrases, so no input is read as FTS5 syntax:
+    words become "word", "quoted text" and hyphenated words become phrases,
+    and a trailing * keeps its prefix meaning. At most MAX_TERMS terms.
+    """
+    terms = []
+    for quoted, word in _QUERY.findall(query or ''):
+        words = re.findall(r'\w+', quoted or word)
+        if not words:
+            continue
+        term = '"' + ' '.join(words) + '"'
+        if not quoted and word.endswith('*'):
+            term += '*'
+        terms.append(term)
+    return terms[:MAX_TERMS]
+
+
+def parse_filters(args):
+    """
+    Read the ?patient=, ?doctor=, ?from= and ?to= (YYYY-MM-DD) search
+    filters from request args as search_records keyword arguments.
+    Raises ValueError for malformed values.
+    """
+    def number(name):
+        return int(args[name]) if args.get(name) else None
+
+    def day(name):
+        return datetime.strptime(args[name], '%Y-%m-%d').date() if args.get(name) else None
+
+    return {'patient_id': number('patient'), 'doctor_id': number('doctor'),
+            'date_from': day('from'), 'date_to': day('to')}
+
+
+def _months(date_from, date_to):
+    """
+    Scope tokens for the visit months of a date range, or None when the
+    range is open-ended or longer than SEARCH_MAX_MONTHS.
+    """
+    if not date_from:
+        return None
+    date_to = date_to or date.today()
+    count = (date_to.year - date_from.year) * 12 + date_to.month - date_from.month + 1
+    if count < 1 or count > current_app.config.get('SEARCH_MAX_MONTHS', 24):
+        return None
+    months = []
+    year, month = date_from.year, date_from.month
+    for _ in range(count):
+        months.append(f'm{year}{month:02d}')
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def _scope(patient_id=None, doctor_id=None, months=None):
+    """
+    FTS5 expression matching the records of a patient, a doctor and a set
+    of visit months ('' for no scope).
+    """
+    parts = []
+    if patient_id is not None:
+        parts.append(f'scope : p{int(patient_id)}')
+    if doctor_id is not None:
+        parts.append(f'scope : d{int(doctor_id)}')
+    if months:
+        parts.append('scope : (' + ' OR '.join(months) + ')')
+    return ' AND '.join(parts)
+
+
+def _expression(terms, patient_id=None, doctor_id=None, months=None):
+    expression = '{diagnosis prescription notes} : (' + ' AND '.join(terms) + ')'
+    scope = _scope(patient_id, doctor_id, months)
+    return f'{expression} AND {scope}' if scope else expression
+
+
+def _nth_newest(expression, n):
+    """
+    Id of the n-th newest record matching `expression` (None if fewer).
+    The index walks its matches newest first, so this reads n of them.
+    """
+    return db.session.execute(
+        text(f'SELECT rowid FROM {RECORD_SEARCH_TABLE} WHERE {RECORD_SEARCH_TABLE} MATCH :expression '
+             'ORDER BY rowid DESC LIMIT 1 OFFSET :offset'),
+        {'expression': expression, 'offset': n - 1},
+    ).scalar()
+
+
+def _is_common(nth, newest_id, **scope):
+    """
+    Whether a term whose _COMMON_PROBE-th newest match in the scope is
+    record `nth` occurs in more than SEARCH_COMMON_TERM_SHARE of the most
+    recent records of the searched scope (patient, doctor, months).
+    Such terms still have to match, but are left out of the ranking:
+    bm25 gives them next to no weight, yet computing it reads every record
+    that contains them. When every term is common the results are listed
+    newest first instead. A term common hospital-wide can be rare for one patient, so
+    it is judged within the scope the search is limited to.
+    """
+    share = current_app.config.get('SEARCH_COMMON_TERM_SHARE', 0.5)
+    if nth is None:
+        return False
+    scoped = _scope(**scope)
+    if not scoped:
+        return _COMMON_PROBE > share * (newest_id - nth + 1)
+    # Records of the scope at least as recent as the term's nth newest match,
+    # counted only as far as it takes to tell the term is not common
+    in_scope = db.session.execute(
+        text(f'SELECT count(*) FROM (SELECT rowid FROM {RECORD_SEARCH_TABLE} '
+             f'WHERE {RECORD_SEARCH_TABLE} MATCH :scope AND rowid >= :nth LIMIT :cap)'),
+        {'scope': scoped, 'nth': nth, 'cap': int(_COMMON_PROBE / share) + 1},
+    ).scalar()
+    return _COMMON_PROBE > share * in_scope
+
+
+def _segment(expression, rank_expression, date_from, date_to, window, older, forward, limit,
+             cursor_id=None, cursor_score=None):
+    """
+    Ids and scores of matches on one side of the ranked window, in page
+    order (reversed when not `forward`, for pages before a cursor).
+    - `older` False: the matches with rowid >= window, by bm25 of
+      rank_expression then id (after / before the cursor's score and id).
+    - `older` True: the matches with rowid < window, newest first, without
+      a score (after / before the cursor's id).
+    """
+    score = 'NULL' if older else f'bm25({RECORD_SEARCH_TABLE}, {", ".join(map(str, RANK_WEIGHTS))})'
+    # CROSS JOIN keeps the index as the outer loop: starting from
+    # patient_records and probing the index per row is far slower
+    sql = (f'SELECT r.id, {score} AS score FROM {RECORD_SEARCH_TABLE} CROSS JOIN patient_records r '
+           f'ON r.id = {RECORD_SEARCH_TABLE}.rowid '
+           f'WHERE {RECORD_SEARCH_TABLE} MATCH :match '
+           f'AND {RECORD_SEARCH_TABLE}.rowid {"<" if older else ">="} :window')
+    params = {'match': expression, 'window': window, 'limit': limit}
+    if not older and rank_expression != expression:
+        # bm25 reads every match of each term to weigh it, most of the index
+        # for a common term: rank on the other terms, among the window's
+        # matches of the whole query (listed once; + keeps it off the index)
+        params['match'], params['expression'] = rank_expression, expression
+        sql += (f' AND +{RECORD_SEARCH_TABLE}.rowid IN (SELECT rowid FROM {RECORD_SEARCH_TABLE} '
+                f'WHERE {RECORD_SEARCH_TABLE} MATCH :expression AND rowid >= :window)')
+    if date_from:
+        sql += ' AND r.visit_date >= :date_from'
+        params['date_from'] = date_from.isoformat()
+    if date_to:
+        sql += ' AND r.visit_date <= :date_to'
+        params['date_to'] = date_to.isoformat()
+
+    if cursor_id is not None:
+        params['score'], params['id'] = cursor_score, cursor_id
+        if older:
+            sql += f' AND {RECORD_SEARCH_TABLE}.rowid {"<" if forward else ">"} :id'
+        else:
+            sql += (' AND (score > :score OR (score = :score AND r.id > :id))' if forward else
+                    ' AND (score < :score OR (score = :score AND r.id < :id))')
+    if older:
+        # In rowid order the index streams its matches, nothing is sorted
+        sql += f' ORDER BY {RECORD_SEARCH_TABLE}.rowid {"DESC" if forward else "ASC"}'
+    else:
+        sql += ' ORDER BY score, r.id' if forward else ' ORDER BY score DESC, r.id DESC'
+    return db.session.execute(text(sql + ' LIMIT :limit'), params).all()
+
+
+def search_records(query, patient_id=None, doctor_id=None, date_from=None, date_to=None,
+                   after=None, before=None, per_page=None):
+    """
+    Full-text search of record diagnoses, prescriptions and notes, optionally
+    limited to one patient, one doctor and a visit date range.
+
+    The newest SEARCH_RANK_WINDOW matches come first, ordered by relevance
+    (bm25, diagnosis weighted highest), so a term found in a large part of
+    the records costs no more than a rare one. Older matches follow them,
+    newest first, and SearchPage.older tells when there are any. Every
+    term has to match, but common ones get no weight in the ranking, and
+    when every term is common all matches are newest first instead.
+    Paginated with `after` / `before` cursors; returns a SearchPage.
+    """
+    terms = parse_terms(query)
+    if not terms:
+        return SearchPage(hits=[])
+    per_page = per_page or current_app.config.get('SEARCH_PAGE_SIZE', 20)
+    scope = {'patient_id': patient_id, 'doctor_id': doctor_id, 'months': _months(date_from, date_to)}
+
+    newest_id = db.session.query(db.func.max(PatientRecord.id)).scalar() or 0
+    probes = {term: _nth_newest(_expression([term], **scope), _COMMON_PROBE) for term in terms}
+    common = tuple(term for term in terms if _is_common(probes[term], newest_id, **scope))
+    ranked = len(common) < len(terms)
+
+    expression = _expression(terms, **scope)
+    # Common terms must match but get no weight in the ranking
+    rank_expression = _expression([term for term in terms if term not in common], **scope) if ranked else expression
+    after = decode_rank_cursor(after)
+    before = decode_rank_cursor(before) if not after else None
+    cursor = after or before
+
+    # Matches from `window` up are ranked, older ones follow newest first;
+    # unranked searches list everything below it
+    rank_window = current_app.config.get('SEARCH_RANK_WINDOW', 2000)
+    if cursor:
+        window = cursor[0]
+    elif ranked and rank_window >= _COMMON_PROBE and any(probes[term] is None for term in terms):
+        # A term with fewer than _COMMON_PROBE matches: they all fit in the window
+        window = 0
+    elif ranked:
+        window = _nth_newest(expression, rank_window) or 0
+    else:
+        window = newest_id + 1
+    segment = partial(_segment, expression, rank_expression, date_from, date_to, window)
+    # A cursor without a score points into the older matches
+    in_older = not ranked or (cursor is not None and cursor[1] is None)
+
+    limit = per_page + 1
+    position = {'cursor_id': cursor[2], 'cursor_score': cursor[1]} if cursor else {}
+    if not before:
+        rows = []
+        if not in_older:
+            rows = segment(older=False, forward=True, limit=limit, **position)
+        if len(rows) < limit and window:
+            rows += segment(older=True, forward=True, limit=limit - len(rows), **(position if in_older else {}))
+        has_prev, has_next = after is not None, len(rows) > per_page
+        rows = rows[:per_page]
+    else:
+        rows = []
+        if in_older:
+            rows = segment(older=True, forward=False, limit=limit, **position)
+        if len(rows) < limit and ranked:
+            rows += segment(older=False, forward=False, limit=limit - len(rows), **({} if in_older else position))
+        has_prev, has_next = len(rows) > per_page, True
+        rows = list(reversed(rows[:per_page]))
+
+    older = False
+    if ranked and window:
+        older = any(row.score is None for row in rows) or bool(segment(older=True, forward=True, limit=1))
+
+    records = {record.id: record for record in
+               PatientRecord.query.with_parties().filter(PatientRecord.id.in_([row.id for row in rows]))}
+    hits = [SearchHit(records[row.id], row.score) for row in rows if row.id in records]
+    return SearchPage(
+        hits=hits,
+        next_cursor=encode_rank_cursor(window, rows[-1].score, rows[-1].id) if rows and has_next else None,
+        prev_cursor=encode_rank_cursor(window, rows[0].score, rows[0].id) if rows and has_prev else None,
+        ranked=ranked,
+        common=common if ranked else (),
+        older=older,
+    )
@@ -0,0 +1,330 @@
+"""
+Storage backends for the blueprints.
+
+The routes talk to a Repository instead of the SQLAlchemy models or
+DynamoDB directly. STORAGE_BACKEND in Config selects the implementation:
+
+    'sql'       SQLRepository (services/repository_sql.py), models.py
+    'dynamodb'  DynamoRepository (services/repository_dynamo.py), the
+                tables in services/dynamo_tables.py
+
+Both return objects with the attributes the templates use (User, Doctor,
+Appointment and PatientRecord with their patient/doctor relationships).
+User and doctor ids are integers on SQL and strings (username, doctor id)
+on DynamoDB; routes pass them through unchanged.
+"""
+from dataclasses import dataclass, field
+from flask import current_app
+from services.pagination import encode_name_cursor
+
+BACKENDS = ('sql', 'dynamodb')
+
+# Results of Repository.book_appointment
+BOOKED = 'ok'
+SLOT_TAKEN = 'taken'
+BUSY = 'busy' # Too many concurrent bookings; nothing was written, try again
+
+# Results of Repository.change_appointment_status
+CHANGED = 'ok'
+DAY_FULL = 'full' # No slots left that day, or the appointment's time was taken meanwhile
+CONFLICT = 'conflict' # Someone else changed the appointment first; nothing was written
+
+
+@dataclass
+class PatientRecordGroup:
+    """
+    One patient on a doctor's records page: how many records the doctor
+    wrote for them and the most recent ones (visit date descending).
+    """
+    patient: object
+    record_count: int
+    records: list = field(default_factory=list)
+
+
+@dataclass
+class PatientGroupsPage:
+    """
+    One page of PatientRecordGroups ordered by lowercase username, with
+    cursors for the neighbouring pages (None at either end).
+    """
+    groups: list
+    total: int
+    next_cursor: str = None
+    prev_cursor: str = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+@dataclass
+class ItemsPage:
+    """
+    One page of an admin listing, newest first, with cursors for the
+    neighbouring pages (None at either end). Same attributes as
+    services.pagination.KeysetPage, which the SQL backend returns.
+    """
+    items: list
+    total: int
+    next_cursor: str = None
+    prev_cursor: str = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def group_cursor(group):
+    return encode_name_cursor(group.patient.username.lower(), group.patient.id)
+
+
+def groups_page(groups, per_page, total, after=None, before=None):
+    """
+    Build a PatientGroupsPage from up to per_page + 1 groups in display
+    order, fetched after the `after` cursor, before the `before` cursor
+    (the groups closest to it), or from the start. The extra group only
+    tells whether there is another page in that direction.
+    """
+    if before:
+        has_prev, has_next = len(groups) > per_page, True
+        groups = groups[-per_page:]
+    else:
+        has_prev, has_next = after is not None, len(groups) > per_page
+        groups = groups[:per_page]
+    return PatientGroupsPage(
+        groups=groups,
+        total=total,
+        next_cursor=group_cursor(groups[-1]) if groups and has_next else None,
+        prev_cursor=group_cursor(groups[0]) if groups and has_prev else None,
+    )
+
+
+class Repository:
+    """
+    Interface implemented by each storage backend.
+    """
+
+    # Users
+
+    def load_user(self, user_id):
+        """
+        Flask-Login user_loader backend: the User for a session id, or None.
+        """
+        raise NotImplementedError
+
+    def get_user(self, user_id):
+        raise NotImplementedError
+
+    def authenticate(self, username, password):
+        """
+        Return the User if the password matches, else None.
+        """
+        raise NotImplementedError
+
+    def remember_login(self, user):
+        """
+        Called right after login_user(user).
+        """
+
+    def forget_login(self):
+        """
+        Called right after logout_user().
+        """
+
+    def username_or_email_taken(self, username, email):
+        """
+        Return 'username' or 'email' if either is already registered, else None.
+        """
+        raise NotImplementedError
+
+    def create_user(self, username, email, password, role='patient', date_of_birth=None):
+        """
+        Create and return a User, or None if the username was taken
+        in the meantime.
+        """
+        raise NotImplementedError
+
+    def email_taken(self, email, exclude_user=None):
+        raise NotImplementedError
+
+    def update_profile(self, user, email, date_of_birth):
+        raise NotImplementedError
+
+    def list_patients(self, after=None, before=None, per_page=None):
+        """
+        Patients newest first, one page (ItemsPage or KeysetPage) at a
+        time; after/before are cursors from a previous page.
+        """
+        raise NotImplementedError
+
+    # Doctors
+
+    def get_doctor(self, doctor_id):
+        raise NotImplementedError
+
+    def doctor_for_user(self, user):
+        """
+        The Doctor profile of a logged-in doctor user, or None.
+        """
+        raise NotImplementedError
+
+    def list_doctors(self, specialization=None):
+        raise NotImplementedError
+
+    def create_doctor(self, username, email, password, name, specialization, slots_per_day):
+        """
+        Create a doctor login and its Doctor profile together; returns the
+        Doctor, or None if the username or email was taken in the meantime.
+        """
+        raise NotImplementedError
+
+    def update_schedule(self, doctor, slots_per_day, day_start_minute, slot_length_minutes):
+        """
+        Change a doctor's daily schedule. Appointments already booked keep
+        their times.
+        """
+        raise NotImplementedError
+
+    # Appointments
+
+    def patient_appointments(self, patient_id, status=None, recent=None):
+        """
+        A patient's appointments, latest appointment date first; with
+        `recent`, the `recent` most recently requested ones instead.
+        """
+        raise NotImplementedError
+
+    def doctor_appointments(self, doctor_id, status=None, limit=None):
+        """
+        A doctor's appointments, latest appointment date first.
+        """
+        raise NotImplementedError
+
+    def recent_pending_appointments(self, limit=5):
+        raise NotImplementedError
+
+    def list_appointments(self, status=None, after=None, before=None, per_page=None):
+        """
+        All appointments (or those with one status) newest first, one page
+        (ItemsPage or KeysetPage) at a time; after/before are cursors from
+        a previous page.
+        """
+        raise NotImplementedError
+
+    def get_appointment(self, appointment_id):
+        raise NotImplementedError
+
+    def change_appointment_status(self, appointment, status):
+        """
+        Move an appointment to status if nobody changed it since it was
+        read, keeping the doctor's slots and the dashboard counts in step.
+        Returns CHANGED, DAY_FULL or CONFLICT; nothing is written unless
+        it is CHANGED.
+        """
+        raise NotImplementedError
+
+    def appointment_stats(self, doctor_id=None, patient_id=None):
+        """
+        AppointmentStats for one doctor or one patient.
+        """
+        raise NotImplementedError
+
+    def dashboard_stats(self):
+        """
+        DashboardStats for the admin dashboard.
+        """
+        raise NotImplementedError
+
+    def book_appointment(self, patient, doctor, day, start_minute, reason):
+        """
+        Create a pending appointment holding the doctor's slot at
+        start_minute on day. Returns BOOKED, SLOT_TAKEN or BUSY.
+        """
+        raise NotImplementedError
+
+    # Records
+
+    def patient_records(self, patient_id):
+        """
+        A patient's medical records, most recent visit first.
+        """
+        raise NotImplementedError
+
+    def doctor_records(self, doctor_id):
+        """
+        Records written by a doctor, most recent visit first.
+        """
+        raise NotImplementedError
+
+    def count_doctor_records(self, doctor_id):
+        raise NotImplementedError
+
+    def doctor_patient_groups(self, doctor_id, after=None, before=None, per_page=None, per_patient=3):
+        """
+        The patients a doctor has written records for, ordered by lowercase
+        username, as a PatientGroupsPage of up to per_page patients with at
+        most per_patient of their latest records each. after/before are
+        cursors from a previous page (encode_name_cursor).
+        """
+        raise NotImplementedError
+
+    def add_record(self, patient, doctor, diagnosis, prescription, visit_date, notes):
+        raise NotImplementedError
+
+    # Availability
+
+    def availability(self, doctor_id, day):
+        """
+        Slot availability of a doctor on one day: a dict with
+        available_slots, total_slots, booked_slots and free_slots
+        ([{'minute', 'time'}]), or None if the doctor does not exist.
+        """
+        raise NotImplementedError
+
+    def availability_range(self, doctors, start, end):
+        """
+        Free slot counts per doctor and day over [start, end].
+        """
+        raise NotImplementedError
+
+    def next_free_slot(self, doctor):
+        """
+        (date, minute) of the doctor's earliest free slot, or None.
+        """
+        raise NotImplementedError
+
+    # Transactions
+
+    def rollback(self):
+        """
+        Discard uncommitted changes after an error (no-op where writes are
+        not transactional).
+        """
+
+
+def get_repository():
+    """
+    Return the application's repository, created on first use from
+    STORAGE_BACKEND.
+    """
+    repository = current_app.extensions.get('repository')
+    if repository is None:
+        backend = current_app.config.get('STORAGE_BACKEND', 'sql')
+        if backend == 'sql':
+            from services.repository_sql import SQLRepository
+            repository = SQLRepository()
+        elif backend == 'dynamodb':
+            from services.repository_dynamo import DynamoRepository
+            repository = DynamoRepository.from_config(current_app.config)
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}; expected one of {BACKENDS}")
+        current_app.extensions['repository'] = repository
+    return repository
@@ -0,0 +1,421 @@
+import heapq
+import itertools
+import uuid
+from datetime import datetime, date, timedelta
+from flask import current_app
+from services.dynamo_counters import STATUSES, doctor_key, patient_key, count
+from services.dynamo_store import DynamoStore, TransactionBusy
+from services.dynamo_models import User, Doctor, Appointment, PatientRecord, bind_store, get_loader
+from services.passwords import hash_password, needs_rehash, verify_password
+from services.pagination import decode_created_cursor, decode_name_cursor, encode_created_cursor, get_page_size
+from services.repository import (Repository, BOOKED, SLOT_TAKEN, BUSY, CHANGED, DAY_FULL, CONFLICT, ItemsPage,
+                                 PatientRecordGroup, groups_page)
+from services.schedule import ACTIVE_STATUSES, schedule_minutes, minute_to_label
+from services.stats import AppointmentStats, DashboardStats
+
+
+def _stats_from_counter(counter, stats_class=AppointmentStats, **extra):
+    return stats_class(
+        total_appointments=count(counter, 'appointments'),
+        pending_appointments=count(counter, 'pending'),
+        approved_appointments=count(counter, 'approved'),
+        rejected_appointments=count(counter, 'rejected'),
+        **extra
+    )
+
+
+def _count_statuses(items):
+    counts = {'pending': 0, 'approved': 0, 'rejected': 0}
+    total = 0
+    for item in items:
+        total += 1
+        if item.get('status') in counts:
+            counts[item['status']] += 1
+    return AppointmentStats(
+        total_appointments=total,
+        pending_appointments=counts['pending'],
+        approved_appointments=counts['approved'],
+        rejected_appointments=counts['rejected'],
+    )
+
+
+def _slot_order(appointment):
+    return (appointment.appointment_date or date.min, appointment.start_minute or 0)
+
+
+def _created_at_page(stream, key, per_page, total, after=None, before=None):
+    """
+    Build an ItemsPage newest first, keyed on (created_at, id) like
+    paginate_keyset. stream(newest_first, start) yields items ordered by
+    created_at from the created_at `start` (inclusive, None for the
+    start); key(item) is the item's (created_at, id). Reads per_page + 1
+    items past the cursor.
+    """
+    position = decode_created_cursor(after or before)
+    if position is None:
+        after = before = None
+    elif after:
+        before = None
+    newest_first = not before
+    items = stream(newest_first, position[0] if position else None)
+    if position:
+        # Items sharing the cursor's created_at may sit on either side of it
+        items = (item for item in items if (key(item) < position if newest_first else key(item) > position))
+    rows = list(itertools.islice(items, per_page + 1))
+
+    if before:
+        has_newer, has_older = len(rows) > per_page, True
+        rows = list(reversed(rows[:per_page]))
+    else:
+        has_newer, has_older = after is not None, len(rows) > per_page
+        rows = rows[:per_page]
+    return ItemsPage(
+        items=rows,
+        total=total,
+        next_cursor=encode_created_cursor(*key(rows[-1])) if rows and has_older else None,
+        prev_cursor=encode_created_cursor(*key(rows[0])) if rows and has_newer else None,
+    )
+
+
+def _appointment_key(item):
+    return item['created_at'], item['id']
+
+
+def _user_key(item):
+    return item['created_at'], item['username']
+
+
+class DynamoRepository(Repository):
+    """
+    Repository over the DynamoDB tables (services/dynamo_tables.py).
+
+    Reads are key and index queries through DynamoStore; items come back
+    wrapped in the model objects of services/dynamo_models.py. Dashboard
+    counts are read from the counter items, and bookings claim their slot
+    on the doctor's day item in the same transaction that inserts them.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        bind_store(store)
+
+    @classmethod
+    def from_config(cls, config):
+        from services import aws_clients
+        dynamodb = aws_clients.resource('dynamodb', config.get('DYNAMODB_REGION'), config.get('DYNAMODB_ENDPOINT'))
+        return cls(DynamoStore(dynamodb))
+
+    # Users
+
+    def load_user(self, user_id):
+        return self.get_user(user_id)
+
+    def get_user(self, user_id):
+        item = self.store.get_user(str(user_id))
+        return User(item) if item else None
+
+    def authenticate(self, username, password):
+        item = self.store.get_user(username)
+        if item is None or not verify_password(item.get('password_hash', ''), password):
+            return None
+        # Upgrade hashes made under an older hashing policy
+        if needs_rehash(item['password_hash']):
+            item['password_hash'] = hash_password(password)
+            self.store.update_user(username, password_hash=item['password_hash'])
+        return User(item)
+
+    def username_or_email_taken(self, username, email):
+        if self.store.get_user(username):
+            return 'username'
+        if self.store.user_by_email(email):
+            return 'email'
+        return None
+
+    def create_user(self, username, email, password, role='patient', date_of_birth=None):
+        item = {
+            'username': username,
+            'email': email,
+            'password_hash': hash_password(password),
+            'role': role,
+            'date_of_birth': date_of_birth.isoformat() if date_of_birth else None,
+            'created_at': datetime.utcnow().isoformat()
+        }
+        if not self.store.put_user(item):
+            return None
+        return User(item)
+
+    def email_taken(self, email, exclude_user=None):
+        item = self.store.user_by_email(email)
+        if item is None:
+            return False
+        return exclude_user is None or item['username'] != exclude_user.id
+
+    def update_profile(self, user, email, date_of_birth):
+        self.store.update_user(user.username, email=email, date_of_birth=date_of_birth.isoformat())
+        user.email = email
+        user.date_of_birth = date_of_birth
+
+    def list_patients(self, after=None, before=None, per_page=None):
+        per_page = get_page_size(per_page)
+
+        def stream(newest_first, start):
+            return self.store.users_by_role('patient', newest_first, start, page_size=per_page + 1)
+
+        page = _created_at_page(stream, _user_key, per_page, count(self.store.global_counter(), 'patients'),
+                                after, before)
+        page.items = [User(item) for item in page.items]
+        return page
+
+    # Doctors
+
+    def get_doctor(self, doctor_id):
+        item = self.store.get_doctor(str(doctor_id))
+        return Doctor(item) if item else None
+
+    def doctor_for_user(self, user):
+        item = self.store.doctor_for_user(user.id)
+        return Doctor(item) if item else None
+
+    def list_doctors(self, specialization=None):
+        return [Doctor(item) for item in self.store.list_doctors(specialization)]
+
+    def create_doctor(self, username, email, password, name, specialization, slots_per_day):
+        if self.store.user_by_email(email):
+            return None
+        now = datetime.utcnow().isoformat()
+        user = {
+            'username': username,
+            'email': email,
+            'password_hash': hash_password(password),
+            'role': 'doctor',
+            'created_at': now
+        }
+        doctor = {
+            'id': str(uuid.uuid4()),
+            'user_id': username,
+            'name': name,
+            'specialization': specialization,
+            'available_slots_per_day': slots_per_day,
+            'created_at': now
+        }
+        if not self.store.put_doctor(user, doctor):
+            return None
+        return Doctor(doctor)
+
+    def update_schedule(self, doctor, slots_per_day, day_start_minute, slot_length_minutes):
+        # Free minutes are computed from the schedule, so there is nothing to rebuild
+        self.store.update_doctor(doctor.id, available_slots_per_day=slots_per_day,
+                                 day_start_minute=day_start_minute, slot_length_minutes=slot_length_minutes)
+
+    # Appointments
+
+    def patient_appointments(self, patient_id, status=None, recent=None):
+        items = self.store.appointments_for_patient(patient_id, limit=recent)
+        appointments = [Appointment(item) for item in items if status is None or item.get('status') == status]
+        if recent is not None:
+            return appointments
+        return sorted(appointments, key=_slot_order, reverse=True)
+
+    def doctor_appointments(self, doctor_id, status=None, limit=None):
+        items = self.store.appointments_for_doctor(doctor_id, status=status, limit=limit)
+        return sorted((Appointment(item) for item in items), key=_slot_order, reverse=True)
+
+    def recent_pending_appointments(self, limit=5):
+        return [Appointment(item) for item in self.store.recent_by_status('pending', limit)]
+
+    def list_appointments(self, status=None, after=None, before=None, per_page=None):
+        # The status index keeps each status in created_at order; "all" merges
+        # the three ordered streams, reading one small page of each at a time
+        per_page = get_page_size(per_page)
+        statuses = [status] if status is not None else STATUSES
+
+        def stream(newest_first, start):
+            return heapq.merge(*(self.store.appointments_by_status(name, newest_first, start, page_size=per_page + 1)
+                                 for name in statuses),
+                               key=_appointment_key, reverse=newest_first)
+
+        total = count(self.store.global_counter(), status or 'appointments')
+        page = _created_at_page(stream, _appointment_key, per_page, total, after, before)
+        page.items = [Appointment(item) for item in page.items]
+        return page
+
+    def get_appointment(self, appointment_id):
+        item = self.store.get_appointment(str(appointment_id))
+        return Appointment(item) if item else None
+
+    def change_appointment_status(self, appointment, status):
+        # One transaction moves the status, the doctor's day item and the
+        # dashboard counters together
+        doctor = self.get_doctor(appointment.doctor_id)
+        daily_limit = doctor.available_slots_per_day if doctor else None
+        try:
+            if self.store.set_appointment_status(appointment.item, status, daily_limit):
+                return CHANGED
+        except TransactionBusy:
+            return CONFLICT
+        # A failed condition: either the status moved, or the day could not take it back
+        current = self.store.get_appointment(appointment.id)
+        return DAY_FULL if current and current['status'] == appointment.status else CONFLICT
+
+    def appointment_stats(self, doctor_id=None, patient_id=None):
+        # One counter item per doctor and per patient
+        if doctor_id is not None and patient_id is not None:
+            items = self.store.appointments_for_patient(patient_id, projection=['status', 'doctor_id'])
+            return _count_statuses(item for item in items if item.get('doctor_id') == doctor_id)
+        if doctor_id is None and patient_id is None:
+            return _stats_from_counter(self.store.global_counter())
+        key = doctor_key(doctor_id) if doctor_id is not None else patient_key(patient_id)
+        return _stats_from_counter(self.store.get_counters(key)[key])
+
+    def dashboard_stats(self):
+        counter = self.store.global_counter()
+        return _stats_from_counter(counter, DashboardStats,
+                                   total_patients=count(counter, 'patients'),
+                                   total_doctors=count(counter, 'doctors'))
+
+    def _held_minutes(self, doctor_id, start, end):
+        """
+        {date: set of start minutes} held by active appointments in [start, end].
+        """
+        held = {}
+        items = self.store.appointments_between(doctor_id, start.isoformat(), end.isoformat(),
+                                                projection=['appointment_date', 'appointment_time',
+                                                            'start_minute', 'status'])
+        for item in items:
+            if item.get('status') in ACTIVE_STATUSES:
+                appointment = Appointment(item)
+                held.setdefault(appointment.appointment_date, set()).add(appointment.start_minute)
+        return held
+
+    def book_appointment(self, patient, doctor, day, start_minute, reason):
+        try:
+            booked = self.store.book_appointment({
+                'id': str(uuid.uuid4()),
+                'patient_id': patient.id,
+                'doctor_id': doctor.id,
+                'appointment_date': day.isoformat(),
+                'appointment_time': minute_to_label(start_minute),
+                'start_minute': start_minute,
+                'reason': reason,
+                'status': 'pending',
+                'created_at': datetime.utcnow().isoformat()
+            }, doctor.available_slots_per_day)
+        except TransactionBusy:
+            return BUSY
+        return BOOKED if booked else SLOT_TAKEN
+
+    # Records
+
+    def patient_records(self, patient_id):
+        return [PatientRecord(item) for item in self.store.records_for_patient(patient_id)]
+
+    def doctor_records(self, doctor_id):
+        return [PatientRecord(item) for item in self.store.records_for_doctor(doctor_id)]
+
+    def count_doctor_records(self, doctor_id):
+        key = doctor_key(doctor_id)
+        return count(self.store.get_counters(key)[key], 'records')
+
+    def doctor_patient_groups(self, doctor_id, after=None, before=None, per_page=None, per_patient=3):
+        # One index query for the doctor's records (newest first), grouped here;
+        # the page's patients come from one BatchGetItem through the loader
+        per_page = get_page_size(per_page)
+        counts, latest = {}, {}
+        for item in self.store.records_for_doctor(doctor_id):
+            patient_id = item['patient_id']
+            counts[patient_id] = counts.get(patient_id, 0) + 1
+            if counts[patient_id] <= per_patient:
+                latest.setdefault(patient_id, []).append(item)
+
+        # Usernames are the patient ids, so the order needs no user reads
+        ordered = sorted(counts, key=lambda username: (username.lower(), username))
+        position = decode_name_cursor(after or before)
+        if position is None:
+            after = before = None
+        elif after:
+            before = None
+            ordered = [username for username in ordered if (username.lower(), username) > position]
+        else:
+            ordered = [username for username in ordered if (username.lower(), username) < position]
+        page_ids = ordered[-(per_page + 1):] if before else ordered[:per_page + 1]
+
+        loader = get_loader()
+        for username in page_ids:
+            loader.want_user(username)
+        groups = [PatientRecordGroup(loader.user(username) or User({'username': username}), counts[username],
+                                     [PatientRecord(item) for item in latest[username]])
+                  for username in page_ids]
+        return groups_page(groups, per_page, len(counts), after, before)
+
+    def add_record(self, patient, doctor, diagnosis, prescription, visit_date, notes):
+        item = {
+            'id': str(uuid.uuid4()),
+            'patient_id': patient.id,
+            'doctor_id': doctor.id,
+            'diagnosis': diagnosis,
+            'prescription': prescription,
+            'visit_date': visit_date.isoformat(),
+            'notes': notes,
+            'created_at': datetime.utcnow().isoformat()
+        }
+        self.store.put_record(item)
+        return PatientRecord(item)
+
+    # Availability
+
+    def _free_minutes(self, doctor, day, held):
+        # Same rules as the SQL slots: nothing on past days, unheld, and not
+        # already started today
+        now = datetime.now()
+        if day < now.date():
+            return []
+        minutes = [minute for minute in schedule_minutes(doctor) if minute not in held.get(day, ())]
+        if day == now.date():
+            minutes = [minute for minute in minutes if minute > now.hour * 60 + now.minute]
+        return minutes
+
+    def availability(self, doctor_id, day):
+        doctor = self.get_doctor(doctor_id)
+        if not doctor:
+            return None
+        held = self._held_minutes(doctor.id, day, day)
+        minutes = self._free_minutes(doctor, day, held)
+        return {
+            'available_slots': len(minutes),
+            'total_slots': doctor.available_slots_per_day,
+            'booked_slots': len(held.get(day, ())),
+            'free_slots': [{'minute': minute, 'time': minute_to_label(minute)} for minute in minutes]
+        }
+
+    def availability_range(self, doctors, start, end):
+        days = (end - start).days + 1
+        calendar = {
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'doctors': []
+        }
+        # Past days have nothing free, so only the rest of the range is read
+        first = max(start, date.today())
+        for doctor in doctors:
+            held = self._held_minutes(doctor.id, first, end) if first <= end else {}
+            calendar['doctors'].append({
+                'id': doctor.id,
+                'name': doctor.name,
+                'specialization': doctor.specialization,
+                'total_slots': doctor.available_slots_per_day,
+                'available': [len(self._free_minutes(doctor, start + timedelta(days=offset), held))
+                              for offset in range(days)]
+            })
+        return calendar
+
+    def next_free_slot(self, doctor):
+        today = date.today()
+        horizon = current_app.config.get('SLOT_HORIZON_DAYS', 30)
+        end = today + timedelta(days=horizon - 1)
+        held = self._held_minutes(doctor.id, today, end)
+        for offset in range(horizon):
+            day = today + timedelta(days=offset)
+            minutes = self._free_minutes(doctor, day, held)
+            if minutes:
+                return day, minutes[0]
+        return None
@@ -0,0 +1,292 @@
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from models import db, User, Doctor, Appointment, PatientRecord
+from services.capacity import change_status
+from services.pagination import cached_count, decode_name_cursor, get_page_size, paginate_keyset
+from services.repository import Repository, BOOKED, SLOT_TAKEN, CHANGED, PatientRecordGroup, groups_page
+from services.stats import get_appointment_stats, get_dashboard_stats
+from services.identity import load_identity, get_current_doctor, invalidate_identity, remember_identity, forget_identity
+from services.availability import get_availability, get_availability_range, invalidate_availability
+from services.slots import claim_slot, minute_to_label, reset_schedule
+from services import slots
+
+
+def _int_id(value):
+    """
+    SQL ids are integers; anything else (e.g. a DynamoDB-style id in a
+    URL) matches nothing.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class SQLRepository(Repository):
+    """
+    Repository over the SQLAlchemy models (models.py).
+    """
+
+    # Users
+
+    def load_user(self, user_id):
+        user_id = _int_id(user_id)
+        return load_identity(user_id) if user_id is not None else None
+
+    def get_user(self, user_id):
+        user_id = _int_id(user_id)
+        return db.session.get(User, user_id) if user_id is not None else None
+
+    def authenticate(self, username, password):
+        user = User.query.filter_by(username=username).first()
+        if user is None or not user.check_password(password):
+            return None
+        # Upgrade hashes made under an older hashing policy
+        if user.rehash_password(password):
+            db.session.commit()
+            invalidate_identity(user.id)
+        return user
+
+    def remember_login(self, user):
+        remember_identity(user)
+
+    def forget_login(self):
+        forget_identity()
+
+    def username_or_email_taken(self, username, email):
+        if User.query.filter_by(username=username).first():
+            return 'username'
+        if User.query.filter_by(email=email).first():
+            return 'email'
+        return None
+
+    def create_user(self, username, email, password, role='patient', date_of_birth=None):
+        user = User(username=username, email=email, role=role, date_of_birth=date_of_birth)
+        user.set_password(password)
+        db.session.add(user)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Username or email taken by a signup that committed in between
+            db.session.rollback()
+            return None
+        return user
+
+    def email_taken(self, email, exclude_user=None):
+        query = User.query.filter(User.email == email)
+        if exclude_user is not None:
+            query = query.filter(User.id != exclude_user.id)
+        return query.first() is not None
+
+    def update_profile(self, user, email, date_of_birth):
+        user.email = email
+        user.date_of_birth = date_of_birth
+        db.session.commit()
+        invalidate_identity(user.id)
+
+    def list_patients(self, after=None, before=None, per_page=None):
+        patients = User.query.filter_by(role='patient')
+        return paginate_keyset(patients, User, count_query=patients, count_key=('patients',),
+                               after=after, before=before, per_page=per_page)
+
+    # Doctors
+
+    def get_doctor(self, doctor_id):
+        doctor_id = _int_id(doctor_id)
+        return db.session.get(Doctor, doctor_id) if doctor_id is not None else None
+
+    def doctor_for_user(self, user):
+        return get_current_doctor(user)
+
+    def list_doctors(self, specialization=None):
+        query = Doctor.query
+        if specialization is not None:
+            query = query.filter_by(specialization=specialization)
+        return query.all()
+
+    def create_doctor(self, username, email, password, name, specialization, slots_per_day):
+        user = User(username=username, email=email, role='doctor')
+        user.set_password(password)
+        db.session.add(user)
+        db.session.flush()  # Get the user ID
+        doctor = Doctor(user_id=user.id, name=name, specialization=specialization,
+                        available_slots_per_day=slots_per_day)
+        db.session.add(doctor)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return None
+        return doctor
+
+    def update_schedule(self, doctor, slots_per_day, day_start_minute, slot_length_minutes):
+        doctor.available_slots_per_day = slots_per_day
+        doctor.day_start_minute = day_start_minute
+        doctor.slot_length_minutes = slot_length_minutes
+        reset_schedule(doctor)
+        db.session.commit()
+        invalidate_availability(doctor.id)
+        invalidate_identity(doctor.user_id)
+
+    # Appointments
+
+    def patient_appointments(self, patient_id, status=None, recent=None):
+        query = Appointment.query.with_parties().filter_by(patient_id=patient_id)
+        if status is not None:
+            query = query.filter_by(status=status)
+        if recent is not None:
+            return query.order_by(Appointment.created_at.desc()).limit(recent).all()
+        return query.order_by(Appointment.appointment_date.desc(), Appointment.start_minute.desc()).all()
+
+    def doctor_appointments(self, doctor_id, status=None, limit=None):
+        query = Appointment.query.with_parties().filter_by(doctor_id=doctor_id)
+        if status is not None:
+            query = query.filter_by(status=status)
+        query = query.order_by(Appointment.appointment_date.desc(), Appointment.start_minute.desc())
+        return query.limit(limit).all() if limit is not None else query.all()
+
+    def recent_pending_appointments(self, limit=5):
+        return Appointment.query.with_parties().filter_by(status='pending')\
+            .order_by(Appointment.created_at.desc()).limit(limit).all()
+
+    def list_appointments(self, status=None, after=None, before=None, per_page=None):
+        filtered = Appointment.query
+        if status is not None:
+            filtered = filtered.filter_by(status=status)
+        return paginate_keyset(filtered.with_parties(), Appointment, count_query=filtered,
+                               count_key=('appointments', status or 'all'),
+                               after=after, before=before, per_page=per_page)
+
+    def get_appointment(self, appointment_id):
+        appointment_id = _int_id(appointment_id)
+        return db.session.get(Appointment, appointment_id) if appointment_id is not None else None
+
+    def change_appointment_status(self, appointment, status):
+        result = change_status(appointment, status)
+        if result != CHANGED:
+            db.session.rollback()
+            return result
+        db.session.commit()
+        invalidate_availability(appointment.doctor_id, appointment.appointment_date)
+        return CHANGED
+
+    def appointment_stats(self, doctor_id=None, patient_id=None):
+        return get_appointment_stats(doctor_id=doctor_id, patient_id=patient_id)
+
+    def dashboard_stats(self):
+        return get_dashboard_stats()
+
+    def book_appointment(self, patient, doctor, day, start_minute, reason):
+        appointment = Appointment(
+            patient_id=patient.id,
+            doctor_id=doctor.id,
+            appointment_date=day,
+            appointment_time=minute_to_label(start_minute),
+            start_minute=start_minute,
+            reason=reason,
+            status='pending'
+        )
+        db.session.add(appointment)
+        db.session.flush()  # Get the appointment ID
+
+        # Take the time slot atomically; fails if another patient got it first
+        if not claim_slot(doctor, day, start_minute, appointment.id):
+            db.session.rollback()
+            return SLOT_TAKEN
+
+        db.session.commit()
+        invalidate_availability(doctor.id, day)
+        return BOOKED
+
+    # Records
+
+    def patient_records(self, patient_id):
+        return PatientRecord.query.with_parties().filter_by(patient_id=patient_id)\
+            .order_by(PatientRecord.visit_date.desc()).all()
+
+    def doctor_records(self, doctor_id):
+        return PatientRecord.query.with_parties().filter_by(doctor_id=doctor_id)\
+            .order_by(PatientRecord.visit_date.desc()).all()
+
+    def count_doctor_records(self, doctor_id):
+        return PatientRecord.query.filter_by(doctor_id=doctor_id).count()
+
+    def doctor_patient_groups(self, doctor_id, after=None, before=None, per_page=None, per_patient=3):
+        # One statement: the page of patients, then each one's latest records
+        # numbered with a window function, so nothing is loaded per patient
+        per_page = get_page_size(per_page)
+        doctor_id = _int_id(doctor_id)
+        sort_name = func.lower(User.username)
+        position = decode_name_cursor(after or before)
+        if position is None:
+            after = before = None # Missing or malformed cursor: first page
+        else:
+            position = (position[0], _int_id(position[1]))
+            before = None if after else before
+
+        patients = select(User.id.label('patient_id'), sort_name.label('sort_name'))\
+            .where(User.id.in_(select(PatientRecord.patient_id).where(PatientRecord.doctor_id == doctor_id)))
+        if before:
+            patients = patients.where(tuple_(sort_name, User.id) < position)\
+                .order_by(sort_name.desc(), User.id.desc())
+        else:
+            if after:
+                patients = patients.where(tuple_(sort_name, User.id) > position)
+            patients = patients.order_by(sort_name, User.id)
+        patients = patients.limit(per_page + 1).cte('page_patients')
+
+        ranked = select(
+            PatientRecord,
+            func.row_number().over(partition_by=PatientRecord.patient_id,
+                                   order_by=(PatientRecord.visit_date.desc(), PatientRecord.id.desc())).label('rank'),
+            func.count().over(partition_by=PatientRecord.patient_id).label('record_count'),
+        ).join(patients, patients.c.patient_id == PatientRecord.patient_id)\
+            .where(PatientRecord.doctor_id == doctor_id).subquery()
+        record = aliased(PatientRecord, ranked)
+        rows = db.session.execute(
+            select(User, record, ranked.c.record_count)
+            .join(ranked, ranked.c.patient_id == User.id)
+            .where(ranked.c.rank <= per_patient)
+            .order_by(sort_name, User.id, ranked.c.rank)
+        ).all()
+
+        groups = []
+        for patient, patient_record, record_count in rows:
+            if not groups or groups[-1].patient is not patient:
+                groups.append(PatientRecordGroup(patient, record_count))
+            groups[-1].records.append(patient_record)
+
+        total = cached_count(('doctor_patients', doctor_id),
+                             db.session.query(PatientRecord.patient_id).filter_by(doctor_id=doctor_id).distinct())
+        return groups_page(groups, per_page, total, after, before)
+
+    def add_record(self, patient, doctor, diagnosis, prescription, visit_date, notes):
+        record = PatientRecord(
+            patient_id=patient.id,
+            doctor_id=doctor.id,
+            diagnosis=diagnosis,
+            prescription=prescription,
+            visit_date=visit_date,
+            notes=notes
+        )
+        db.session.add(record)
+        db.session.commit()
+        return record
+
+    # Availability
+
+    def availability(self, doctor_id, day):
+        doctor_id = _int_id(doctor_id)
+        return get_availability(doctor_id, day) if doctor_id is not None else None
+
+    def availability_range(self, doctors, start, end):
+        return get_availability_range(doctors, start, end)
+
+    def next_free_slot(self, doctor):
+        return slots.next_free_slot(doctor)
+
+    # Transactions
+
+    def rollback(self):
+        db.session.rollback()
@@ -0,0 +1,42 @@
+"""
+Doctor schedule arithmetic shared by the SQL slots (services/slots.py)
+and the DynamoDB deployment. Plain Python only, so aws_app.py can use it
+without importing SQLAlchemy.
+"""
+from datetime import datetime
+
+# Appointment statuses that hold on to their time slot
+ACTIVE_STATUSES = ('pending', 'approved')
+
+
+def minute_to_label(minute):
+    """
+    Format minutes after midnight as the display label used across the
+    app, e.g. 540 -> "09:00 AM".
+    """
+    hours, minutes = divmod(minute, 60)
+    return f"{(hours % 12) or 12:02d}:{minutes:02d} {'AM' if hours < 12 else 'PM'}"
+
+
+def label_to_minute(label):
+    """
+    Parse "09:00 AM" (or 24-hour "09:00") into minutes after midnight.
+    Returns None if the label can't be parsed.
+    """
+    for fmt in ('%I:%M %p', '%H:%M'):
+        try:
+            parsed = datetime.strptime((label or '').strip(), fmt)
+            return parsed.hour * 60 + parsed.minute
+        except ValueError:
+            continue
+    return None
+
+
+def schedule_minutes(doctor):
+    """
+    Start minute of every slot in the doctor's daily schedule.
+    """
+    start = doctor.day_start_minute if doctor.day_start_minute is not None else 540
+    length = doctor.slot_length_minutes or 60
+    count = doctor.available_slots_per_day or 0
+    return [minute for minute in (start + i * length for i in range(count)) if minute < 24 * 60]
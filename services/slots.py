@@ -0,0 +1,268 @@
+from datetime import datetime, date, timedelta
+from flask import current_app
+from sqlalchemy import func, insert, update, delete, and_, or_
+from sqlalchemy.exc import IntegrityError
+from models import db, Appointment, Slot
+from services.schedule import ACTIVE_STATUSES, minute_to_label, label_to_minute, schedule_minutes  # noqa: F401
+
+
+def now_minute():
+    """
+    Minutes after midnight now; today's slots starting at or before it
+    are no longer bookable.
+    """
+    now = datetime.now()
+    return now.hour * 60 + now.minute
+
+
+def _materialize_day(doctor, day, skip_minutes=()):
+    """
+    Insert the slots of one (doctor, day), attaching appointments that were
+    booked before slots existed to the slot matching their time.
+    """
+    holders = {}
+    active = Appointment.query.filter(
+        Appointment.doctor_id == doctor.id,
+        Appointment.appointment_date == day,
+        Appointment.status.in_(ACTIVE_STATUSES)
+    ).order_by(Appointment.id)
+    for appointment in active:
+        minute = appointment.start_minute
+        if minute is None:
+            minute = label_to_minute(appointment.appointment_time)
+        holders.setdefault(minute, appointment.id)
+
+    rows = [
+        {'doctor_id': doctor.id, 'day': day, 'start_minute': minute, 'appointment_id': holders.get(minute)}
+        for minute in schedule_minutes(doctor) if minute not in skip_minutes
+    ]
+    if not rows:
+        return
+    try:
+        # Savepoint: another request materializing the same day first is fine
+        with db.session.begin_nested():
+            db.session.execute(insert(Slot), rows)
+    except IntegrityError:
+        pass
+
+
+def ensure_slots(doctors, start, end):
+    """
+    Materialize slots for every doctor and day in [start, end] that has none yet.
+    Existing days are found with one query on the (doctor_id, day, start_minute) key.
+    """
+    doctors = list(doctors)
+    if not doctors or end < start:
+        return
+
+    existing = _materialized_days([doctor.id for doctor in doctors], start, end)
+    for doctor in doctors:
+        day = start
+        while day <= end:
+            if (doctor.id, day) not in existing:
+                _materialize_day(doctor, day)
+            day += timedelta(days=1)
+
+
+def horizon_end():
+    """
+    Last day searched by next_free_slot and materialized by warm_slots:
+    SLOT_HORIZON_DAYS days starting today.
+    """
+    return date.today() + timedelta(days=current_app.config.get('SLOT_HORIZON_DAYS', 30) - 1)
+
+
+def warm_slots(doctors):
+    """
+    Materialize today..horizon_end() for the doctors ahead of time, so
+    availability reads of those days are served by the free-slot index.
+    Optional: reads never write, and bookings materialize their own day.
+    Runs inside the caller's transaction.
+    """
+    ensure_slots(doctors, date.today(), horizon_end())
+
+
+def _held_minutes(doctor_ids, start, end):
+    """
+    {(doctor_id, day): start minutes held by active appointments} over
+    [start, end]: what materializing those days would attach to slots.
+    """
+    held = {}
+    rows = db.session.query(Appointment.doctor_id, Appointment.appointment_date, Appointment.start_minute,
+                            Appointment.appointment_time).filter(
+        Appointment.doctor_id.in_(doctor_ids),
+        Appointment.appointment_date.between(start, end),
+        Appointment.status.in_(ACTIVE_STATUSES)
+    )
+    for doctor_id, day, minute, label in rows:
+        held.setdefault((doctor_id, day), set()).add(minute if minute is not None else label_to_minute(label))
+    return held
+
+
+def _materialized_days(doctor_ids, start, end):
+    return set(
+        db.session.query(Slot.doctor_id, Slot.day).filter(
+            Slot.doctor_id.in_(doctor_ids),
+            Slot.day.between(start, end)
+        ).distinct()
+    )
+
+
+def _bookable(query, day):
+    """
+    Restrict a Slot query to free slots that haven't already started.
+    """
+    query = query.filter(Slot.appointment_id.is_(None))
+    today = date.today()
+    if day is None:
+        return query.filter(or_(Slot.day > today,
+                                and_(Slot.day == today, Slot.start_minute > now_minute())))
+    if day == today:
+        return query.filter(Slot.start_minute > now_minute())
+    return query
+
+
+def _computed_free(doctor, day, held):
+    """
+    Free, not yet started start minutes of a day without slots, worked
+    out from its schedule and the minutes held by appointments.
+    """
+    started = now_minute() if day == date.today() else -1
+    return [minute for minute in schedule_minutes(doctor) if minute > started and minute not in held]
+
+
+def free_slots(doctor, day):
+    """
+    Start minutes of the doctor's free slots on a day, earliest first.
+    Served by the partial index on free slots. Past days have none; days
+    that have no slots yet are worked out from the appointments, so reads
+    never write.
+    """
+    if day < date.today():
+        return []
+    if (doctor.id, day) not in _materialized_days([doctor.id], day, day):
+        return _computed_free(doctor, day, _held_minutes([doctor.id], day, day).get((doctor.id, day), ()))
+    query = db.session.query(Slot.start_minute).filter(Slot.doctor_id == doctor.id, Slot.day == day)
+    return [minute for (minute,) in _bookable(query, day).order_by(Slot.start_minute)]
+
+
+def held_slots(doctor_id, day):
+    """
+    Number of the doctor's slots on a day held by an appointment (counted
+    from the appointments for days without slots).
+    """
+    if (doctor_id, day) not in _materialized_days([doctor_id], day, day):
+        return len(_held_minutes([doctor_id], day, day).get((doctor_id, day), ()))
+    return db.session.query(func.count(Slot.id)).filter(
+        Slot.doctor_id == doctor_id,
+        Slot.day == day,
+        Slot.appointment_id.isnot(None)
+    ).scalar()
+
+
+def free_slot_counts(doctors, start, end):
+    """
+    Count free, not yet started slots per (doctor_id, day) over [start, end]
+    with a single grouped query. Days without free slots are absent.
+    """
+    doctors = list(doctors)
+    doctor_ids = [doctor.id for doctor in doctors]
+    query = db.session.query(Slot.doctor_id, Slot.day, func.count()).filter(
+        Slot.doctor_id.in_(doctor_ids),
+        Slot.day.between(start, end)
+    )
+    query = _bookable(query, None if start <= date.today() else start)
+    counts = {(doctor_id, day): count for doctor_id, day, count in query.group_by(Slot.doctor_id, Slot.day)}
+
+    # Days without slots are counted from the appointments; past days have nothing bookable
+    first = max(start, date.today())
+    if first <= end:
+        existing = _materialized_days(doctor_ids, first, end)
+        held = _held_minutes(doctor_ids, first, end)
+        for doctor in doctors:
+            day = first
+            while day <= end:
+                if (doctor.id, day) not in existing:
+                    free = len(_computed_free(doctor, day, held.get((doctor.id, day), ())))
+                    if free:
+                        counts[(doctor.id, day)] = free
+                day += timedelta(days=1)
+    return counts
+
+
+def next_free_slot(doctor):
+    """
+    Return (day, start_minute) of the doctor's earliest bookable slot within
+    SLOT_HORIZON_DAYS, or None. One ordered lookup on the free-slot index
+    covers the days with slots; earlier days without slots are worked out
+    from the appointments.
+    """
+    today, last = date.today(), horizon_end()
+    query = db.session.query(Slot.day, Slot.start_minute).filter(Slot.doctor_id == doctor.id, Slot.day <= last)
+    indexed = _bookable(query, None).order_by(Slot.day, Slot.start_minute).first()
+
+    end = indexed[0] - timedelta(days=1) if indexed else last
+    if today <= end:
+        existing = _materialized_days([doctor.id], today, end)
+        held = _held_minutes([doctor.id], today, end)
+        day = today
+        while day <= end:
+            if (doctor.id, day) not in existing:
+                free = _computed_free(doctor, day, held.get((doctor.id, day), ()))
+                if free:
+                    return day, free[0]
+            day += timedelta(days=1)
+    return tuple(indexed) if indexed else None
+
+
+def claim_slot(doctor, day, minute, appointment_id):
+    """
+    Atomically give the slot at `minute` to an appointment.
+    A conditional UPDATE on appointment_id IS NULL, so two bookings can never
+    end up holding the same time. Returns False if the slot is taken or not
+    part of the schedule. Runs inside the caller's transaction.
+    """
+    ensure_slots([doctor], day, day)
+    result = db.session.execute(
+        update(Slot)
+        .where(Slot.doctor_id == doctor.id,
+               Slot.day == day,
+               Slot.start_minute == minute,
+               # Materializing the day may already have attached this appointment
+               or_(Slot.appointment_id.is_(None), Slot.appointment_id == appointment_id))
+        .values(appointment_id=appointment_id)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def release_slot(appointment_id):
+    """
+    Free whatever slot the appointment holds. Runs inside the caller's transaction.
+    """
+    db.session.execute(
+        update(Slot)
+        .where(Slot.appointment_id == appointment_id)
+        .values(appointment_id=None)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def reset_schedule(doctor):
+    """
+    Apply a changed schedule to already materialized days from today on.
+    Free slots are rebuilt from the new schedule; held slots are kept.
+    """
+    today = date.today()
+    db.session.execute(
+        delete(Slot)
+        .where(Slot.doctor_id == doctor.id, Slot.day >= today, Slot.appointment_id.is_(None))
+        .execution_options(synchronize_session=False)
+    )
+
+    held = {}
+    for day, minute in db.session.query(Slot.day, Slot.start_minute)\
+            .filter(Slot.doctor_id == doctor.id, Slot.day >= today):
+        held.setdefault(day, set()).add(minute)
+    for day, minutes in held.items():
+        _materialize_day(doctor, day, skip_minutes=minutes)
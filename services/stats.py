@@ -0,0 +1,84 @@
+from dataclasses import dataclass
+from sqlalchemy import func, case, select
+from models import db, User, Doctor, Appointment
+
+
+@dataclass(frozen=True)
+class AppointmentStats:
+    """
+    Appointment counts broken down by status.
+    Shared by the admin, doctor and patient dashboards.
+    """
+    total_appointments: int = 0
+    pending_appointments: int = 0
+    approved_appointments: int = 0
+    rejected_appointments: int = 0
+
+
+@dataclass(frozen=True)
+class DashboardStats(AppointmentStats):
+    """
+    Hospital-wide statistics shown on the admin dashboard.
+    """
+    total_patients: int = 0
+    total_doctors: int = 0
+
+
+def _status_sum(status):
+    """
+    Conditional SUM counting only appointments in the given status.
+    """
+    return func.coalesce(func.sum(case((Appointment.status == status, 1), else_=0)), 0)
+
+
+def _status_columns():
+    return (
+        func.count(),
+        _status_sum('pending'),
+        _status_sum('approved'),
+        _status_sum('rejected'),
+    )
+
+
+def get_dashboard_stats():
+    """
+    Compute all admin dashboard counters in a single round trip.
+    Patient and doctor totals are folded in as scalar subqueries so the
+    appointment table is only scanned once for the per-status sums.
+    """
+    total_patients = select(func.count(User.id)).where(User.role == 'patient').scalar_subquery()
+    total_doctors = select(func.count(Doctor.id)).scalar_subquery()
+
+    row = db.session.execute(
+        select(*_status_columns(), total_patients, total_doctors).select_from(Appointment)
+    ).one()
+
+    return DashboardStats(
+        total_appointments=row[0],
+        pending_appointments=row[1],
+        approved_appointments=row[2],
+        rejected_appointments=row[3],
+        total_patients=row[4],
+        total_doctors=row[5],
+    )
+
+
+def get_appointment_stats(doctor_id=None, patient_id=None):
+    """
+    Compute per-status appointment counts in a single query,
+    optionally scoped to a doctor and/or a patient.
+    """
+    query = select(*_status_columns())
+    if doctor_id is not None:
+        query = query.where(Appointment.doctor_id == doctor_id)
+    if patient_id is not None:
+        query = query.where(Appointment.patient_id == patient_id)
+
+    row = db.session.execute(query).one()
+
+    return AppointmentStats(
+        total_appointments=row[0],
+        pending_appointments=row[1],
+        approved_appointments=row[2],
+        rejected_appointments=row[3],
+    )
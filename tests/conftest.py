@@ -0,0 +1,93 @@
+"""
+Shared fixtures. The tests drive the real app against a throwaway SQLite
+database, built with the same helpers as the benchmark scripts
+(benchmarks/common.py); instance/hospital.db is never touched.
+"""
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from common import setup_database  # noqa: E402  (needs the path above)
+
+
+def reset_caches():
+    """
+    Empty the in-process caches so a test module does not see entries left
+    by the previous one (ids are reused once the tables are recreated).
+    """
+    from services import availability, identity, pagination
+
+    availability._cache = None
+    identity._cache = None
+    pagination._count_cache = None
+
+
+@pytest.fixture(scope='session')
+def app_and_path():
+    # setup_database() points the app at its database on import, so once per run
+    return setup_database()
+
+
+@pytest.fixture(scope='module')
+def database(app_and_path):
+    """
+    (app, db_path) with freshly created, empty tables for each test module;
+    seed it with common.seed().
+    """
+    from models import db
+
+    app, db_path = app_and_path
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    reset_caches()
+    return app, db_path
+
+
+@pytest.fixture
+def dynamo_store():
+    """
+    A DynamoStore over freshly created tables in moto's in-process
+    DynamoDB; fill it with common.seed_dynamo().
+    """
+    mock_aws = pytest.importorskip('moto').mock_aws
+    import boto3
+    from services.dynamo_tables import create_tables
+    from services.dynamo_store import DynamoStore
+
+    for name, value in (('AWS_ACCESS_KEY_ID', 'testing'), ('AWS_SECRET_ACCESS_KEY', 'testing'),
+                        ('AWS_DEFAULT_REGION', 'us-east-1')):
+        os.environ.setdefault(name, value)
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        create_tables(dynamodb)
+        yield DynamoStore(dynamodb)
+
+
+@pytest.fixture
+def dynamo_app(app_and_path, dynamo_store):
+    """
+    (app, store): the app running on the DynamoDB backend over dynamo_store,
+    with an 'admin' login whose password is 'bench'. The SQL backend is
+    restored afterwards.
+    """
+    from services.passwords import hash_password
+    from services.repository_dynamo import DynamoRepository
+
+    app, _ = app_and_path
+    saved = app.config['STORAGE_BACKEND'], app.extensions.get('repository')
+    app.config['STORAGE_BACKEND'] = 'dynamodb'
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.extensions['repository'] = DynamoRepository(dynamo_store)
+    with app.app_context():
+        password_hash = hash_password('bench')
+    dynamo_store.users.put_item(Item={'username': 'admin', 'email': 'admin@example.com', 'role': 'admin',
+                                      'password_hash': password_hash, 'created_at': '2024-01-01T00:00:00'})
+    reset_caches()
+    yield app, dynamo_store
+    app.config['STORAGE_BACKEND'], app.extensions['repository'] = saved
+    if saved[1] is None:
+        del app.extensions['repository']
+    reset_caches()
@@ -0,0 +1,13 @@
+"""
+Concurrent bookings and approvals for one doctor and day never hold a
+time slot twice or approve more than the doctor's daily limit
+(benchmarks/stress_booking.py).
+"""
+from stress_booking import stress
+
+
+def test_concurrent_bookings_and_approvals_respect_capacity(database):
+    app, db_path = database
+    accepted, approved, limit = stress(app, db_path, threads=8, per_thread=10)
+    assert 0 < accepted <= limit
+    assert approved == accepted
@@ -0,0 +1,85 @@
+"""
+The admin pages on the DynamoDB backend (moto): listings, approve/reject
+through the day's slot counters, schedules, doctor accounts and records.
+"""
+from datetime import date, timedelta
+from common import login
+from services.repository import get_repository
+
+TOMORROW = date.today() + timedelta(days=1)
+
+
+def setup(app, store):
+    store.users.put_item(Item={'username': 'patient0', 'email': 'patient0@example.com', 'password_hash': 'x',
+                               'role': 'patient', 'created_at': '2024-02-01T00:00:00'})
+    store.users.put_item(Item={'username': 'doctor0', 'email': 'doctor0@example.com', 'password_hash': 'x',
+                               'role': 'doctor', 'created_at': '2024-01-15T00:00:00'})
+    store.doctors.put_item(Item={'id': 'doc-0', 'user_id': 'doctor0', 'name': 'Dr. Doctor 0',
+                                 'specialization': 'Cardiology', 'available_slots_per_day': 1})
+    with app.test_request_context():
+        repository = get_repository()
+        patient, doctor = repository.get_user('patient0'), repository.get_doctor('doc-0')
+        repository.book_appointment(patient, doctor, TOMORROW, 600, 'Checkup')
+    return store.appointments.scan()['Items'][0]['id']
+
+
+def status(store, appointment_id):
+    return store.appointments.get_item(Key={'id': appointment_id})['Item']['status']
+
+
+def test_approve_and_reject_respect_the_day_limit(dynamo_app):
+    app, store = dynamo_app
+    first = setup(app, store)
+    client = app.test_client()
+    login(client, 'admin')
+
+    page = client.get('/admin/appointments?status=pending')
+    assert page.status_code == 200 and b'Dr. Doctor 0' in page.data
+
+    client.get(f'/admin/reject/{first}')
+    assert status(store, first) == 'rejected'
+
+    # The freed slot goes to a second booking; the day (1 slot) is full again
+    with app.test_request_context():
+        repository = get_repository()
+        repository.book_appointment(repository.get_user('patient0'), repository.get_doctor('doc-0'),
+                                    TOMORROW, 660, 'Follow-up')
+    second = next(item['id'] for item in store.appointments.scan()['Items'] if item['id'] != first)
+
+    response = client.get(f'/admin/approve/{first}', follow_redirects=True)
+    assert b'No slots left' in response.data
+    assert status(store, first) == 'rejected'
+
+    client.get(f'/admin/reject/{second}')
+    client.get(f'/admin/approve/{first}')
+    assert (status(store, first), status(store, second)) == ('approved', 'rejected')
+    assert client.get('/admin/approve/no-such-id').status_code == 404
+
+
+def test_doctors_schedules_and_records(dynamo_app):
+    app, store = dynamo_app
+    setup(app, store)
+    client = app.test_client()
+    login(client, 'admin')
+
+    response = client.post('/admin/create-doctor', data={
+        'username': 'doctor1', 'email': 'doctor1@example.com', 'password': 'secret1',
+        'name': 'Dr. New', 'specialization': 'Neurology', 'slots': '4'})
+    assert response.status_code == 302
+    response = client.post('/admin/create-doctor', data={
+        'username': 'doctor1', 'email': 'other@example.com', 'password': 'secret1',
+        'name': 'Dr. Copy', 'specialization': 'Neurology', 'slots': '4'}, follow_redirects=True)
+    assert b'Username already exists' in response.data
+    assert b'Dr. New' in client.get('/admin/doctors').data
+
+    client.post('/admin/set-slots', data={'doctor_id': 'doc-0', 'slots': '6',
+                                          'start_time': '08:00 AM', 'slot_length': '30'})
+    doctor = store.doctors.get_item(Key={'id': 'doc-0'})['Item']
+    assert (doctor['available_slots_per_day'], doctor['day_start_minute'], doctor['slot_length_minutes']) == (6, 480, 30)
+
+    assert b'patient0' in client.get('/admin/patients').data
+    client.post('/admin/patient/patient0/add-record', data={
+        'doctor_id': 'doc-0', 'diagnosis': 'Migraine', 'prescription': 'Rest',
+        'visit_date': TOMORROW.isoformat(), 'notes': ''})
+    assert b'Migraine' in client.get('/admin/patient/patient0/records').data
+    assert client.get('/admin/patient/nobody/records').status_code == 404
@@ -0,0 +1,90 @@
+"""
+Concurrent DynamoDB bookings (moto) for one doctor and day never hold a
+time slot twice or book more than available_slots_per_day, while a share
+of the transactions is cancelled with TransactionConflict and retried
+(benchmarks/stress_dynamo_booking.py runs the longer version).
+"""
+import threading
+from collections import Counter
+from datetime import date, timedelta
+from common import login, serialize_moto_calls, inject_transaction_conflicts
+from services import dynamo_store
+from services.dynamo_counters import capacity_key
+from services.passwords import hash_password
+from services.repository import get_repository, BOOKED, SLOT_TAKEN, BUSY
+from services.schedule import ACTIVE_STATUSES, minute_to_label
+from stress_dynamo_booking import run_threads
+
+DAY = date.today() + timedelta(days=90)
+DAILY_LIMIT = 4
+MINUTES = [540 + 60 * i for i in range(6)]  # More times offered than the limit allows
+THREADS = 8
+
+
+def setup(app, store):
+    with app.app_context():
+        password_hash = hash_password('bench')
+    for i in range(THREADS):
+        store.users.put_item(Item={'username': f'patient{i}', 'email': f'patient{i}@example.com',
+                                   'password_hash': password_hash, 'role': 'patient',
+                                   'created_at': '2024-02-01T00:00:00'})
+    for i in range(2):
+        store.doctors.put_item(Item={'id': f'doc-{i}', 'user_id': f'doctor{i}', 'name': f'Dr. Doctor {i}',
+                                     'specialization': 'Cardiology', 'available_slots_per_day': DAILY_LIMIT})
+    serialize_moto_calls(store)
+    return inject_transaction_conflicts(store, 0.3)
+
+
+def held(store, doctor_id):
+    return [item for item in store.appointments_for_doctor(doctor_id, day=DAY.isoformat())
+            if item['status'] in ACTIVE_STATUSES]
+
+
+def test_concurrent_bookings_respect_capacity(dynamo_app, monkeypatch):
+    app, store = dynamo_app
+    monkeypatch.setattr(dynamo_store, 'TRANSACT_BACKOFF', 0.001)
+    conflicts = setup(app, store)
+    outcomes = Counter()
+    lock = threading.Lock()
+
+    def book(index):
+        with app.test_request_context():
+            repository = get_repository()
+            patient, doctor = repository.get_user(f'patient{index}'), repository.get_doctor('doc-0')
+            for i in range(5):
+                result = repository.book_appointment(patient, doctor, DAY, MINUTES[(index + i) % len(MINUTES)],
+                                                     'Stress')
+                with lock:
+                    outcomes[result] += 1
+
+    run_threads(THREADS, book)
+    assert set(outcomes) <= {BOOKED, SLOT_TAKEN, BUSY}
+    assert conflicts['conflicts'], 'no conflicts were injected'
+
+    minutes = [int(item['start_minute']) for item in held(store, 'doc-0')]
+    assert 0 < len(minutes) == outcomes[BOOKED] <= DAILY_LIMIT
+    assert len(set(minutes)) == len(minutes), 'a minute was booked twice'
+    day_item = store.get_counters(capacity_key('doc-0', DAY.isoformat()))[capacity_key('doc-0', DAY.isoformat())]
+    assert int(day_item['booked']) == len(minutes)
+    assert sorted(int(minute) for minute in day_item['minutes']) == sorted(minutes)
+
+
+def test_conflicts_outlasting_the_retries_ask_to_try_again(dynamo_app, monkeypatch):
+    app, store = dynamo_app
+    monkeypatch.setattr(dynamo_store, 'TRANSACT_BACKOFF', 0.001)
+    conflicts = setup(app, store)
+    conflicts['rate'] = 1.0
+
+    with app.test_request_context():
+        repository = get_repository()
+        assert repository.book_appointment(repository.get_user('patient0'), repository.get_doctor('doc-1'),
+                                           DAY, MINUTES[0], 'Stress') == BUSY
+
+    client = app.test_client()
+    login(client, 'patient0')
+    response = client.post('/patient/book-appointment', data={
+        'doctor_id': 'doc-1', 'appointment_date': DAY.isoformat(),
+        'appointment_time': minute_to_label(MINUTES[1]), 'reason': 'Stress'}, follow_redirects=True)
+    assert b'Please try again' in response.data
+    assert conflicts['calls'] == 2 * dynamo_store.TRANSACT_ATTEMPTS
+    assert not held(store, 'doc-1')
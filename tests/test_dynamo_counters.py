@@ -0,0 +1,55 @@
+"""
+Approving and rejecting appointments from the admin pages (DynamoDB
+backend, moto) keeps the counter items equal to a full recount.
+"""
+from datetime import date, timedelta
+from common import login
+from bench_dynamo_counters import snapshot
+from services.dynamo_counters import count, rebuild_counters
+from services.repository import get_repository
+
+TOMORROW = date.today() + timedelta(days=1)
+
+
+def book_some(app, store):
+    for i in range(2):
+        store.users.put_item(Item={'username': f'patient{i}', 'email': f'patient{i}@example.com',
+                                   'password_hash': 'x', 'role': 'patient', 'created_at': '2024-02-01T00:00:00'})
+        store.doctors.put_item(Item={'id': f'doc-{i}', 'user_id': f'doctor{i}', 'name': f'Dr. Doctor {i}',
+                                     'specialization': 'Cardiology', 'available_slots_per_day': 3})
+    rebuild_counters(store)  # The users and doctors above bypassed the counters
+    with app.test_request_context():
+        repository = get_repository()
+        for i, minute in enumerate((540, 600, 660, 720)):
+            repository.book_appointment(repository.get_user(f'patient{i % 2}'), repository.get_doctor(f'doc-{i % 2}'),
+                                        TOMORROW + timedelta(days=i // 2), minute, 'Checkup')
+    return sorted((item['created_at'], item['id']) for item in store.appointments.scan()['Items'])
+
+
+def assert_matches_recount(store):
+    maintained = snapshot(store)
+    rebuild_counters(store)
+    assert maintained == snapshot(store)
+
+
+def test_status_changes_keep_counters_exact(dynamo_app):
+    app, store = dynamo_app
+    ids = [appointment_id for _, appointment_id in book_some(app, store)]
+    client = app.test_client()
+    login(client, 'admin')
+
+    for appointment_id in ids[:3]:
+        client.get(f'/admin/approve/{appointment_id}')
+    assert_matches_recount(store)
+    assert count(store.global_counter(), 'approved') == 3
+
+    # Approved and pending appointments give their slot back
+    for appointment_id in ids[1:]:
+        client.get(f'/admin/reject/{appointment_id}')
+    assert_matches_recount(store)
+    assert count(store.global_counter(), 'rejected') == 3
+
+    # Re-approving claims the slot again
+    client.get(f'/admin/approve/{ids[1]}')
+    assert_matches_recount(store)
+    assert count(store.global_counter(), 'pending') == 0
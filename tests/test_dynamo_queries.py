@@ -0,0 +1,176 @@
+"""
+DynamoDB key and GSI queries (moto): results are complete across
+LastEvaluatedKey pages, and the admin and doctor listings walk every item
+exactly once with their next and previous cursors.
+"""
+import threading
+from datetime import date, datetime, timedelta
+import pytest
+from boto3.dynamodb.conditions import Key
+from services.dynamo_counters import rebuild_counters
+from services.dynamo_models import Appointment, PatientRecord, bind_store
+from services.dynamo_store import count_items, parallel_scan
+from services.repository import get_repository
+
+DAY = date.today() + timedelta(days=10)
+CREATED = datetime(2024, 3, 1)
+STATUSES = ('pending', 'approved', 'rejected')
+
+
+def seed(store):
+    for i in range(7):
+        store.users.put_item(Item={'username': f'patient{i}', 'email': f'patient{i}@example.com',
+                                   'password_hash': 'x', 'role': 'patient',
+                                   'created_at': (CREATED + timedelta(hours=i % 5)).isoformat()})
+    store.doctors.put_item(Item={'id': 'doc-0', 'user_id': 'doctor0', 'name': 'Dr. Doctor 0',
+                                 'specialization': 'Cardiology', 'available_slots_per_day': 10})
+    appointments = []
+    for i in range(14):
+        item = {'id': f'appt-{i:02d}', 'patient_id': f'patient{i % 3}', 'doctor_id': 'doc-0',
+                'appointment_date': (DAY + timedelta(days=i)).isoformat(), 'appointment_time': '10:00 AM',
+                'start_minute': 600, 'reason': 'Checkup', 'status': STATUSES[i % 3],
+                # Pairs of appointments share a created_at, so cursors must break ties on the id
+                'created_at': (CREATED + timedelta(minutes=i // 2)).isoformat()}
+        store.appointments.put_item(Item=item)
+        appointments.append(item)
+    for i in range(15):
+        store.records.put_item(Item={'id': f'rec-{i:02d}', 'patient_id': f'patient{i % 7}', 'doctor_id': 'doc-0',
+                                     'diagnosis': 'Flu', 'prescription': 'Rest', 'notes': '',
+                                     'visit_date': (DAY - timedelta(days=i)).isoformat(),
+                                     'created_at': CREATED.isoformat()})
+    rebuild_counters(store)
+    return appointments
+
+
+def small_pages(*tables, size=2):
+    """
+    Make each table's queries return at most `size` items per page, so
+    every multi-item result needs LastEvaluatedKey continuation.
+    Returns a list logging one entry per query call.
+    """
+    calls = []
+    for table in tables:
+        def paged(query=table.query, **kwargs):
+            kwargs['Limit'] = min(kwargs.get('Limit', size), size)
+            calls.append(kwargs.get('IndexName'))
+            return query(**kwargs)
+        table.query = paged
+    return calls
+
+
+def newest_first(items):
+    return [item['id'] for item in sorted(items, key=lambda item: (item['created_at'], item['id']), reverse=True)]
+
+
+def walk(fetch, ids):
+    """
+    Follow next cursors from the first page, then prev cursors back from
+    the last one. Returns (pages forward, pages backward) as id lists.
+    """
+    forward = [fetch()]
+    while forward[-1].has_next:
+        forward.append(fetch(after=forward[-1].next_cursor))
+    backward = [forward[-1]]
+    while backward[-1].has_prev:
+        backward.append(fetch(before=backward[-1].prev_cursor))
+    return [ids(page) for page in forward], [ids(page) for page in reversed(backward)]
+
+
+def test_queries_follow_last_evaluated_key(dynamo_store):
+    store = dynamo_store
+    appointments = seed(store)
+    calls = small_pages(store.appointments, store.records, store.users)
+
+    start, end = (DAY + timedelta(days=3)).isoformat(), (DAY + timedelta(days=9)).isoformat()
+    between = store.appointments_between('doc-0', start, end)
+    assert sorted(item['id'] for item in between) == [f'appt-{i:02d}' for i in range(3, 10)]
+    assert len(calls) == 4  # 7 items in pages of 2
+
+    for_patient = store.appointments_for_patient('patient0')
+    assert [item['id'] for item in for_patient] == newest_first(
+        [item for item in appointments if item['patient_id'] == 'patient0'])
+    assert len(store.records_for_doctor('doc-0')) == 15
+    assert [item['id'] for item in store.records_for_patient('patient1')] == ['rec-01', 'rec-08']
+    assert store.count_appointments('doc-0', (DAY + timedelta(days=1)).isoformat()) == 1
+    assert count_items(store.appointments.query, IndexName='doctor_id-appointment_date-index',
+                       KeyConditionExpression=Key('doctor_id').eq('doc-0')) == 14
+
+    pending = [item for item in appointments if item['status'] == 'pending']
+    assert [item['id'] for item in store.appointments_by_status('pending')] == newest_first(pending)
+
+
+def test_recent_by_status_and_user_by_email(dynamo_store):
+    store = dynamo_store
+    appointments = seed(store)
+
+    approved = newest_first([item for item in appointments if item['status'] == 'approved'])
+    assert [item['id'] for item in store.recent_by_status('approved', 3)] == approved[:3]
+    assert store.user_by_email('patient4@example.com')['username'] == 'patient4'
+    assert store.user_by_email('nobody@example.com') is None
+
+
+def test_listings_walk_every_item_once(dynamo_app):
+    app, store = dynamo_app
+    appointments = seed(store)
+    small_pages(store.appointments, store.users)
+
+    with app.test_request_context():
+        repository = get_repository()
+        for status in (None, 'pending'):
+            expected = newest_first([item for item in appointments if status in (None, item['status'])])
+
+            def fetch(**cursor):
+                return repository.list_appointments(status=status, per_page=3, **cursor)
+            forward, backward = walk(fetch, lambda page: [appointment.id for appointment in page.items])
+            assert sum(forward, []) == expected
+            assert backward == forward
+            assert fetch().total == len(expected)
+
+        patients = sorted(((item['created_at'], item['username']) for item in store.users.scan()['Items']
+                           if item['role'] == 'patient'), reverse=True)
+        forward, backward = walk(lambda **cursor: repository.list_patients(per_page=2, **cursor),
+                                 lambda page: [user.id for user in page.items])
+        assert sum(forward, []) == [username for _, username in patients]
+        assert backward == forward
+
+
+def test_items_resolve_relationships_outside_an_app_context(dynamo_store):
+    store = dynamo_store
+    appointments = seed(store)
+    bind_store(store)
+
+    appointment = Appointment(appointments[4])
+    record = PatientRecord(store.records.get_item(Key={'id': 'rec-03'})['Item'])
+    assert (appointment.patient.username, appointment.doctor.name) == ('patient1', 'Dr. Doctor 0')
+    assert (record.patient.username, record.doctor.id) == ('patient3', 'doc-0')
+
+
+def test_doctor_patient_groups_cursors(dynamo_app):
+    app, store = dynamo_app
+    seed(store)
+    small_pages(store.records)
+
+    with app.test_request_context():
+        repository = get_repository()
+        forward, backward = walk(lambda **cursor: repository.doctor_patient_groups('doc-0', per_page=3, **cursor),
+                                 lambda page: [(group.patient.id, group.record_count) for group in page.groups])
+    assert sum(forward, []) == [(f'patient{i}', 3 if i == 0 else 2) for i in range(7)]
+    assert backward == forward
+
+
+def test_parallel_scan_streams_every_segment(dynamo_store):
+    store = dynamo_store
+    appointments = seed(store)
+    workers = threading.active_count()
+
+    scanned = [item['id'] for item in parallel_scan(store.appointments, 4, projection=['id'], Limit=2)]
+    assert sorted(scanned) == sorted(item['id'] for item in appointments)
+
+    # Stopping early ends the segment workers; their errors reach the caller
+    items = parallel_scan(store.appointments, 4, Limit=1)
+    next(items)
+    items.close()
+    assert threading.active_count() == workers
+    with pytest.raises(Exception):
+        list(parallel_scan(store.appointments, 4, Limit=0))
+    assert threading.active_count() == workers
@@ -0,0 +1,40 @@
+"""
+Logins answer 503 instead of queueing without bound when the password
+hashing pool is backed up (PASSWORD_HASH_TIMEOUT, PASSWORD_HASH_QUEUE).
+"""
+import threading
+from common import seed, make_client
+from services import passwords
+
+
+def post_login(client):
+    client.get('/logout')
+    return client.post('/login', data={'username': 'user51', 'password': 'bench'})
+
+
+def test_login_is_busy_while_the_pool_is_full(database):
+    app, db_path = database
+    seed(db_path, 0, n_patients=10)
+    client = make_client(app)
+    saved = {name: app.config[name] for name in ('PASSWORD_HASH_WORKERS', 'PASSWORD_HASH_QUEUE',
+                                                 'PASSWORD_HASH_TIMEOUT')}
+    app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE=1, PASSWORD_HASH_TIMEOUT=0.05)
+    passwords._reset_pool()
+    release = threading.Event()
+    try:
+        with app.app_context():
+            # Occupy the only worker
+            passwords._get_pool().submit(release.wait)
+
+        # Queued behind the blocked worker until PASSWORD_HASH_TIMEOUT
+        response = post_login(client)
+        assert response.status_code == 503 and b'busy' in response.data
+
+        # Once the worker is free again, logins go through
+        release.set()
+        app.config.update(saved)
+        assert post_login(client).status_code == 302
+    finally:
+        release.set()
+        app.config.update(saved)
+        passwords._reset_pool()
@@ -0,0 +1,124 @@
+"""
+NotificationQueue (services/notifications.py): batches of up to 10 after
+the linger time, retries with exponential backoff (whole failed calls
+and the entries SNS reports in Failed), drops when full or after
+max_attempts, and flush/stop.
+"""
+import logging
+from services import notifications
+from services.notifications import NotificationQueue, InMemoryPublisher, SNSPublisher
+
+
+def messages(n):
+    return [(f'Subject {i}', f'Message {i}') for i in range(n)]
+
+
+def send_all(queue, pairs):
+    for subject, message in pairs:
+        assert queue.send(subject, message)
+
+
+class FakeSNS:
+    """
+    SNS client stand-in: each PublishBatch reports the entries whose
+    message is in `fail_once` as Failed the first time they are sent.
+    """
+
+    def __init__(self, fail_once=()):
+        self.fail_once = set(fail_once)
+        self.calls = []
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+        self.calls.append([entry['Message'] for entry in PublishBatchRequestEntries])
+        failed = [{'Id': entry['Id'], 'Code': 'InternalError', 'SenderFault': False}
+                  for entry in PublishBatchRequestEntries if entry['Message'] in self.fail_once]
+        self.fail_once -= {entry['Message'] for entry in PublishBatchRequestEntries}
+        return {'Successful': [], 'Failed': failed}
+
+
+def test_batches_of_ten_after_the_linger_time():
+    publisher = InMemoryPublisher()
+    queue = NotificationQueue(publisher, linger=0.05)
+    send_all(queue, messages(25))
+    queue.stop()
+    assert publisher.messages == messages(25)
+    assert publisher.calls == 3  # 10 + 10 + 5
+
+    # A lone message waits out the linger time for company, then goes alone
+    queue = NotificationQueue(publisher, linger=0.05)
+    send_all(queue, messages(1))
+    assert queue.flush(timeout=5)
+    metrics = queue.metrics()
+    assert (metrics['batches'], metrics['sent']) == (1, 1)
+    assert metrics['latency_max_seconds'] >= 0.04
+    queue.stop()
+
+
+def test_failed_calls_are_retried_with_exponential_backoff(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(notifications.time, 'sleep', sleeps.append)
+    publisher = InMemoryPublisher(fail_calls=3)
+    queue = NotificationQueue(publisher, linger=0.05, backoff=0.01)
+    send_all(queue, messages(3))
+    queue.stop()
+
+    assert publisher.messages == messages(3) and publisher.calls == 4
+    assert sleeps == [0.01, 0.02, 0.04]
+    metrics = queue.metrics()
+    assert (metrics['retries'], metrics['failed'], metrics['sent']) == (9, 0, 3)
+
+
+def test_only_the_entries_sns_reports_failed_are_retried(monkeypatch):
+    monkeypatch.setattr(notifications.time, 'sleep', lambda seconds: None)
+    client = FakeSNS(fail_once={'Message 1'})
+    queue = NotificationQueue(SNSPublisher(client, 'arn:aws:sns:us-east-1:123456789012:test'), linger=0.05)
+    send_all(queue, messages(3))
+    queue.stop()
+
+    assert client.calls == [['Message 0', 'Message 1', 'Message 2'], ['Message 1']]
+    assert queue.metrics()['retries'] == 1
+
+
+def test_messages_are_dropped_after_max_attempts(monkeypatch, caplog):
+    monkeypatch.setattr(notifications.time, 'sleep', lambda seconds: None)
+    publisher = InMemoryPublisher(fail_calls=10)
+    queue = NotificationQueue(publisher, linger=0.05, max_attempts=3)
+    with caplog.at_level(logging.ERROR, logger='services.notifications'):
+        send_all(queue, messages(2))
+        queue.stop()
+
+    assert publisher.calls == 3 and not publisher.messages
+    assert queue.metrics()['failed'] == 2
+    assert 'Dropped 2 notifications after 3 attempts' in caplog.text
+
+
+def test_send_drops_when_the_queue_is_full():
+    publisher = InMemoryPublisher()
+    # The worker lingers for a full batch, so both messages stay queued meanwhile
+    queue = NotificationQueue(publisher, max_queue=2, linger=0.3)
+    send_all(queue, messages(2))
+    assert not queue.send('Subject 2', 'Message 2')
+    assert queue.metrics()['dropped'] == 1
+    queue.stop()
+    assert publisher.messages == messages(2)
+
+
+def test_flush_times_out_and_stop_ends_the_worker():
+    publisher = InMemoryPublisher(delay=0.3)
+    queue = NotificationQueue(publisher, linger=0)
+    send_all(queue, messages(1))
+    assert not queue.flush(timeout=0.05)
+    assert queue.flush(timeout=5)
+
+    send_all(queue, messages(2))
+    queue.stop()
+    assert not queue._thread.is_alive()
+    assert publisher.messages == messages(1) + messages(2)
+    assert queue.metrics()['queue_depth'] == 0
+
+
+def test_a_forked_child_starts_with_empty_counters():
+    queue = NotificationQueue(InMemoryPublisher(), max_queue=0)
+    assert not queue.send('Subject', 'Message')
+    queue._after_fork()
+    assert queue.metrics()['dropped'] == 0
@@ -0,0 +1,117 @@
+"""
+Keyset pagination on (created_at, id): walking next then prev cursors
+returns every row exactly once, and migrate_schema.py makes created_at
+NOT NULL on databases where it was nullable (NULL rows used to drop out
+after the first page).
+"""
+import re
+import sqlite3
+from datetime import datetime, timedelta
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateTable
+from migrate_schema import migrate_schema
+from models import User, Appointment, USER_SEARCH_DDL
+from services.repository import get_repository
+
+CREATED = datetime(2024, 3, 1)
+
+
+def stored(moment):
+    # DateTime as SQLAlchemy writes it; cursors compare against this text
+    return moment.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def walk(fetch):
+    """
+    Follow next cursors from the first page, then prev cursors back from
+    the last one. Returns (pages forward, pages backward) as id lists.
+    """
+    forward = [fetch()]
+    while forward[-1].has_next:
+        forward.append(fetch(after=forward[-1].next_cursor))
+    backward = [forward[-1]]
+    while backward[-1].has_prev:
+        backward.append(fetch(before=backward[-1].prev_cursor))
+    return [[row.id for row in page.items] for page in forward], \
+        [[row.id for row in page.items] for page in reversed(backward)]
+
+
+def test_listings_walk_every_row_once(database):
+    app, db_path = database
+    conn = sqlite3.connect(db_path)
+    # Groups of three patients share a created_at, so cursors must break ties on the id
+    conn.executemany(
+        "INSERT INTO users (id, username, email, password_hash, role, created_at) VALUES (?, ?, ?, 'x', ?, ?)",
+        [(i, f'user{i}', f'user{i}@example.com', 'admin' if i == 1 else 'patient',
+          stored(CREATED + timedelta(hours=i // 3))) for i in range(1, 12)])
+    conn.executemany(
+        "INSERT INTO appointments (patient_id, doctor_id, appointment_date, appointment_time, status, created_at) "
+        "VALUES (?, 1, '2024-04-01', '10:00 AM', ?, ?)",
+        [(2 + i % 10, ('pending', 'approved')[i % 2], stored(CREATED + timedelta(minutes=i // 4)))
+         for i in range(13)])
+    conn.commit()
+    conn.close()
+
+    with app.test_request_context():
+        repository = get_repository()
+        patients = User.query.filter_by(role='patient')\
+            .order_by(User.created_at.desc(), User.id.desc()).all()
+        forward, backward = walk(lambda **cursor: repository.list_patients(per_page=3, **cursor))
+        assert sum(forward, []) == [user.id for user in patients]
+        assert backward == forward
+
+        for status in (None, 'approved'):
+            query = Appointment.query if status is None else Appointment.query.filter_by(status=status)
+            expected = [a.id for a in query.order_by(Appointment.created_at.desc(), Appointment.id.desc())]
+            forward, backward = walk(lambda **cursor: repository.list_appointments(status=status, per_page=4,
+                                                                                   **cursor))
+            assert sum(forward, []) == expected
+            assert backward == forward
+
+
+def legacy_table(table):
+    # The table as it was created before created_at became NOT NULL
+    ddl = str(CreateTable(table).compile(dialect=sqlite.dialect()))
+    return re.sub(r'(created_at DATETIME) NOT NULL', r'\1', ddl)
+
+
+def created_at_info(conn, table):
+    return next(row for row in conn.execute(f"PRAGMA table_info({table})") if row[1] == 'created_at')
+
+
+def test_migration_backfills_and_requires_created_at(tmp_path):
+    db_path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute(legacy_table(User.__table__))
+    conn.execute(legacy_table(Appointment.__table__))
+    for statement in USER_SEARCH_DDL:
+        conn.execute(statement)
+    conn.executemany(
+        "INSERT INTO users (id, username, email, password_hash, role, created_at) VALUES (?, ?, ?, 'x', 'patient', ?)",
+        [(i, f'user{i}', f'user{i}@example.com', None if i % 2 else stored(CREATED + timedelta(days=i)))
+         for i in range(1, 7)])
+    conn.execute("INSERT INTO appointments (patient_id, doctor_id, appointment_date, appointment_time) "
+                 "VALUES (1, 1, '2024-04-01', '10:00 AM')")
+    conn.commit()
+    assert created_at_info(conn, 'users')[3] == 0
+    conn.close()
+
+    migrate_schema(db_path)
+    migrate_schema(db_path)  # Nothing left to do the second time
+
+    conn = sqlite3.connect(db_path)
+    for table in ('users', 'appointments'):
+        assert created_at_info(conn, table)[3] == 1
+        assert conn.execute(f"SELECT COUNT(*) FROM {table} WHERE created_at IS NULL").fetchone()[0] == 0
+    # NULLs became the oldest value, so those rows sort as the oldest
+    assert conn.execute("SELECT id, created_at FROM users ORDER BY created_at, id LIMIT 4").fetchall() == \
+        [(i, stored(CREATED + timedelta(days=2))) for i in (1, 2, 3, 5)]
+    assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 6
+
+    # Indexes and the search triggers on users survived the rebuild
+    indexes = {row[1] for row in conn.execute("PRAGMA index_list(users)")}
+    assert {index.name for index in User.__table__.indexes} <= indexes
+    conn.execute("INSERT INTO users (username, email, password_hash, role, created_at) "
+                 "VALUES ('newcomer', 'new@example.com', 'x', 'patient', '2024-05-01')")
+    assert conn.execute("SELECT rowid FROM users_fts WHERE users_fts MATCH 'newcomer'").fetchall() == [(7,)]
+    conn.close()
@@ -0,0 +1,11 @@
+"""
+Listing pages and dashboards send the same number of SQL statements
+however many appointments there are (no N+1 lazy loads).
+"""
+from bench_listing_queries import measure, growing_pages
+
+
+def test_query_count_does_not_grow_with_rows(database):
+    app, db_path = database
+    results = measure(app, db_path, [100, 1_000, 5_000])
+    assert not growing_pages(results), results
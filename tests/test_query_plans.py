@@ -0,0 +1,12 @@
+"""
+Every query sent by the hot routes uses an index: no plain full scan of
+a large table (benchmarks/check_query_plans.py).
+"""
+from check_query_plans import check
+
+
+def test_route_queries_use_indexes(database):
+    app, db_path = database
+    failures = [(url, ' '.join(statement.split()), plan)
+                for url, statement, plan in check(app, db_path) if plan is not None]
+    assert not failures
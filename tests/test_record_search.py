@@ -0,0 +1,108 @@
+"""
+Record search (services/record_search.py) returns every match: the ranked
+window first, then the older matches, across pages in both directions,
+and every term has to match, common ones included.
+"""
+import random
+import sqlite3
+from datetime import date, timedelta
+import pytest
+from common import seed
+
+N_DOCTORS = 3
+N_PATIENTS = 20
+N_RECORDS = 400
+RANK_WINDOW = 40
+
+
+@pytest.fixture(scope='module')
+def corpus(database):
+    """
+    Records where "patient" is in almost every note (a common term) and
+    "migraine" in about a third of the diagnoses. Returns (app, rows).
+    """
+    app, db_path = database
+    seed(db_path, 0, n_patients=N_PATIENTS, n_doctors=N_DOCTORS)
+    rng = random.Random(5)
+    rows = []
+    for _ in range(N_RECORDS):
+        diagnosis = rng.choice(('Migraine', 'Gout flare', 'Sinusitis'))
+        notes = rng.choice(('Patient reports headache.', 'Patient reports pain.', 'Seen in clinic.')
+                           if rng.random() < 0.1 else ('Patient reports headache.', 'Patient reports pain.'))
+        rows.append((rng.randint(N_DOCTORS + 1, N_DOCTORS + N_PATIENTS), rng.randint(1, N_DOCTORS), diagnosis,
+                     date.today() - timedelta(days=rng.randint(0, 700)), notes))
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO patient_records (patient_id, doctor_id, diagnosis, prescription, visit_date, notes, created_at) "
+        "VALUES (?, ?, ?, NULL, ?, ?, CURRENT_TIMESTAMP)", rows)
+    conn.commit()
+    ids = [row[0] for row in conn.execute('SELECT id FROM patient_records ORDER BY id')]
+    conn.close()
+
+    app.config['SEARCH_RANK_WINDOW'] = RANK_WINDOW
+    yield app, [dict(zip(('id', 'patient_id', 'doctor_id', 'diagnosis', 'visit_date', 'notes'), (i,) + row))
+                for i, row in zip(ids, rows)]
+    app.config['SEARCH_RANK_WINDOW'] = 2000
+
+
+def matching(rows, *words, patient_id=None):
+    return {row['id'] for row in rows
+            if all(word in f"{row['diagnosis']} {row['notes']}".lower() for word in words)
+            and patient_id in (None, row['patient_id'])}
+
+
+def all_pages(query, **filters):
+    """
+    Page forward to the end, then back to the start; both walks must see
+    the same hits in the same order. Returns (hits, first page).
+    """
+    from services.record_search import search_records
+
+    first = page = search_records(query, per_page=7, **filters)
+    pages = [page]
+    while page.has_next:
+        page = search_records(query, after=page.next_cursor, per_page=7, **filters)
+        pages.append(page)
+    forward = [hit for page in pages for hit in page.hits]
+
+    backward = list(page.hits)
+    while page.has_prev:
+        page = search_records(query, before=page.prev_cursor, per_page=7, **filters)
+        backward = page.hits + backward
+    assert [hit.record.id for hit in backward] == [hit.record.id for hit in forward]
+    return forward, first
+
+
+def test_matches_older_than_the_rank_window_follow_the_ranked_ones(corpus):
+    app, rows = corpus
+    with app.test_request_context():
+        hits, first = all_pages('migraine')
+    ids = [hit.record.id for hit in hits]
+    assert len(ids) == len(set(ids))
+    assert set(ids) == matching(rows, 'migraine')
+    assert len(ids) > RANK_WINDOW and first.ranked and first.older
+
+    ranked = [hit for hit in hits if hit.score is not None]
+    older = [hit for hit in hits if hit.score is None]
+    assert hits == ranked + older and len(ranked) == RANK_WINDOW
+    assert [hit.score for hit in ranked] == sorted(hit.score for hit in ranked)
+    assert [hit.record.id for hit in older] == sorted((hit.record.id for hit in older), reverse=True)
+    assert max(hit.record.id for hit in older) < min(hit.record.id for hit in ranked)
+
+
+def test_common_terms_still_have_to_match(corpus):
+    app, rows = corpus
+    with app.test_request_context():
+        hits, unscoped = all_pages('patient migraine')
+        assert unscoped.common == ('"patient"',) and unscoped.ranked
+        assert {hit.record.id for hit in hits} == matching(rows, 'patient', 'migraine')
+        assert matching(rows, 'patient', 'migraine') < matching(rows, 'migraine')
+
+        checked = 0
+        for patient_id in range(N_DOCTORS + 1, N_DOCTORS + N_PATIENTS + 1):
+            hits, first = all_pages('patient migraine', patient_id=patient_id)
+            assert not first.common
+            assert {hit.record.id for hit in hits} == matching(rows, 'patient', 'migraine', patient_id=patient_id)
+            checked += len(matching(rows, 'migraine', patient_id=patient_id) -
+                           matching(rows, 'patient', 'migraine', patient_id=patient_id))
+    assert checked, 'no migraine record without "patient" to tell the two apart'
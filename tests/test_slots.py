@@ -0,0 +1,95 @@
+"""
+Availability reads (GET /patient/check-slots, /patient/availability and
+/patient/next-slot) never write slots: days without them are answered
+from the appointments, with the same numbers warm_slots would give.
+Today's cached availability drops the slots that have started.
+"""
+import sqlite3
+from datetime import date, datetime, timedelta
+import pytest
+from common import seed, make_client, login
+from conftest import reset_caches
+from services import availability, slots
+from services.schedule import minute_to_label
+
+TOMORROW = date.today() + timedelta(days=1)
+FAR = date.today() + timedelta(days=400)
+PAST = date.today() - timedelta(days=30)
+
+
+def slot_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    count = conn.execute('SELECT COUNT(*) FROM slots').fetchone()[0]
+    conn.close()
+    return count
+
+
+@pytest.fixture(scope='module')
+def seeded(database):
+    seed(database[1], 0, n_patients=10)
+    return database
+
+
+def test_reads_do_not_write_slots(seeded):
+    app, db_path = seeded
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "INSERT INTO appointments (patient_id, doctor_id, appointment_date, appointment_time, status, reason, created_at) "
+        "VALUES (51, 1, ?, ?, 'approved', 'Checkup', ?)", (FAR, minute_to_label(600), datetime.utcnow()))
+    conn.commit()
+    conn.close()
+    client = make_client(app)
+    login(client, 'user51')
+
+    far = client.get(f'/patient/check-slots/1/{FAR}').get_json()
+    past = client.get(f'/patient/check-slots/1/{PAST}').get_json()
+    week = client.get(f'/patient/availability/1?start={FAR - timedelta(days=3)}&end={FAR + timedelta(days=3)}').get_json()
+    old = client.get(f'/patient/availability/1?start={PAST}&end={PAST + timedelta(days=6)}').get_json()
+    tomorrow = client.get(f'/patient/check-slots/1/{TOMORROW}').get_json()
+    month = client.get(f'/patient/availability/1?start={date.today()}&end={date.today() + timedelta(days=29)}').get_json()
+    next_slot = client.get('/patient/next-slot/1').get_json()
+    assert slot_rows(db_path) == 0
+
+    total = far['total_slots']
+    assert (far['available_slots'], far['booked_slots']) == (total - 1, 1)
+    assert 600 not in [slot['minute'] for slot in far['free_slots']]
+    assert past['available_slots'] == 0 and not past['free_slots']
+    assert week['doctors'][0]['available'] == [total] * 3 + [total - 1] + [total] * 3
+    assert old['doctors'][0]['available'] == [0] * 7
+
+    # Materializing the day gives the same answer as reading it without slots
+    with app.test_request_context():
+        from models import db, Doctor
+        from services.slots import ensure_slots, free_slots, held_slots
+        doctor = db.session.get(Doctor, 1)
+        computed = free_slots(doctor, FAR), held_slots(1, FAR)
+        ensure_slots([doctor], FAR, FAR)
+        assert (free_slots(doctor, FAR), held_slots(1, FAR)) == computed
+        db.session.rollback()
+
+        slots.warm_slots([doctor])
+        db.session.commit()
+    assert slot_rows(db_path) > 0
+
+    reset_caches()
+    assert client.get(f'/patient/check-slots/1/{TOMORROW}').get_json() == tomorrow
+    assert client.get(f'/patient/availability/1?start={date.today()}&end={date.today() + timedelta(days=29)}').get_json() == month
+    assert client.get('/patient/next-slot/1').get_json() == next_slot
+
+
+def test_cached_today_drops_started_slots(seeded, monkeypatch):
+    app, _ = seeded
+    reset_caches()
+    with app.test_request_context():
+        monkeypatch.setattr(slots, 'now_minute', lambda: 0)
+        monkeypatch.setattr(availability, 'now_minute', lambda: 0)
+        cached = availability.get_availability(2, date.today())
+        minutes = [slot['minute'] for slot in cached['free_slots']]
+        assert cached['available_slots'] == len(minutes) > 1
+
+        # Still within the TTL, but the first slot has started
+        monkeypatch.setattr(availability, 'now_minute', lambda: minutes[0])
+        later = availability.get_availability(2, date.today())
+        assert [slot['minute'] for slot in later['free_slots']] == minutes[1:]
+        assert later['available_slots'] == len(minutes) - 1
+        assert cached['available_slots'] == len(minutes)
@@ -0,0 +1,30 @@
+"""
+The single-query dashboard and per-status counters (services/stats.py)
+equal the per-status count() queries they replaced.
+"""
+from common import seed
+from models import User, Doctor, Appointment
+from services.stats import get_dashboard_stats, get_appointment_stats
+
+
+def counts(query):
+    return (query.count(), query.filter_by(status='pending').count(),
+            query.filter_by(status='approved').count(), query.filter_by(status='rejected').count())
+
+
+def test_stats_match_per_status_counts(database):
+    app, db_path = database
+    seed(db_path, 500, n_patients=60, n_doctors=5)
+
+    with app.app_context():
+        stats = get_dashboard_stats()
+        assert (stats.total_appointments, stats.pending_appointments,
+                stats.approved_appointments, stats.rejected_appointments) == counts(Appointment.query)
+        assert stats.total_patients == User.query.filter_by(role='patient').count() == 60
+        assert stats.total_doctors == Doctor.query.count() == 5
+        assert min(counts(Appointment.query)) > 0
+
+        for scope in ({'doctor_id': 2}, {'patient_id': 10}, {'doctor_id': 2, 'patient_id': 10}):
+            stats = get_appointment_stats(**scope)
+            assert (stats.total_appointments, stats.pending_appointments, stats.approved_appointments,
+                    stats.rejected_appointments) == counts(Appointment.query.filter_by(**scope))
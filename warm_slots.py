@@ -0,0 +1,21 @@
+from app import app, db
+from models import Doctor
+from services.slots import warm_slots, horizon_end
+
+def warm():
+    """
+    Create the slot rows for today through SLOT_HORIZON_DAYS for every doctor.
+    Optional: availability reads work without them, they just take longer.
+    Run it daily (e.g. from cron) to keep the window filled.
+    """
+    with app.app_context():
+        try:
+            warm_slots(Doctor.query.all())
+            db.session.commit()
+            print(f"✓ Slots materialized through {horizon_end().isoformat()}")
+        except Exception as e:
+            db.session.rollback()
+            print(f"\n❌ Error while materializing slots: {str(e)}")
+
+if __name__ == '__main__':
+    warm()